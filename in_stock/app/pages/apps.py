@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class PagesConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "in_stock.app.pages"
+
+    def ready(self):
+        # Registra os sinais que invalidam o cache do dashboard
+        from . import signals  # noqa: F401
@@ -0,0 +1,286 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from in_stock.app.products.category_stats_service import CategoryStatsService
+from in_stock.app.products.expiration_service import ExpirationCalendarService
+from in_stock.app.products.forecast_service import DemandForecastService
+from in_stock.app.products.models import Category, Product
+from in_stock.app.reports.models import Report
+from in_stock.app.sales.models import Sale
+from in_stock.app.sales.services import SaleService
+from in_stock.app.users.stats_service import CompanyStatsService
+
+# Limite de unidades abaixo do qual o produto aparece no alerta de estoque
+# baixo, enquanto não há previsão de demanda calculada para ele (ver
+# products/forecast_service.py)
+LOW_STOCK_THRESHOLD = 10
+
+# Faixas do calendário de vencimentos usadas no alerta de produtos próximos
+# do vencimento (próximos 30 dias)
+EXPIRING_BUCKETS = ("0-7", "8-30")
+
+# Métricas que são querysets e precisam ser avaliadas antes de irem para o cache
+LIST_METRICS = (
+    "low_stock_products",
+    "expiring_soon",
+    "expired_products",
+    "top_products",
+    "top_categories",
+    "recent_sales",
+)
+
+
+class DashboardService:
+    """
+    Calcula as métricas do dashboard com um número fixo de queries.
+
+    As contagens e somas de Product e Sale são feitas com agregações
+    condicionais (Count/Sum com filter=...), então o custo da página não
+    cresce com a quantidade de registros da empresa.
+    """
+
+    @staticmethod
+    def _scoped(queryset, company):
+        """Filtra o queryset pela empresa, quando informada"""
+        if company:
+            return queryset.filter(company=company)
+        return queryset
+
+    @staticmethod
+    def _version_key(company_id):
+        return f"dashboard:version:{company_id or 'all'}"
+
+    @staticmethod
+    def _get_version(company_id):
+        """Retorna a versão atual dos snapshots da empresa"""
+        key = DashboardService._version_key(company_id)
+        version = cache.get(key)
+        if version is None:
+            # Valor novo a cada (re)criação, para nunca reaproveitar snapshots
+            # antigos caso a chave de versão tenha sido descartada do cache
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        return version
+
+    @staticmethod
+    def invalidate(company_id=None):
+        """
+        Invalida os snapshots da empresa e a visão geral (Admin InStock).
+
+        Os snapshots não são apagados: a versão da empresa é incrementada e o
+        próximo acesso ao dashboard recalcula as métricas.
+        """
+        for scope in {company_id, None}:
+            key = DashboardService._version_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), None)
+
+    @staticmethod
+    def get_snapshot(company=None, role=""):
+        """
+        Retorna as métricas do dashboard a partir do cache.
+
+        O snapshot é identificado pela empresa e pelo papel do usuário e é
+        recalculado sob demanda quando invalidado pelos sinais de Product,
+        Sale, Supplier, Category e Report, ou quando passa de
+        DASHBOARD_CACHE_TIMEOUT segundos (staleness máxima).
+        """
+        company_id = company.pk if company else None
+        version = DashboardService._get_version(company_id)
+        key = f"dashboard:snapshot:{company_id or 'all'}:{role}:{version}"
+
+        snapshot = cache.get(key)
+        if snapshot is None:
+            snapshot = DashboardService.get_metrics(company)
+            for name in LIST_METRICS:
+                snapshot[name] = list(snapshot[name])
+            cache.set(key, snapshot, settings.DASHBOARD_CACHE_TIMEOUT)
+        return snapshot
+
+    @staticmethod
+    def get_product_metrics(company=None, today=None):
+        """
+        Retorna as contagens de alertas de produtos.
+
+        Os alertas de vencimento vêm do calendário de vencimentos (uma query
+        agrupada por faixa); o estoque baixo (no ponto de pedido ou abaixo
+        dele) é contado à parte.
+        """
+        today = today or timezone.now().date()
+        calendar = ExpirationCalendarService.get_summary(company, today)
+
+        products = DashboardService._scoped(Product.objects.all(), company)
+        return {
+            "low_stock_count": products.filter(
+                DemandForecastService.reorder_condition(LOW_STOCK_THRESHOLD)
+            ).count(),
+            "expiring_count": sum(calendar[key]["count"] for key in EXPIRING_BUCKETS),
+            "expired_count": calendar["expired"]["count"],
+        }
+
+    @staticmethod
+    def get_sale_metrics(company=None, now=None):
+        """Retorna as contagens de movimentações e a série dos últimos 7 dias"""
+        now = now or timezone.now()
+        first_day_of_month = now.replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        first_day_last_month = (first_day_of_month - timedelta(days=1)).replace(day=1)
+
+        aggregates = {
+            "sales_this_month": Count("id", filter=Q(date__gte=first_day_of_month)),
+            "sales_last_month": Count(
+                "id",
+                filter=Q(date__gte=first_day_last_month, date__lt=first_day_of_month),
+            ),
+            "entries_this_month": Count(
+                "id", filter=Q(type="entry", date__gte=first_day_of_month)
+            ),
+            "exits_this_month": Count(
+                "id", filter=Q(type="exits", date__gte=first_day_of_month)
+            ),
+        }
+
+        sales = DashboardService._scoped(Sale.objects.all(), company)
+        metrics = sales.aggregate(**aggregates)
+
+        # Gráfico dos últimos 7 dias (uma query agrupada por dia)
+        series = SaleService.get_movement_series(
+            (now - timedelta(days=6)).date(), now.date(), "day", company
+        )
+        metrics["daily_movements"] = [
+            {
+                "date": point["date"].strftime("%d/%m"),
+                "day_name": point["date"].strftime("%a"),
+                "entries": point["entries"],
+                "exits": point["exits"],
+            }
+            for point in series
+        ]
+        return metrics
+
+    @staticmethod
+    def get_metrics(company=None):
+        """
+        Monta o contexto completo do dashboard.
+
+        Args:
+            company: Empresa do usuário. Quando None, considera todas as
+                empresas (visão do Admin InStock).
+
+        Returns:
+            dict: Métricas, alertas e listas usadas em pages/dashboard.html
+        """
+        now = timezone.now()
+        today = now.date()
+
+        # Totais lidos de CompanyStats (mantidos de forma incremental)
+        stats = CompanyStatsService.get_stats(company)
+        metrics = {
+            "total_products": stats["total_products"],
+            "total_suppliers": stats["total_suppliers"],
+            "total_stock": stats["total_stock"],
+            "stock_value": stats["stock_value"],
+            "entries": stats["total_entries"],
+            "exits": stats["total_exits"],
+            "total_sales": stats["total_entries"] + stats["total_exits"],
+        }
+        metrics.update(DashboardService.get_product_metrics(company, today))
+        metrics.update(DashboardService.get_sale_metrics(company, now))
+
+        metrics["total_reports"] = DashboardService._scoped(
+            Report.objects.all(), company
+        ).count()
+        metrics["total_categories"] = DashboardService._scoped(
+            Category.objects.all(), company
+        ).count()
+
+        # === LISTAS (top 5) ===
+        products = DashboardService._scoped(
+            Product.objects.select_related("category"), company
+        )
+        metrics["low_stock_products"] = (
+            products.select_related("forecast")
+            .filter(DemandForecastService.reorder_condition(LOW_STOCK_THRESHOLD))
+            .order_by("quantity")[:5]
+        )
+        metrics["expiring_soon"] = ExpirationCalendarService.get_page(
+            company, EXPIRING_BUCKETS, page_size=5, today=today
+        )["products"]
+        metrics["expired_products"] = ExpirationCalendarService.get_page(
+            company, "expired", page_size=5, today=today
+        )["products"]
+        metrics["top_products"] = products.annotate(
+            movement_count=Count("sale_product")
+        ).order_by("-movement_count")[:5]
+        metrics["top_categories"] = CategoryStatsService.top_categories(company)
+        # Apenas os campos exibidos: o snapshot vai para o cache compartilhado
+        # e não deve levar instâncias (nem dados do usuário que registrou)
+        recent_sales = DashboardService._scoped(Sale.objects.all(), company)
+        metrics["recent_sales"] = recent_sales.order_by("-date").values(
+            "id", "type", "quantity", "date", product_name=F("product__name")
+        )[:5]
+
+        metrics.update(DashboardService.get_efficiency_metrics(metrics))
+        return metrics
+
+    @staticmethod
+    def get_efficiency_metrics(metrics):
+        """Calcula os indicadores derivados a partir das métricas já obtidas"""
+        total_products = metrics["total_products"]
+        total_stock = metrics["total_stock"]
+        sales_this_month = metrics["sales_this_month"]
+        sales_last_month = metrics["sales_last_month"]
+        healthy_products = (
+            total_products - metrics["low_stock_count"] - metrics["expired_count"]
+        )
+
+        # Variação percentual de movimentações em relação ao mês anterior
+        if sales_last_month > 0:
+            sales_variation = (
+                (sales_this_month - sales_last_month) / sales_last_month
+            ) * 100
+        else:
+            sales_variation = 100 if sales_this_month > 0 else 0
+
+        return {
+            "sales_variation": round(sales_variation, 1),
+            # Taxa de rotatividade (giro de estoque)
+            "stock_turnover": (
+                round((metrics["exits"] / total_stock * 100), 1)
+                if total_stock > 0
+                else 0
+            ),
+            # Produtos saudáveis (com estoque adequado e não vencidos)
+            "healthy_products": healthy_products,
+            "health_percentage": (
+                round((healthy_products / total_products * 100), 1)
+                if total_products > 0
+                else 100
+            ),
+            # Perdas evitadas (produtos com alertas ativos que foram identificados)
+            "potential_savings": (
+                round(float(metrics["stock_value"]) * 0.05, 2)
+                if metrics["expired_count"] > 0 or metrics["expiring_count"] > 0
+                else 0
+            ),
+            # Eficiência operacional (movimentações vs produtos)
+            "efficiency_rate": (
+                round((metrics["total_sales"] / total_products * 100), 1)
+                if total_products > 0
+                else 0
+            ),
+            # Média de movimentações por dia (últimos 7 dias)
+            "avg_daily_movements": round(
+                sum([d["entries"] + d["exits"] for d in metrics["daily_movements"]])
+                / 7,
+                1,
+            ),
+        }
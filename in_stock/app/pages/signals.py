@@ -0,0 +1,32 @@
+"""
+Sinais que invalidam o snapshot do dashboard quando os dados mudam
+"""
+
+from django.db.models.signals import post_delete, post_save
+
+from in_stock.app.products.models import Category, Product
+from in_stock.app.reports.models import Report
+from in_stock.app.sales.models import Sale
+from in_stock.app.suppliers.models import Supplier
+
+from .services import DashboardService
+
+DASHBOARD_MODELS = (Product, Sale, Supplier, Category, Report)
+
+
+def invalidate_dashboard(sender, instance, **kwargs):
+    """Invalida o snapshot da empresa do objeto alterado"""
+    DashboardService.invalidate(instance.company_id)
+
+
+for model in DASHBOARD_MODELS:
+    post_save.connect(
+        invalidate_dashboard,
+        sender=model,
+        dispatch_uid=f"dashboard_post_save_{model.__name__}",
+    )
+    post_delete.connect(
+        invalidate_dashboard,
+        sender=model,
+        dispatch_uid=f"dashboard_post_delete_{model.__name__}",
+    )
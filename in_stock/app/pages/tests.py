@@ -0,0 +1,222 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from in_stock.app.pages.services import DashboardService
+from in_stock.app.pages.views import dashboard_view
+from in_stock.app.products.models import Category, Product
+from in_stock.app.sales.models import Sale
+from in_stock.app.users.models import Company
+
+User = get_user_model()
+
+
+class DashboardServiceTests(TestCase):
+    """Testa o cálculo das métricas do dashboard"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com",
+            password="testpass123",
+            company_obj=self.company,
+            is_staff=True,
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+
+    def _create_products(self, count, company=None, start=0):
+        """Cria produtos e uma entrada e uma saída para cada um"""
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                name=f"Produto {i}",
+                category=self.category,
+                quantity=i % 20,
+                price=10,
+                expiration_date=date.today() + timedelta(days=i % 60 - 10),
+                company=company or self.company,
+            )
+            for type_sale in ("entry", "exits"):
+                Sale.objects.create(
+                    product=product,
+                    user=self.user,
+                    company=company or self.company,
+                    type=type_sale,
+                )
+
+    def _evaluate(self, metrics):
+        """Força a avaliação das listas (querysets) retornadas"""
+        for key in (
+            "low_stock_products",
+            "expiring_soon",
+            "expired_products",
+            "top_products",
+            "top_categories",
+            "recent_sales",
+        ):
+            list(metrics[key])
+
+    def test_query_budget_does_not_grow_with_data(self):
+        """Testa se o número de queries é fixo independente do volume de dados"""
+        self._create_products(5)
+        with self.assertNumQueries(13):
+            self._evaluate(DashboardService.get_metrics(self.company))
+
+        self._create_products(50, start=5)
+        with self.assertNumQueries(13):
+            self._evaluate(DashboardService.get_metrics(self.company))
+
+    def test_metrics_match_source_tables(self):
+        """Testa se as métricas batem com as contagens diretas"""
+        self._create_products(30)
+        metrics = DashboardService.get_metrics(self.company)
+        today = date.today()
+
+        products = Product.objects.filter(company=self.company)
+        self.assertEqual(metrics["total_products"], products.count())
+        self.assertEqual(
+            metrics["total_stock"], sum(p.quantity for p in products.all())
+        )
+        self.assertEqual(
+            metrics["low_stock_count"], products.filter(quantity__lt=10).count()
+        )
+        self.assertEqual(
+            metrics["expired_count"],
+            products.filter(expiration_date__lt=today).count(),
+        )
+        self.assertEqual(metrics["entries"], 30)
+        self.assertEqual(metrics["exits"], 30)
+        self.assertEqual(metrics["daily_movements"][-1]["entries"], 30)
+        self.assertEqual(metrics["entries_this_month"], 30)
+
+    def test_metrics_are_scoped_by_company(self):
+        """Testa se os dados de outra empresa não entram nas métricas"""
+        self._create_products(3)
+        self._create_products(4, company=self.other_company, start=100)
+
+        self.assertEqual(DashboardService.get_metrics(self.company)["total_sales"], 6)
+        self.assertEqual(DashboardService.get_metrics()["total_sales"], 14)
+
+    def test_top_categories_are_scoped_by_company(self):
+        """Testa se as categorias de outra empresa não entram no ranking"""
+        other_category = Category.objects.create(
+            name="Bebidas", company=self.other_company
+        )
+        self._create_products(3)
+        Product.objects.create(
+            name="Suco",
+            category=other_category,
+            price=5,
+            expiration_date=date.today() + timedelta(days=30),
+            company=self.other_company,
+        )
+
+        top = DashboardService.get_metrics(self.company)["top_categories"]
+        self.assertEqual(
+            [(category["name"], category["product_count"]) for category in top],
+            [("Alimentos", 3)],
+        )
+
+    def test_dashboard_view_renders(self):
+        """Testa se o dashboard é renderizado com as métricas"""
+        self._create_products(3)
+        request = RequestFactory().get("/dashboard/")
+        request.user = self.user
+        response = dashboard_view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Produto 0")
+
+
+class DashboardSnapshotTests(TestCase):
+    """Testa o cache (snapshot) do dashboard por empresa"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        cache.clear()
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.other_category = Category.objects.create(
+            name="Bebidas", company=self.other_company
+        )
+
+    def _create_product(self, name, category):
+        return Product.objects.create(
+            name=name,
+            category=category,
+            quantity=5,
+            price=10,
+            expiration_date=date.today() + timedelta(days=90),
+            company=category.company,
+        )
+
+    def test_snapshot_is_served_from_cache(self):
+        """Testa se o segundo acesso não consulta o banco"""
+        self._create_product("Arroz", self.category)
+        DashboardService.get_snapshot(self.company, "manager")
+
+        with self.assertNumQueries(0):
+            snapshot = DashboardService.get_snapshot(self.company, "manager")
+        self.assertEqual(snapshot["total_products"], 1)
+
+    def test_snapshot_caches_plain_recent_sales(self):
+        """Testa se as últimas movimentações vão para o cache sem o usuário"""
+        user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        product = self._create_product("Arroz", self.category)
+        Sale.objects.create(
+            product=product, user=user, company=self.company, type="entry", quantity=3
+        )
+
+        snapshot = DashboardService.get_snapshot(self.company, "manager")
+        [sale] = snapshot["recent_sales"]
+        self.assertIsInstance(sale, dict)
+        self.assertEqual(
+            {key: sale[key] for key in ("type", "quantity", "product_name")},
+            {"type": "entry", "quantity": 3, "product_name": "Arroz"},
+        )
+        self.assertNotIn("user", sale)
+
+    def test_product_change_invalidates_company_snapshot(self):
+        """Testa se salvar um produto invalida o snapshot da empresa"""
+        DashboardService.get_snapshot(self.company, "manager")
+        DashboardService.get_snapshot(role="instock_admin")
+
+        self._create_product("Arroz", self.category)
+
+        self.assertEqual(
+            DashboardService.get_snapshot(self.company, "manager")["total_products"],
+            1,
+        )
+        self.assertEqual(
+            DashboardService.get_snapshot(role="instock_admin")["total_products"], 1
+        )
+
+    def test_other_company_snapshot_is_kept(self):
+        """Testa se a alteração de uma empresa não invalida as demais"""
+        DashboardService.get_snapshot(self.other_company, "manager")
+
+        self._create_product("Arroz", self.category)
+
+        with self.assertNumQueries(0):
+            DashboardService.get_snapshot(self.other_company, "manager")
+
+    def test_delete_invalidates_snapshot(self):
+        """Testa se excluir um registro invalida o snapshot"""
+        product = self._create_product("Arroz", self.category)
+        DashboardService.get_snapshot(self.company, "manager")
+
+        product.delete()
+
+        self.assertEqual(
+            DashboardService.get_snapshot(self.company, "manager")["total_products"],
+            0,
+        )
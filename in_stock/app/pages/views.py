@@ -1,25 +1,18 @@
 import secrets
-from datetime import timedelta
-from decimal import Decimal
 
 from django.conf import settings as django_settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.core.mail import send_mail
-from django.db.models import Count, DecimalField, F, Sum
 from django.db.models.functions import Coalesce, TruncDate
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import get_template
-from django.utils import timezone
 from django.views import View
 
 import in_stock.config.settings as settings
 from in_stock.app.pages.forms import LoginForm
-from in_stock.app.products.models import Category, Product
-from in_stock.app.reports.models import Report
-from in_stock.app.sales.models import Sale
-from in_stock.app.suppliers.models import Supplier
+from in_stock.app.pages.services import DashboardService
 from in_stock.app.users.audit_service import AuditService
 from in_stock.app.users.forms import CustomUserCreationForm
 from in_stock.app.users.models import (
@@ -45,107 +38,14 @@ def dashboard_view(request):
     if request.user.must_change_password:
         return redirect("change_password")
 
-    today = timezone.now()
-
-    # === MÉTRICAS PRINCIPAIS ===
-    total_products = Product.objects.count()
-    total_suppliers = Supplier.objects.count()
-    total_sales = Sale.objects.count()
-    total_reports = Report.objects.count()
-    total_categories = Category.objects.count()
-
-    # Quantidade total de produtos em estoque
-    total_stock = Product.objects.aggregate(total=Sum("quantity"))["total"] or 0
-
-    # Valor total do estoque (quantidade * preço)
-    stock_value = Product.objects.aggregate(
-        total=Sum(F("quantity") * F("price"), output_field=DecimalField())
-    )["total"] or Decimal("0.00")
-
-    # === MOVIMENTAÇÕES ===
-    # Movimentações do mês atual
-    first_day_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    sales_this_month = Sale.objects.filter(date__gte=first_day_of_month).count()
-
-    # Movimentações do mês anterior (para comparação)
-    first_day_last_month = (first_day_of_month - timedelta(days=1)).replace(day=1)
-    sales_last_month = Sale.objects.filter(
-        date__gte=first_day_last_month, date__lt=first_day_of_month
-    ).count()
-
-    # Calcular variação percentual
-    if sales_last_month > 0:
-        sales_variation = (
-            (sales_this_month - sales_last_month) / sales_last_month
-        ) * 100
+    # Métricas da empresa do usuário (Admin InStock vê todas as empresas)
+    if request.user.is_instock_admin:
+        metrics = DashboardService.get_snapshot(role=request.user.role)
     else:
-        sales_variation = 100 if sales_this_month > 0 else 0
-
-    # Entradas e saídas totais
-    entries = Sale.objects.filter(type="entry").count()
-    exits = Sale.objects.filter(type="exits").count()
-
-    # Entradas e saídas do mês
-    entries_this_month = Sale.objects.filter(
-        type="entry", date__gte=first_day_of_month
-    ).count()
-    exits_this_month = Sale.objects.filter(
-        type="exits", date__gte=first_day_of_month
-    ).count()
-
-    # === GRÁFICO: Movimentações dos últimos 7 dias ===
-    seven_days_ago = today - timedelta(days=7)
-    daily_movements = []
-
-    for i in range(7):
-        day = (today - timedelta(days=6 - i)).date()
-        day_entries = Sale.objects.filter(type="entry", date__date=day).count()
-        day_exits = Sale.objects.filter(type="exits", date__date=day).count()
-        daily_movements.append(
-            {
-                "date": day.strftime("%d/%m"),
-                "day_name": day.strftime("%a"),
-                "entries": day_entries,
-                "exits": day_exits,
-            }
+        metrics = DashboardService.get_snapshot(
+            request.user.company_obj, request.user.role
         )
 
-    # === ALERTAS ===
-    # Produtos com baixo estoque (menos de 10 unidades)
-    low_stock_products = Product.objects.filter(quantity__lt=10).order_by("quantity")[
-        :5
-    ]
-    low_stock_count = Product.objects.filter(quantity__lt=10).count()
-
-    # Produtos próximos do vencimento (próximos 30 dias)
-    thirty_days_from_now = today.date() + timedelta(days=30)
-    expiring_soon = Product.objects.filter(
-        expiration_date__lte=thirty_days_from_now, expiration_date__gte=today.date()
-    ).order_by("expiration_date")[:5]
-    expiring_count = Product.objects.filter(
-        expiration_date__lte=thirty_days_from_now, expiration_date__gte=today.date()
-    ).count()
-
-    # Produtos já vencidos
-    expired_products = Product.objects.filter(
-        expiration_date__lt=today.date()
-    ).order_by("expiration_date")[:5]
-    expired_count = Product.objects.filter(expiration_date__lt=today.date()).count()
-
-    # === TOP PRODUTOS ===
-    # Produtos mais movimentados (com mais saídas)
-    top_products = Product.objects.annotate(
-        movement_count=Count("sale_product")
-    ).order_by("-movement_count")[:5]
-
-    # Categorias com mais produtos
-    top_categories = Category.objects.annotate(
-        product_count=Count("products_category")
-    ).order_by("-product_count")[:5]
-
-    # === MOVIMENTAÇÕES RECENTES ===
-    recent_sales = Sale.objects.select_related("product", "user").order_by("-date")[:5]
-
     # === SOLICITAÇÕES PENDENTES (Admin) ===
     pending_requests_count = 0
     pending_requests = []
@@ -165,72 +65,10 @@ def dashboard_view(request):
         pending_requests_count = pending_requests.count()
 
     context = {
-        # Métricas principais
-        "total_products": total_products,
-        "total_suppliers": total_suppliers,
-        "total_sales": total_sales,
-        "total_reports": total_reports,
-        "total_categories": total_categories,
-        "total_stock": total_stock,
-        "stock_value": stock_value,
-        # Movimentações
-        "sales_this_month": sales_this_month,
-        "sales_last_month": sales_last_month,
-        "sales_variation": round(sales_variation, 1),
-        "entries": entries,
-        "exits": exits,
-        "entries_this_month": entries_this_month,
-        "exits_this_month": exits_this_month,
-        # Gráfico de 7 dias
-        "daily_movements": daily_movements,
-        # Alertas
-        "low_stock_products": low_stock_products,
-        "low_stock_count": low_stock_count,
-        "expiring_soon": expiring_soon,
-        "expiring_count": expiring_count,
-        "expired_products": expired_products,
-        "expired_count": expired_count,
-        # Top produtos e categorias
-        "top_products": top_products,
-        "top_categories": top_categories,
-        # Movimentações recentes
-        "recent_sales": recent_sales,
+        **metrics,
         # Admin
         "pending_requests_count": pending_requests_count,
         "pending_requests": pending_requests,
-        # === MÉTRICAS DE EFICIÊNCIA (para impressionar empresas) ===
-        # Taxa de rotatividade (giro de estoque)
-        "stock_turnover": (
-            round((exits / total_stock * 100), 1) if total_stock > 0 else 0
-        ),
-        # Produtos saudáveis (com estoque adequado e não vencidos)
-        "healthy_products": total_products - low_stock_count - expired_count,
-        "health_percentage": (
-            round(
-                (
-                    (total_products - low_stock_count - expired_count)
-                    / total_products
-                    * 100
-                ),
-                1,
-            )
-            if total_products > 0
-            else 100
-        ),
-        # Perdas evitadas (produtos com alertas ativos que foram identificados)
-        "potential_savings": (
-            round(float(stock_value) * 0.05, 2)
-            if expired_count > 0 or expiring_count > 0
-            else 0
-        ),
-        # Eficiência operacional (movimentações vs produtos)
-        "efficiency_rate": (
-            round((total_sales / total_products * 100), 1) if total_products > 0 else 0
-        ),
-        # Média de movimentações por dia (últimos 7 dias)
-        "avg_daily_movements": round(
-            sum([d["entries"] + d["exits"] for d in daily_movements]) / 7, 1
-        ),
     }
     return render(request, "pages/dashboard.html", context)
 
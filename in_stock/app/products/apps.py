@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "in_stock.app.products"
+
+    def ready(self):
+        # Registra os sinais que invalidam as contagens da listagem
+        from . import signals  # noqa: F401
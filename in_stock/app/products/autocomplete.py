@@ -0,0 +1,102 @@
+"""
+Autocomplete - Campos de escolha carregados sob demanda e filtrados por empresa
+"""
+
+from django import forms
+from django.urls import reverse
+from django.utils.html import format_html
+
+# Quantidade de resultados devolvidos pelos endpoints de autocomplete
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+INPUT_CLASS = "w-full px-4 py-2 border border-gray-300 rounded-lg"
+
+
+def for_user(queryset, user):
+    """
+    Restringe o queryset à empresa do usuário (multi-tenant): administradores
+    do InStock veem tudo; usuários sem empresa não veem nada. Sem usuário
+    (user=None) o resultado é vazio: quem chama deve informar o usuário.
+    """
+    if user is None:
+        return queryset.none()
+    if user.is_instock_admin:
+        return queryset
+    if user.company_obj:
+        return queryset.filter(company=user.company_obj)
+    return queryset.none()
+
+
+def get_limit(params):
+    """Lê o parâmetro limit, entre 1 e AUTOCOMPLETE_MAX_LIMIT"""
+    try:
+        limit = int(params.get("limit", AUTOCOMPLETE_LIMIT))
+    except (TypeError, ValueError):
+        limit = AUTOCOMPLETE_LIMIT
+    return min(max(limit, 1), AUTOCOMPLETE_MAX_LIMIT)
+
+
+class AutocompleteSelect(forms.Widget):
+    """
+    Campo de busca com autocomplete no lugar de um <select>.
+
+    Renderiza um campo oculto com o ID escolhido e um campo de texto que
+    consulta o endpoint url_name (ver static/js/autocomplete.js). Apenas a
+    opção selecionada é carregada do banco, nunca a lista inteira.
+    """
+
+    def __init__(self, url_name, placeholder="Digite para buscar...", attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.placeholder = placeholder
+
+    def _selected_label(self, value):
+        if value in (None, ""):
+            return ""
+        queryset = getattr(self.choices, "queryset", None)
+        if queryset is None:
+            return ""
+        try:
+            selected = queryset.filter(pk=value).first()
+        except (TypeError, ValueError):
+            return ""
+        return str(selected) if selected else ""
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        return format_html(
+            '<div class="autocomplete relative" data-autocomplete-url="{}">'
+            '<input type="hidden" name="{}" value="{}">'
+            '<input type="text" id="{}" class="{}" value="{}" placeholder="{}" '
+            'autocomplete="off" data-autocomplete-input{}>'
+            '<ul class="autocomplete-results hidden absolute z-10 w-full bg-white '
+            "border border-gray-200 rounded-lg shadow-md mt-1 max-h-60 "
+            'overflow-auto"></ul>'
+            "</div>",
+            reverse(self.url_name),
+            name,
+            "" if value is None else value,
+            attrs.get("id", f"id_{name}"),
+            attrs.get("class", INPUT_CLASS),
+            self._selected_label(value),
+            self.placeholder,
+            " required" if self.is_required else "",
+        )
+
+    def value_from_datadict(self, data, files, name):
+        return data.get(name)
+
+
+class AutocompleteModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField que valida apenas o ID enviado (uma query) e é
+    renderizado com AutocompleteSelect, sem montar a lista de opções.
+    """
+
+    def __init__(self, queryset, url_name, placeholder=None, **kwargs):
+        kwargs.setdefault(
+            "widget",
+            AutocompleteSelect(url_name, placeholder or "Digite para buscar..."),
+        )
+        super().__init__(queryset, **kwargs)
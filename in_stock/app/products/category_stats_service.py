@@ -0,0 +1,126 @@
+"""
+Serviço de Estatísticas de Categorias - Produtos, unidades e valor em estoque
+por categoria, em cache por empresa
+"""
+
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Product
+
+# Tempo (em segundos) que as estatísticas de categorias ficam em cache
+CATEGORY_STATS_CACHE_TIMEOUT = 300
+
+
+class CategoryStatsService:
+    """
+    Totais de produtos por categoria.
+
+    Os totais da empresa são calculados em uma única query agrupada por
+    categoria (sem ler as categorias sem produtos) e ficam em cache por
+    empresa. O cache é invalidado por versão quando um produto ou uma
+    categoria da empresa muda (ver signals.py) e quando o estoque é alterado
+    em lote, sem sinais (movimentações, importação e lotes).
+    """
+
+    @staticmethod
+    def _version_key(company_id):
+        return f"categories:stats:version:{company_id or 'all'}"
+
+    @staticmethod
+    def invalidate(company_id=None):
+        """Invalida as estatísticas da empresa e da visão geral"""
+        for scope in {company_id, None}:
+            key = CategoryStatsService._version_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), None)
+
+    @staticmethod
+    def compute(company=None):
+        """
+        Calcula os totais por categoria a partir dos produtos.
+
+        Returns:
+            dict: {id da categoria: {"name", "product_count", "units",
+                "stock_value"}, ...}
+        """
+        products = Product.objects.all()
+        if company is not None:
+            products = products.filter(company=company)
+        rows = (
+            products.values("category_id", "category__name")
+            .annotate(
+                product_count=Count("id"),
+                units=Coalesce(Sum("quantity"), 0),
+                stock_value=Sum(
+                    F("quantity") * F("price"), output_field=DecimalField()
+                ),
+            )
+            .order_by()
+        )
+        return {
+            row["category_id"]: {
+                "name": row["category__name"],
+                "product_count": row["product_count"],
+                "units": row["units"],
+                "stock_value": row["stock_value"] or Decimal("0.00"),
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def get_stats(company=None):
+        """
+        Retorna os totais por categoria da empresa (None: todas as empresas,
+        visão do Admin InStock), a partir do cache.
+        """
+        company_id = company.pk if company else None
+        version_key = CategoryStatsService._version_key(company_id)
+        version = cache.get(version_key)
+        if version is None:
+            cache.add(version_key, time.time_ns(), None)
+            version = cache.get(version_key)
+
+        key = f"categories:stats:{company_id or 'all'}:{version}"
+        return cache.get_or_set(
+            key,
+            lambda: CategoryStatsService.compute(company),
+            CATEGORY_STATS_CACHE_TIMEOUT,
+        )
+
+    @staticmethod
+    def annotate(categories, company=None):
+        """
+        Preenche product_count, units e stock_value nas categorias.
+
+        Returns:
+            list: As categorias, com os totais (zero para as sem produtos)
+        """
+        stats = CategoryStatsService.get_stats(company)
+        categories = list(categories)
+        for category in categories:
+            totals = stats.get(category.pk, {})
+            category.product_count = totals.get("product_count", 0)
+            category.units = totals.get("units", 0)
+            category.stock_value = totals.get("stock_value", Decimal("0.00"))
+        return categories
+
+    @staticmethod
+    def top_categories(company=None, limit=5):
+        """
+        Categorias com mais produtos.
+
+        Returns:
+            list: [{"id", "name", "product_count", "units", "stock_value"}, ...]
+        """
+        stats = CategoryStatsService.get_stats(company)
+        ranked = sorted(
+            stats.items(), key=lambda item: (-item[1]["product_count"], item[0])
+        )
+        return [{"id": pk, **totals} for pk, totals in ranked[:limit]]
@@ -0,0 +1,181 @@
+"""
+Serviço de Calendário de Vencimentos - Agrupa os produtos por dias até o vencimento
+"""
+
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, timedelta
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product
+
+# Faixas do calendário: (chave, rótulo, dias mínimos, dias máximos) até o
+# vencimento. None indica faixa aberta.
+EXPIRATION_BUCKETS = (
+    ("expired", "Vencidos", None, -1),
+    ("0-7", "Vencem em até 7 dias", 0, 7),
+    ("8-30", "Vencem em 8 a 30 dias", 8, 30),
+    ("31-90", "Vencem em 31 a 90 dias", 31, 90),
+)
+
+# Quantidade de produtos por página dentro de uma faixa
+EXPIRATION_PAGE_SIZE = 20
+
+
+class ExpirationCalendarService:
+    """
+    Calendário de vencimentos por empresa.
+
+    As contagens das faixas saem de uma única query agrupada, limitada ao
+    intervalo do calendário (até 90 dias) e atendida pelo índice
+    (company, expiration_date). Os produtos de cada faixa são paginados por
+    cursor em (expiration_date, id), usando o mesmo índice.
+    """
+
+    @staticmethod
+    def get_bucket(key):
+        """
+        Retorna a definição da faixa.
+
+        Raises:
+            ValueError: Se a faixa não existir
+        """
+        for bucket in EXPIRATION_BUCKETS:
+            if bucket[0] == key:
+                return bucket
+        raise ValueError(f"Faixa de vencimento inválida: {key}")
+
+    @staticmethod
+    def _date_filter(keys, today):
+        """Filtro de data que cobre as faixas informadas (contíguas)"""
+        buckets = [ExpirationCalendarService.get_bucket(key) for key in keys]
+        starts = [bucket[2] for bucket in buckets]
+        ends = [bucket[3] for bucket in buckets]
+
+        conditions = {}
+        if None not in starts:
+            conditions["expiration_date__gte"] = today + timedelta(days=min(starts))
+        if None not in ends:
+            conditions["expiration_date__lte"] = today + timedelta(days=max(ends))
+        return Q(**conditions)
+
+    @staticmethod
+    def _scoped(company=None):
+        products = Product.objects.all()
+        if company:
+            products = products.filter(company=company)
+        return products
+
+    @staticmethod
+    def get_summary(company=None, today=None):
+        """
+        Retorna a quantidade de produtos e de unidades em cada faixa.
+
+        Returns:
+            dict: {chave: {"count": produtos, "units": unidades}, ...}
+        """
+        today = today or timezone.now().date()
+        last_day = EXPIRATION_BUCKETS[-1][3]
+
+        aggregates = {}
+        for key, _, _, _ in EXPIRATION_BUCKETS:
+            condition = ExpirationCalendarService._date_filter([key], today)
+            aggregates[f"{key}__count"] = Count("id", filter=condition)
+            aggregates[f"{key}__units"] = Coalesce(Sum("quantity", filter=condition), 0)
+
+        totals = (
+            ExpirationCalendarService._scoped(company)
+            .filter(expiration_date__lte=today + timedelta(days=last_day))
+            .aggregate(**aggregates)
+        )
+        return {
+            key: {
+                "count": totals[f"{key}__count"],
+                "units": totals[f"{key}__units"],
+            }
+            for key, _, _, _ in EXPIRATION_BUCKETS
+        }
+
+    @staticmethod
+    def encode_cursor(product):
+        """Gera o cursor (expiration_date, id) de um produto"""
+        raw = f"{product.expiration_date.isoformat()}|{product.pk}"
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Lê um cursor gerado por encode_cursor (None se for inválido)"""
+        try:
+            expiration_date, pk = urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return date.fromisoformat(expiration_date), int(pk)
+        except (ValueError, UnicodeError, binascii.Error):
+            return None
+
+    @staticmethod
+    def get_page(
+        company=None,
+        buckets="0-7",
+        after=None,
+        page_size=EXPIRATION_PAGE_SIZE,
+        today=None,
+    ):
+        """
+        Retorna uma página dos produtos de uma faixa (ou de faixas contíguas),
+        do que vence primeiro ao que vence por último.
+
+        Args:
+            company: Empresa dos produtos (None: todas)
+            buckets: Chave da faixa ou lista de chaves contíguas
+            after: Cursor do último produto visto
+            page_size: Quantidade de produtos por página
+            today: Data de referência (padrão: hoje)
+
+        Returns:
+            dict: products e next_cursor (None quando não há mais páginas)
+        """
+        today = today or timezone.now().date()
+        if isinstance(buckets, str):
+            buckets = [buckets]
+
+        products = (
+            ExpirationCalendarService._scoped(company)
+            .filter(ExpirationCalendarService._date_filter(buckets, today))
+            .select_related("category")
+            .order_by("expiration_date", "id")
+        )
+        cursor = ExpirationCalendarService.decode_cursor(after) if after else None
+        if cursor:
+            expiration_date, pk = cursor
+            products = products.filter(
+                Q(expiration_date__gt=expiration_date)
+                | Q(expiration_date=expiration_date, id__gt=pk)
+            )
+
+        rows = list(products[: page_size + 1])
+        page = rows[:page_size]
+        return {
+            "products": page,
+            "next_cursor": (
+                ExpirationCalendarService.encode_cursor(page[-1])
+                if len(rows) > page_size
+                else None
+            ),
+        }
+
+    @staticmethod
+    def serialize(product, today=None):
+        """Converte o produto para o formato da API do calendário"""
+        today = today or timezone.now().date()
+        return {
+            "id": product.pk,
+            "name": product.name,
+            "batch": product.batch,
+            "category": product.category.name,
+            "quantity": product.quantity,
+            "expiration_date": product.expiration_date.isoformat(),
+            "days_to_expiry": (product.expiration_date - today).days,
+            "status": product.status,
+        }
@@ -0,0 +1,283 @@
+"""
+Serviço de Exportação - Gera planilhas e CSVs de produtos sem carregá-los em memória
+"""
+
+import csv
+import tempfile
+
+from django.db.models import Q
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from .services import ProductService
+
+# Quantidade de produtos lidos do banco por vez
+EXPORT_CHUNK_SIZE = 2000
+
+# Colunas da planilha: (título, largura)
+EXPORT_COLUMNS = (
+    ("ID", 8),
+    ("Nome", 25),
+    ("Categoria", 15),
+    ("Lote", 15),
+    ("Quantidade", 12),
+    ("Preço (R$)", 15),
+    ("Vencimento", 15),
+    ("Status", 20),
+)
+
+STATUS_LABELS = {
+    "ok": "OK",
+    "baixo": "Abaixo do Estoque",
+    "proximo_vencimento": "Próximo Vencimento",
+}
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+
+# Colunas do CSV de produtos (os mesmos nomes aceitos pela importação)
+CSV_COLUMNS = (
+    "id",
+    "name",
+    "category",
+    "batch",
+    "quantity",
+    "initial_quantity",
+    "price",
+    "expiration_date",
+    "status",
+)
+
+
+class _Echo:
+    """Buffer que devolve a linha escrita, para gerar o CSV linha a linha"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    """
+    Gera as linhas de um CSV (cabeçalho e dados) como texto, uma por vez,
+    para uso com StreamingHttpResponse.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _border():
+    thin = Side(style="thin")
+    return Border(left=thin, right=thin, top=thin, bottom=thin)
+
+
+def _named_styles():
+    """Estilos da planilha, registrados uma vez por arquivo"""
+    center = Alignment(horizontal="center", vertical="center")
+    return [
+        NamedStyle(
+            name="export_header",
+            font=Font(bold=True, color="FFFFFF", size=12),
+            fill=PatternFill(
+                start_color="FF8C00", end_color="FF8C00", fill_type="solid"
+            ),
+            alignment=center,
+            border=_border(),
+        ),
+        NamedStyle(name="export_text", border=_border()),
+        NamedStyle(name="export_number", alignment=center, border=_border()),
+        NamedStyle(
+            name="export_price", number_format='"R$" #,##0.00', border=_border()
+        ),
+        NamedStyle(
+            name="export_date",
+            number_format="DD/MM/YYYY",
+            alignment=center,
+            border=_border(),
+        ),
+    ]
+
+
+# Estilo de cada coluna, na ordem de EXPORT_COLUMNS
+COLUMN_STYLES = (
+    "export_number",
+    "export_text",
+    "export_text",
+    "export_text",
+    "export_number",
+    "export_price",
+    "export_date",
+    "export_text",
+)
+
+
+class ProductExportService:
+    """
+    Exportação de produtos para XLSX.
+
+    A planilha é gerada com o openpyxl em modo write_only: cada linha é
+    gravada em disco assim que é adicionada, e os produtos são lidos do
+    banco em blocos (keyset) apenas com as colunas exportadas. Os
+    estilos são NamedStyles registrados uma única vez no arquivo, em vez
+    de objetos de estilo aplicados célula a célula. A memória usada não
+    depende da quantidade de produtos.
+    """
+
+    @staticmethod
+    def iter_chunks(products, fields, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Lê os produtos em ordem de (name, expiration_date, id), em blocos de
+        chunk_size.
+
+        Cada bloco é uma query com LIMIT que continua do último produto lido
+        (keyset), seguindo o índice (company, name, expiration_date): nenhum
+        driver precisa manter o resultado inteiro em memória, ao contrário de
+        iterator() com drivers sem cursor no servidor (PyMySQL).
+
+        Args:
+            products: Produtos já filtrados
+            fields: Campos de values_list (devem incluir "id", "name" e
+                "expiration_date")
+            chunk_size: Quantidade de produtos por bloco
+
+        Returns:
+            generator: listas de tuplas com os valores de fields
+        """
+        indexes = [fields.index(name) for name in ("name", "expiration_date", "id")]
+        products, _ = ProductService.sort(products, "name")
+        products = products.values_list(*fields)
+        last = None
+        while True:
+            chunk = products
+            if last:
+                name, expiration_date, pk = last
+                chunk = chunk.filter(
+                    Q(name__gt=name)
+                    | Q(name=name, expiration_date__gt=expiration_date)
+                    | Q(name=name, expiration_date=expiration_date, id__gt=pk)
+                )
+            rows = list(chunk[:chunk_size])
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            last = [rows[-1][index] for index in indexes]
+
+    @staticmethod
+    def get_rows(products, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Retorna as linhas da exportação, lidas do banco em blocos.
+
+        Returns:
+            generator: listas com os valores de cada coluna de EXPORT_COLUMNS
+        """
+        fields = [
+            "id",
+            "name",
+            "category__name",
+            "batch",
+            "quantity",
+            "price",
+            "expiration_date",
+            "status",
+        ]
+        for rows in ProductExportService.iter_chunks(products, fields, chunk_size):
+            for pk, name, category, batch, quantity, price, expiration, status in rows:
+                yield [
+                    pk,
+                    name,
+                    category,
+                    batch or "-",
+                    quantity,
+                    price,
+                    expiration,
+                    STATUS_LABELS.get(status, "-"),
+                ]
+
+    @staticmethod
+    def iter_csv(products, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Gera o CSV de produtos linha a linha, com valores brutos (datas ISO,
+        preço com ponto decimal e o código do status) para uso em BI.
+        """
+        fields = [
+            "id",
+            "name",
+            "category__name",
+            "batch",
+            "quantity",
+            "initial_quantity",
+            "price",
+            "expiration_date",
+            "status",
+        ]
+        rows = (
+            row
+            for chunk in ProductExportService.iter_chunks(products, fields, chunk_size)
+            for row in chunk
+        )
+        return csv_lines(CSV_COLUMNS, rows)
+
+    @staticmethod
+    def write_xlsx(products, output, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Grava a planilha de produtos em output (caminho ou arquivo binário).
+
+        Returns:
+            int: Quantidade de produtos exportados
+        """
+        workbook = Workbook(write_only=True)
+        for style in _named_styles():
+            workbook.add_named_style(style)
+
+        sheet = workbook.create_sheet("Produtos")
+        for index, (_, width) in enumerate(EXPORT_COLUMNS):
+            sheet.column_dimensions[get_column_letter(index + 1)].width = width
+
+        def styled_cells(styles):
+            cells = []
+            for style in styles:
+                cell = WriteOnlyCell(sheet)
+                cell.style = style
+                cells.append(cell)
+            return cells
+
+        header = styled_cells(["export_header"] * len(EXPORT_COLUMNS))
+        for cell, (title, _) in zip(header, EXPORT_COLUMNS):
+            cell.value = title
+        sheet.append(header)
+
+        # No modo write_only cada linha é gravada no momento do append, então
+        # as mesmas células (com o estilo já aplicado) servem para todas as
+        # linhas: basta trocar os valores
+        cells = styled_cells(COLUMN_STYLES)
+        count = 0
+        for row in ProductExportService.get_rows(products, chunk_size):
+            for cell, value in zip(cells, row):
+                cell.value = value
+            sheet.append(cells)
+            count += 1
+
+        workbook.save(output)
+        return count
+
+    @staticmethod
+    def export_xlsx(products, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Gera a planilha em um arquivo temporário, pronto para ser enviado
+        em partes (FileResponse).
+
+        Returns:
+            file: Arquivo temporário posicionado no início
+        """
+        output = tempfile.TemporaryFile()
+        try:
+            ProductExportService.write_xlsx(products, output, chunk_size)
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+        return output
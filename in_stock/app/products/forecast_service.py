@@ -0,0 +1,233 @@
+"""
+Serviço de Previsão - Demanda diária e ponto de pedido dos produtos a partir das saídas
+"""
+
+import math
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from in_stock.app.sales.models import Sale
+
+from .models import Product, ProductForecast
+
+# Dias de histórico de saídas considerados
+HISTORY_DAYS = 90
+
+# Janela da média móvel e do desvio padrão da demanda
+MOVING_AVERAGE_DAYS = 28
+
+# Peso do dia mais recente na suavização exponencial
+SMOOTHING_ALPHA = 0.2
+
+# Dias entre o pedido ao fornecedor e a chegada da mercadoria
+LEAD_TIME_DAYS = 7
+
+# Fator do nível de serviço no estoque de segurança (1,65 ~ 95%)
+SERVICE_LEVEL_Z = 1.65
+
+# Quantidade de previsões gravadas por INSERT
+FORECAST_BATCH_SIZE = 2000
+
+
+class DemandForecastService:
+    """
+    Previsão de demanda e ponto de pedido por produto.
+
+    As saídas da empresa nos últimos HISTORY_DAYS dias são lidas em uma
+    única query agrupada por produto e dia e montadas em uma matriz NumPy
+    (produtos x dias). A média móvel, o desvio padrão e a suavização
+    exponencial são calculados para todos os produtos de uma vez, com
+    operações sobre a matriz inteira:
+
+        ponto de pedido = demanda diária x prazo de entrega
+                          + z x desvio padrão x raiz(prazo de entrega)
+
+    Os dias anteriores ao cadastro do produto não entram nas contas. O
+    resultado é gravado em ProductForecast e usado nos alertas de estoque
+    do dashboard e na listagem de produtos.
+    """
+
+    @staticmethod
+    def reorder_condition(fallback_threshold):
+        """
+        Condição dos produtos que precisam de reposição: estoque no ponto de
+        pedido ou abaixo dele. Produtos ainda sem previsão, ou com ponto de
+        pedido zero (sem saídas no histórico), usam o limite fixo de
+        unidades: um produto sem estoque continua aparecendo no alerta.
+        """
+        return Q(
+            forecast__reorder_point__gt=0,
+            forecast__reorder_point__gte=F("quantity"),
+        ) | (
+            (Q(forecast__isnull=True) | Q(forecast__reorder_point=0))
+            & Q(quantity__lt=fallback_threshold)
+        )
+
+    @staticmethod
+    def load_history(company=None, today=None, days=HISTORY_DAYS):
+        """
+        Lê as saídas dos produtos da empresa por dia.
+
+        Returns:
+            tuple: (ids dos produtos, matriz produtos x dias com as unidades
+                que saíram, índice do primeiro dia de cada produto)
+        """
+        today = today or timezone.localdate()
+        start = today - timedelta(days=days - 1)
+
+        products = Product.objects.filter(company=company).order_by("id")
+        ids = []
+        first_days = []
+        for pk, created_at in products.values_list("id", "created_at"):
+            ids.append(pk)
+            created = timezone.localtime(created_at).date()
+            first_days.append(min(max((created - start).days, 0), days - 1))
+
+        history = np.zeros((len(ids), days))
+        if not ids:
+            return np.array(ids), history, np.array(first_days, dtype=int)
+
+        rows = (
+            Sale.objects.filter(
+                company=company,
+                type="exits",
+                date__gte=timezone.make_aware(datetime.combine(start, time.min)),
+            )
+            .annotate(day=TruncDate("date"))
+            .values_list("product_id", "day")
+            .annotate(units=Sum("quantity"))
+            .order_by()
+        )
+        positions = {pk: index for index, pk in enumerate(ids)}
+        product_rows = []
+        day_columns = []
+        units = []
+        for product_id, day, total in rows:
+            column = (day - start).days
+            if product_id in positions and 0 <= column < days:
+                product_rows.append(positions[product_id])
+                day_columns.append(column)
+                units.append(total)
+        np.add.at(history, (product_rows, day_columns), units)
+        return np.array(ids), history, np.array(first_days, dtype=int)
+
+    @staticmethod
+    def forecast(
+        history,
+        first_days,
+        window=MOVING_AVERAGE_DAYS,
+        alpha=SMOOTHING_ALPHA,
+        lead_time=LEAD_TIME_DAYS,
+        z=SERVICE_LEVEL_Z,
+    ):
+        """
+        Calcula a previsão de todos os produtos da matriz.
+
+        Args:
+            history: Matriz produtos x dias com as unidades que saíram
+            first_days: Índice do primeiro dia de cada produto
+
+        Returns:
+            dict: Arrays moving_average, daily_demand, demand_std,
+                safety_stock e reorder_point, um valor por produto
+        """
+        products, days = history.shape
+        observed = np.arange(days)[None, :] >= first_days[:, None]
+
+        # Média móvel e desvio padrão na janela recente
+        recent = history[:, -window:]
+        recent_observed = observed[:, -window:]
+        counts = recent_observed.sum(axis=1)
+        moving_average = np.where(recent_observed, recent, 0).sum(axis=1) / (
+            np.maximum(counts, 1)
+        )
+        deviations = np.where(recent_observed, recent - moving_average[:, None], 0)
+        demand_std = np.sqrt((deviations**2).sum(axis=1) / np.maximum(counts - 1, 1))
+
+        # Suavização exponencial, a partir do primeiro dia de cada produto
+        level = np.zeros(products)
+        for day in range(days):
+            values = history[:, day]
+            level = np.where(
+                first_days < day,
+                alpha * values + (1 - alpha) * level,
+                np.where(first_days == day, values, level),
+            )
+
+        safety_stock = z * demand_std * math.sqrt(lead_time)
+        reorder_point = level * lead_time + safety_stock
+        return {
+            "moving_average": moving_average,
+            "daily_demand": level,
+            "demand_std": demand_std,
+            # Tolerância para erros de arredondamento antes do ceil
+            "safety_stock": np.ceil(safety_stock - 1e-9).astype(int),
+            "reorder_point": np.ceil(reorder_point - 1e-9).astype(int),
+        }
+
+    @staticmethod
+    def recompute(company=None, today=None, days=HISTORY_DAYS):
+        """
+        Recalcula e grava as previsões dos produtos da empresa (None: os
+        produtos sem empresa), substituindo as anteriores.
+
+        Returns:
+            int: Quantidade de produtos calculados
+        """
+        ids, history, first_days = DemandForecastService.load_history(
+            company, today, days
+        )
+        result = DemandForecastService.forecast(history, first_days)
+        now = timezone.now()
+        company_id = getattr(company, "pk", company)
+
+        forecasts = [
+            ProductForecast(
+                product_id=int(pk),
+                company_id=company_id,
+                moving_average=float(result["moving_average"][index]),
+                daily_demand=float(result["daily_demand"][index]),
+                demand_std=float(result["demand_std"][index]),
+                safety_stock=int(result["safety_stock"][index]),
+                reorder_point=int(result["reorder_point"][index]),
+                computed_at=now,
+            )
+            for index, pk in enumerate(ids)
+        ]
+        with transaction.atomic():
+            # Inclui as previsões gravadas com outra empresa para produtos que
+            # hoje são desta (produto transferido): a chave é o produto
+            ProductForecast.objects.filter(
+                Q(company=company) | Q(product__company=company)
+            ).delete()
+            ProductForecast.objects.bulk_create(
+                forecasts, batch_size=FORECAST_BATCH_SIZE
+            )
+
+        from in_stock.app.pages.services import DashboardService
+
+        DashboardService.invalidate(company_id)
+        return len(forecasts)
+
+    @staticmethod
+    def recompute_all(company_ids=None, today=None, days=HISTORY_DAYS):
+        """
+        Recalcula as previsões de todas as empresas (ou das informadas).
+
+        Returns:
+            dict: {id da empresa: quantidade de produtos}
+        """
+        companies = (
+            Product.objects.order_by().values_list("company_id", flat=True).distinct()
+        )
+        if company_ids:
+            companies = companies.filter(company_id__in=company_ids)
+        return {
+            company_id: DemandForecastService.recompute(company_id, today, days)
+            for company_id in list(companies)
+        }
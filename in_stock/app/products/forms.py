@@ -2,18 +2,20 @@ from django import forms
 
 from in_stock.app.suppliers.models import Supplier
 
-from .models import Category, Product
+from .autocomplete import AutocompleteModelChoiceField, for_user
+from .models import Category, Lot, Product
 
 
 class ProductForm(forms.ModelForm):
-    supplier = forms.ModelChoiceField(
+    supplier = AutocompleteModelChoiceField(
         queryset=Supplier.objects.all(),
+        url_name="supplier-autocomplete",
+        placeholder="Busque um fornecedor pelo nome ou CNPJ",
         required=True,
-        empty_label="Selecione um fornecedor",
-        error_messages={"required": "Escolha um fornecedor para o produto."},
-        widget=forms.Select(
-            attrs={"class": "w-full px-4 py-2 border border-gray-300 rounded-lg"}
-        ),
+        error_messages={
+            "required": "Escolha um fornecedor para o produto.",
+            "invalid_choice": "Fornecedor não encontrado.",
+        },
     )
     image = forms.ImageField(required=False)
 
@@ -93,6 +95,12 @@ class ProductForm(forms.ModelForm):
             },
         }
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Fornecedores e categorias apenas da empresa do usuário
+        self.fields["supplier"].queryset = for_user(Supplier.objects.all(), user)
+        self.fields["category"].queryset = for_user(Category.objects.all(), user)
+
 
 class CategoryForm(forms.ModelForm):
     class Meta:
@@ -134,3 +142,47 @@ class ProductEditForm(forms.ModelForm):
                 }
             ),
         }
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["category"].queryset = for_user(Category.objects.all(), user)
+
+
+class LotForm(forms.ModelForm):
+    """Form para adicionar um lote a um produto existente"""
+
+    class Meta:
+        model = Lot
+        fields = ["batch", "quantity", "expiration_date"]
+        widgets = {
+            "batch": forms.TextInput(
+                attrs={"class": "w-full px-4 py-2 border border-gray-300 rounded-lg"}
+            ),
+            "quantity": forms.NumberInput(
+                attrs={
+                    "class": "w-full px-4 py-2 border border-gray-300 rounded-lg",
+                    "type": "number",
+                    "min": "1",
+                }
+            ),
+            "expiration_date": forms.DateInput(
+                attrs={
+                    "class": "w-full px-4 py-2 border border-gray-300 rounded-lg",
+                    "type": "date",
+                }
+            ),
+        }
+        error_messages = {
+            "quantity": {
+                "required": "A quantidade do lote não pode ficar em branco.",
+            },
+            "expiration_date": {
+                "required": "A data de validade do lote não pode ficar em branco.",
+            },
+        }
+
+    def clean_quantity(self):
+        quantity = self.cleaned_data["quantity"]
+        if quantity <= 0:
+            raise forms.ValidationError("A quantidade deve ser maior que zero.")
+        return quantity
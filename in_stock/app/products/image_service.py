@@ -0,0 +1,255 @@
+"""
+Serviço de Imagens - Armazena as imagens dos produtos por hash e gera miniaturas
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps
+
+from .models import Product
+
+# Pasta das imagens no storage
+IMAGE_DIR = "products"
+
+# Variantes geradas para cada imagem: nome -> (largura, altura, modo). "fit"
+# recorta a imagem no tamanho exato; "contain" mantém a proporção dentro do
+# tamanho máximo
+IMAGE_VARIANTS = {
+    "thumb": (96, 96, "fit"),
+    "medium": (480, 480, "contain"),
+}
+
+IMAGE_QUALITY = 80
+
+# Extensão do original por formato detectado no conteúdo: o nome depende só
+# do hash, e não do nome do arquivo enviado (foto.JPEG e foto.jpg são o mesmo
+# arquivo)
+IMAGE_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "GIF": ".gif",
+    "WEBP": ".webp",
+    "BMP": ".bmp",
+}
+
+
+class ProductImageService:
+    """
+    Imagens de produtos endereçadas pelo conteúdo.
+
+    O arquivo original e suas variantes WebP são gravados com o SHA-256 do
+    conteúdo no nome (products/ab/abcd....jpg, products/ab/abcd..._thumb.webp):
+    a mesma imagem enviada para vários produtos é gravada uma única vez, e
+    como o conteúdo de um nome nunca muda, os arquivos podem ser servidos
+    com cache permanente. A extensão do original vem do formato da imagem
+    (e não do nome enviado), então cada conteúdo tem um único nome. Um
+    arquivo só é removido quando nenhum produto o referencia mais.
+
+    No cadastro e na edição, as variantes (duas imagens pequenas) são
+    geradas na própria requisição, antes de o produto ser salvo: o produto
+    nunca aponta para variantes que ainda não existem. O processamento em
+    paralelo (ThreadPoolExecutor) é usado pelo comando build_product_images,
+    que migra e regera as imagens já existentes.
+    """
+
+    @staticmethod
+    def content_hash(file):
+        """Calcula o SHA-256 do arquivo, lendo em partes"""
+        digest = hashlib.sha256()
+        file.seek(0)
+        for chunk in iter(lambda: file.read(64 * 1024), b""):
+            digest.update(chunk)
+        file.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def extension(file):
+        """
+        Extensão do arquivo original a partir do formato da imagem. Arquivos
+        que o Pillow não reconhece mantêm a extensão do nome enviado.
+        """
+        file.seek(0)
+        try:
+            image_format = Image.open(file).format
+        except (OSError, SyntaxError, ValueError):
+            image_format = None
+        finally:
+            file.seek(0)
+        if image_format:
+            return IMAGE_EXTENSIONS.get(image_format, f".{image_format.lower()}")
+        return os.path.splitext(file.name or "")[1].lower() or ".jpg"
+
+    @staticmethod
+    def original_name(image_hash, extension):
+        return f"{IMAGE_DIR}/{image_hash[:2]}/{image_hash}{extension}"
+
+    @staticmethod
+    def variant_name(image_hash, variant):
+        return f"{IMAGE_DIR}/{image_hash[:2]}/{image_hash}_{variant}.webp"
+
+    @staticmethod
+    def variant_url(image_hash, variant):
+        return default_storage.url(
+            ProductImageService.variant_name(image_hash, variant)
+        )
+
+    @staticmethod
+    def store(file):
+        """
+        Grava o arquivo original pelo hash do conteúdo (se ainda não existir).
+
+        Returns:
+            tuple: (nome no storage, hash)
+        """
+        image_hash = ProductImageService.content_hash(file)
+        extension = ProductImageService.extension(file)
+        name = ProductImageService.original_name(image_hash, extension)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, file)
+        return name, image_hash
+
+    @staticmethod
+    def generate_variants(image_hash, source_name, force=False):
+        """
+        Gera as variantes WebP de uma imagem já gravada.
+
+        Returns:
+            int: Quantidade de variantes geradas
+        """
+        missing = {
+            variant: size
+            for variant, size in IMAGE_VARIANTS.items()
+            if force
+            or not default_storage.exists(
+                ProductImageService.variant_name(image_hash, variant)
+            )
+        }
+        if not missing:
+            return 0
+
+        with default_storage.open(source_name, "rb") as source:
+            image = Image.open(source)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        for variant, (width, height, mode) in missing.items():
+            if mode == "fit":
+                resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail((width, height), Image.LANCZOS)
+
+            buffer = BytesIO()
+            resized.save(buffer, "WEBP", quality=IMAGE_QUALITY, method=4)
+            name = ProductImageService.variant_name(image_hash, variant)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+        return len(missing)
+
+    @staticmethod
+    def attach(product, file):
+        """
+        Grava a imagem enviada, gera as variantes e a associa ao produto
+        (sem salvar o produto). A imagem anterior deve ser liberada com
+        release() depois que o produto for salvo.
+        """
+        name, image_hash = ProductImageService.store(file)
+        ProductImageService.generate_variants(image_hash, name)
+        product.image = name
+        product.image_hash = image_hash
+
+    @staticmethod
+    def release(name, image_hash=""):
+        """
+        Remove o arquivo original se nenhum produto o referencia mais e as
+        variantes se nenhum produto usa mais o hash. As duas referências são
+        conferidas separadamente: originais gravados antes da extensão
+        normalizada podem ter o mesmo hash com outro nome.
+
+        Returns:
+            bool: True se o arquivo original foi removido
+        """
+        if not name:
+            return False
+        names = []
+        if not Product.objects.filter(image=name).exists():
+            names.append(name)
+        if image_hash and not Product.objects.filter(image_hash=image_hash).exists():
+            names += [
+                ProductImageService.variant_name(image_hash, variant)
+                for variant in IMAGE_VARIANTS
+            ]
+        for file_name in names:
+            if default_storage.exists(file_name):
+                default_storage.delete(file_name)
+        return name in names
+
+    @staticmethod
+    def _backfill_image(name, force):
+        """Processa uma imagem em uma conexão própria da thread"""
+        try:
+            return ProductImageService.backfill_image(name, force)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def backfill_image(name, force=False):
+        """
+        Migra uma imagem para o armazenamento por hash e gera as variantes.
+
+        Todos os produtos que usam o arquivo passam a apontar para o novo
+        nome; o arquivo antigo é removido quando deixa de ser referenciado.
+
+        Returns:
+            int: Quantidade de variantes geradas
+        """
+        if not default_storage.exists(name):
+            return 0
+        with default_storage.open(name, "rb") as file:
+            new_name, image_hash = ProductImageService.store(file)
+
+        Product.objects.filter(image=name).update(image=new_name, image_hash=image_hash)
+        if new_name != name:
+            ProductImageService.release(name)
+        return ProductImageService.generate_variants(image_hash, new_name, force)
+
+    @staticmethod
+    def backfill(product_ids=None, workers=4, force=False):
+        """
+        Processa as imagens dos produtos em paralelo (ThreadPoolExecutor).
+
+        Sem force, apenas as imagens sem hash (enviadas antes do
+        armazenamento por hash) são processadas.
+
+        Returns:
+            dict: images (arquivos processados) e variants (variantes geradas)
+        """
+        products = Product.objects.exclude(image="").exclude(image__isnull=True)
+        if product_ids:
+            products = products.filter(pk__in=product_ids)
+        if not force:
+            products = products.filter(image_hash="")
+        names = list(products.order_by().values_list("image", flat=True).distinct())
+
+        if workers <= 1:
+            generated = [
+                ProductImageService.backfill_image(name, force) for name in names
+            ]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                generated = list(
+                    executor.map(
+                        lambda name: ProductImageService._backfill_image(name, force),
+                        names,
+                    )
+                )
+        return {"images": len(names), "variants": sum(generated)}
@@ -0,0 +1,400 @@
+"""
+Serviço de Importação - Cadastra produtos em lote a partir de planilhas XLSX/CSV
+"""
+
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models.functions import Lower
+from openpyxl import load_workbook
+
+from in_stock.app.suppliers.models import Supplier
+from in_stock.app.users.stats_service import CompanyStatsService
+
+from .category_stats_service import CategoryStatsService
+from .lot_service import LotService
+from .models import Category, Product, ProductSupplier
+from .search_service import ProductSearchService, fold
+from .services import ProductService
+
+# Quantidade de linhas validadas e gravadas por vez
+IMPORT_CHUNK_SIZE = 1000
+
+# Nomes de coluna aceitos (sem acentos, em minúsculas) para cada campo. Os
+# cabeçalhos da exportação de produtos também são aceitos.
+IMPORT_COLUMNS = {
+    "name": ("name", "nome", "produto"),
+    "category": ("category", "categoria"),
+    "batch": ("batch", "lote"),
+    "quantity": ("quantity", "quantidade"),
+    "initial_quantity": ("initial_quantity", "quantidade inicial"),
+    "price": ("price", "preco", "preco (r$)"),
+    "expiration_date": ("expiration_date", "vencimento", "data de vencimento"),
+    "supplier": ("supplier", "fornecedor", "cnpj do fornecedor"),
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y")
+
+
+def _normalize(text):
+    """Remove acentos e espaços extras e converte para minúsculas"""
+    return fold(text).strip()
+
+
+def _name_key(name):
+    """
+    Chave de nome sem diferenciar maiúsculas, como na collation do MySQL:
+    "Leite" e "leite" na mesma categoria violam a unicidade.
+    """
+    return name.casefold()
+
+
+def _only_digits(text):
+    return "".join(c for c in str(text or "") if c.isdigit())
+
+
+class ProductImportService:
+    """
+    Importa catálogos de produtos (XLSX ou CSV) em lotes.
+
+    O arquivo é lido como stream (openpyxl em modo read_only ou o módulo
+    csv) e processado em blocos de IMPORT_CHUNK_SIZE linhas: a memória
+    usada depende do tamanho do bloco, não do tamanho do arquivo. Cada
+    bloco é validado, tem as duplicidades consultadas em uma única query e
+    é gravado com bulk_create em uma transação própria. Linhas com erro são
+    ignoradas e informadas com o número da linha.
+    """
+
+    @staticmethod
+    def read_rows(upload):
+        """
+        Lê as linhas do arquivo enviado como dicts {campo: valor}.
+
+        Returns:
+            generator: (número da linha, dict) a partir da linha 2
+
+        Raises:
+            ValueError: Se o formato não for suportado ou faltar uma coluna
+                obrigatória
+        """
+        name = (upload.name or "").lower()
+        if name.endswith(".xlsx"):
+            rows = ProductImportService._read_xlsx(upload)
+        elif name.endswith(".csv"):
+            rows = ProductImportService._read_csv(upload)
+        else:
+            raise ValueError("Envie um arquivo .xlsx ou .csv.")
+
+        header = next(rows, None)
+        if not header:
+            raise ValueError("O arquivo está vazio.")
+
+        aliases = {
+            alias: field for field, names in IMPORT_COLUMNS.items() for alias in names
+        }
+        columns = [aliases.get(_normalize(title)) for title in header]
+        missing = {"name", "category", "price", "expiration_date"} - set(columns)
+        if missing:
+            raise ValueError(
+                "Colunas obrigatórias ausentes: " + ", ".join(sorted(missing)) + "."
+            )
+
+        def generate():
+            for number, values in enumerate(rows, start=2):
+                if not any(value not in (None, "") for value in values):
+                    continue
+                yield number, {
+                    field: value
+                    for field, value in zip(columns, values)
+                    if field is not None
+                }
+
+        return generate()
+
+    @staticmethod
+    def _read_xlsx(upload):
+        try:
+            workbook = load_workbook(upload, read_only=True, data_only=True)
+        except Exception:
+            raise ValueError("Arquivo XLSX inválido.")
+
+        def generate():
+            try:
+                yield from workbook.active.iter_rows(values_only=True)
+            finally:
+                workbook.close()
+
+        return generate()
+
+    @staticmethod
+    def _read_csv(upload):
+        text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;")
+        except csv.Error:
+            dialect = csv.excel
+        return csv.reader(text, dialect)
+
+    @staticmethod
+    def _parse(values):
+        """Valida e converte os valores de uma linha"""
+        errors = []
+        data = {}
+
+        name = str(values.get("name") or "").strip()
+        if not name:
+            errors.append("Informe o nome do produto.")
+        elif len(name) > 250:
+            errors.append("O nome deve ter no máximo 250 caracteres.")
+        data["name"] = name
+
+        category = str(values.get("category") or "").strip()
+        if not category:
+            errors.append("Informe a categoria.")
+        elif len(category) > 200:
+            errors.append("A categoria deve ter no máximo 200 caracteres.")
+        data["category"] = category
+
+        batch = str(values.get("batch") or "").strip()
+        if len(batch) > 100:
+            errors.append("O lote deve ter no máximo 100 caracteres.")
+        data["batch"] = batch or None
+
+        for field, label, default in (
+            ("quantity", "quantidade", 1),
+            ("initial_quantity", "quantidade inicial", None),
+        ):
+            value = values.get(field)
+            if value in (None, ""):
+                data[field] = default
+                continue
+            try:
+                number = Decimal(str(value).strip())
+                if number != number.to_integral_value() or number < 0:
+                    raise InvalidOperation
+                data[field] = int(number)
+            except InvalidOperation:
+                errors.append(f"A {label} deve ser um inteiro maior ou igual a zero.")
+        if data.get("initial_quantity") is None:
+            data["initial_quantity"] = data.get("quantity") or 1
+
+        price = values.get("price")
+        try:
+            price = Decimal(str(price).strip().replace(",", "."))
+            if price < 0 or price >= Decimal("100000000"):
+                raise InvalidOperation
+            data["price"] = price.quantize(Decimal("0.01"))
+        except InvalidOperation:
+            errors.append("Preço inválido.")
+
+        expiration_date = values.get("expiration_date")
+        if isinstance(expiration_date, datetime):
+            expiration_date = expiration_date.date()
+        if not isinstance(expiration_date, date):
+            text = str(expiration_date or "").strip()
+            expiration_date = None
+            for fmt in DATE_FORMATS:
+                try:
+                    expiration_date = datetime.strptime(text, fmt).date()
+                    break
+                except ValueError:
+                    continue
+            if expiration_date is None:
+                errors.append("Data de vencimento inválida (use AAAA-MM-DD).")
+        data["expiration_date"] = expiration_date
+
+        data["supplier"] = str(values.get("supplier") or "").strip()
+        return data, errors
+
+    @staticmethod
+    def import_products(rows, company, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+        """
+        Importa os produtos das linhas para a empresa.
+
+        Categorias inexistentes são criadas. Fornecedores são procurados
+        pelo CNPJ ou pelo nome, entre os fornecedores da empresa.
+
+        Args:
+            rows: Iterável de (número da linha, dict), como em read_rows()
+            company: Empresa dos produtos
+            chunk_size: Quantidade de linhas por bloco
+            dry_run: Apenas valida, sem gravar
+
+        Returns:
+            dict: created (quantidade) e errors ([{"line": n, "errors": [...]}])
+        """
+        # Mapas de consulta montados uma única vez
+        categories = {
+            _normalize(category.name): category
+            for category in Category.objects.filter(company=company)
+        }
+        suppliers = {}
+        for supplier in Supplier.objects.filter(company=company):
+            suppliers[_only_digits(supplier.cnpj)] = supplier
+            suppliers[_normalize(supplier.name)] = supplier
+
+        created = 0
+        errors = []
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            count, chunk_errors = ProductImportService._import_chunk(
+                chunk, company, categories, suppliers, dry_run
+            )
+            created += count
+            errors.extend(chunk_errors)
+
+        if created and not dry_run:
+            ProductService.invalidate_count(company.pk)
+            CategoryStatsService.invalidate(company.pk)
+            from in_stock.app.pages.services import DashboardService
+
+            DashboardService.invalidate(company.pk)
+
+        return {"created": created, "errors": errors}
+
+    @staticmethod
+    def _import_chunk(chunk, company, categories, suppliers, dry_run):
+        """Valida e grava um bloco de linhas"""
+        errors = []
+        valid = []
+        for number, values in chunk:
+            data, row_errors = ProductImportService._parse(values)
+            supplier = None
+            if data["supplier"]:
+                digits = _only_digits(data["supplier"])
+                supplier = (suppliers.get(digits) if digits else None) or suppliers.get(
+                    _normalize(data["supplier"])
+                )
+                if supplier is None:
+                    row_errors.append(f"Fornecedor {data['supplier']} não encontrado.")
+            if row_errors:
+                errors.append({"line": number, "errors": row_errors})
+            else:
+                valid.append((number, data, supplier))
+
+        with transaction.atomic():
+            # Categorias novas do bloco, criadas de uma vez
+            new_categories = {}
+            for _, data, _ in valid:
+                key = _normalize(data["category"])
+                if key not in categories and key not in new_categories:
+                    new_categories[key] = Category(
+                        name=data["category"], company=company
+                    )
+            if new_categories and not dry_run:
+                Category.objects.bulk_create(list(new_categories.values()))
+                if any(category.pk is None for category in new_categories.values()):
+                    for category in Category.objects.filter(
+                        company=company,
+                        name__in=[c.name for c in new_categories.values()],
+                    ):
+                        new_categories[_normalize(category.name)] = category
+            categories.update(new_categories)
+
+            # Produtos já cadastrados (nome + categoria) em uma única query
+            existing = set()
+            category_ids = {
+                categories[_normalize(data["category"])].pk for _, data, _ in valid
+            } - {None}
+            if category_ids:
+                existing = {
+                    (_name_key(name), category_id)
+                    for name, category_id in Product.objects.annotate(
+                        name_key=Lower("name")
+                    )
+                    .filter(
+                        category_id__in=category_ids,
+                        name_key__in={data["name"].lower() for _, data, _ in valid},
+                    )
+                    .values_list("name", "category_id")
+                }
+
+            products = []
+            links = []
+            stock = 0
+            value = 0
+            for number, data, supplier in valid:
+                category = categories[_normalize(data["category"])]
+                key = (
+                    _name_key(data["name"]),
+                    category.pk or _normalize(data["category"]),
+                )
+                if key in existing:
+                    errors.append(
+                        {
+                            "line": number,
+                            "errors": [
+                                f"O produto {data['name']} já existe na categoria "
+                                f"{category.name}."
+                            ],
+                        }
+                    )
+                    continue
+                existing.add(key)
+
+                product = Product(
+                    name=data["name"],
+                    category=category,
+                    batch=data["batch"],
+                    quantity=data["quantity"],
+                    initial_quantity=data["initial_quantity"],
+                    price=data["price"],
+                    expiration_date=data["expiration_date"],
+                    company=company,
+                )
+                # bulk_create não chama save()
+                product.status = product.get_status()
+                products.append(product)
+                links.append(supplier)
+                stock += product.quantity
+                value += CompanyStatsService.stock_value(
+                    product.quantity, product.price
+                )
+
+            if dry_run or not products:
+                return len(products), errors
+
+            Product.objects.bulk_create(products, batch_size=500)
+            if any(product.pk is None for product in products):
+                # Bancos sem RETURNING no bulk_create (MySQL): busca os ids
+                ids = {
+                    (name, category_id): pk
+                    for pk, name, category_id in Product.objects.filter(
+                        category_id__in={p.category_id for p in products},
+                        name__in={p.name for p in products},
+                    ).values_list("pk", "name", "category_id")
+                }
+                for product in products:
+                    product.pk = ids[(product.name, product.category_id)]
+
+            ProductSupplier.objects.bulk_create(
+                [
+                    ProductSupplier(product=product, supplier=supplier)
+                    for product, supplier in zip(products, links)
+                    if supplier is not None
+                ],
+                batch_size=500,
+            )
+
+            # bulk_create não dispara os sinais de CompanyStats, do índice
+            # de busca nem dos lotes
+            ProductSearchService.index_products(products, created=True)
+            LotService.create_initial_lots(products)
+            CompanyStatsService.apply_delta(
+                company.pk,
+                total_products=len(products),
+                total_stock=stock,
+                stock_value=value,
+            )
+
+        errors.sort(key=lambda error: error["line"])
+        return len(products), errors
@@ -0,0 +1,277 @@
+"""
+Serviço de Lotes - Quantidade e vencimento por lote, agregados no produto
+"""
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Exists,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.utils import timezone
+
+from .category_stats_service import CategoryStatsService
+from .models import Lot, Product
+from .search_service import ProductSearchService
+
+# Campos do produto copiados para o lote quando o produto tem um único lote
+LOT_FIELDS = {"company", "batch", "quantity", "initial_quantity", "expiration_date"}
+
+# Quantidade de lotes gravados por INSERT
+LOT_BATCH_SIZE = 1000
+
+
+class LotService:
+    """
+    Lotes dos produtos.
+
+    Cada produto tem um ou mais lotes (Lot), com quantidade, código e
+    vencimento próprios. Os campos quantity, initial_quantity,
+    expiration_date, batch e status do Product são agregados dos lotes,
+    recalculados com UPDATEs em SQL sempre que os lotes mudam: a listagem,
+    os filtros e o dashboard continuam lendo apenas uma linha por produto.
+
+    As movimentações de estoque alteram primeiro o produto (UPDATE
+    condicional em SaleService) e depois os lotes, na mesma transação: as
+    saídas consomem os lotes do que vence primeiro ao que vence por último
+    e as entradas vão para o lote mais recente.
+    """
+
+    @staticmethod
+    def lot_for(product):
+        """Lote inicial de um produto, com os dados do próprio produto"""
+        return Lot(
+            product_id=product.pk,
+            company_id=product.company_id,
+            batch=product.batch,
+            quantity=product.quantity,
+            initial_quantity=product.initial_quantity,
+            expiration_date=product.expiration_date,
+        )
+
+    @staticmethod
+    def create_initial_lots(products):
+        """Cria o lote inicial dos produtos recém-criados (um INSERT)"""
+        lots = [LotService.lot_for(product) for product in products if product.pk]
+        Lot.objects.bulk_create(lots, batch_size=LOT_BATCH_SIZE)
+        return lots
+
+    @staticmethod
+    def sync_product(product, created=False):
+        """
+        Mantém os lotes de acordo com o produto salvo pelo formulário.
+
+        Um produto novo ganha o lote inicial. Com um único lote, o lote
+        acompanha o produto. Com vários lotes, os campos do produto são
+        agregados: a diferença de quantidade é distribuída entre os lotes
+        e os demais campos voltam a ser os calculados a partir dos lotes.
+        """
+        lots = [] if created else list(product.lots.all()[:2])
+        if not lots:
+            LotService.create_initial_lots([product])
+            return
+        if len(lots) == 1:
+            lot = lots[0]
+            changes = {
+                field: getattr(product, attr)
+                for field, attr in (
+                    ("company_id", "company_id"),
+                    ("batch", "batch"),
+                    ("quantity", "quantity"),
+                    ("initial_quantity", "initial_quantity"),
+                    ("expiration_date", "expiration_date"),
+                )
+                if getattr(lot, field) != getattr(product, attr)
+            }
+            if changes:
+                Lot.objects.filter(pk=lot.pk).update(
+                    updated_at=timezone.now(), **changes
+                )
+            return
+
+        with transaction.atomic():
+            product.lots.exclude(company_id=product.company_id).update(
+                company_id=product.company_id
+            )
+            stocked = product.lots.aggregate(total=Sum("quantity"))["total"] or 0
+            if product.quantity != stocked:
+                LotService.apply_deltas({product.pk: product.quantity - stocked})
+            else:
+                LotService.refresh_products([product.pk])
+
+    @staticmethod
+    def apply_deltas(deltas, lot_deltas=None):
+        """
+        Aplica variações de quantidade nos lotes e recalcula os produtos.
+
+        Args:
+            deltas: {id do produto: variação}, distribuída entre os lotes:
+                saídas consomem os lotes por ordem de vencimento (FEFO) e
+                entradas vão para o lote mais recente
+            lot_deltas: {id do lote: variação} aplicada no próprio lote (ex.:
+                saídas já alocadas por FefoAllocationService)
+
+        Raises:
+            ValueError: Se um lote de lot_deltas não existir ou ficar negativo
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        lot_deltas = {pk: delta for pk, delta in (lot_deltas or {}).items() if delta}
+        if not deltas and not lot_deltas:
+            return
+
+        with transaction.atomic():
+            lots = list(
+                Lot.objects.select_for_update()
+                .filter(Q(product_id__in=deltas) | Q(pk__in=lot_deltas))
+                .order_by("product_id", "expiration_date", "id")
+            )
+            by_product = {}
+            found = set()
+            for lot in lots:
+                by_product.setdefault(lot.product_id, []).append(lot)
+                found.add(lot.pk)
+            missing = set(lot_deltas) - found
+            if missing:
+                raise ValueError(f"Lotes não encontrados: {sorted(missing)}.")
+
+            changed = {}
+            for lot in lots:
+                if lot.pk in lot_deltas:
+                    lot.quantity += lot_deltas[lot.pk]
+                    if lot.quantity < 0:
+                        raise ValueError(
+                            f"Estoque insuficiente no lote {lot.batch or lot.pk}."
+                        )
+                    changed[lot.pk] = lot
+
+            for product_id, delta in deltas.items():
+                product_lots = by_product.get(product_id)
+                if not product_lots:
+                    continue
+                if delta > 0:
+                    newest = max(product_lots, key=lambda lot: lot.pk)
+                    newest.quantity += delta
+                    changed[newest.pk] = newest
+                    continue
+                remaining = -delta
+                for lot in product_lots:
+                    taken = min(max(lot.quantity, 0), remaining)
+                    if taken:
+                        lot.quantity -= taken
+                        remaining -= taken
+                        changed[lot.pk] = lot
+                    if not remaining:
+                        break
+                if remaining:
+                    # Lotes fora de sincronia com o produto: o restante sai do
+                    # último lote, para que a soma continue igual ao produto
+                    product_lots[-1].quantity -= remaining
+                    changed[product_lots[-1].pk] = product_lots[-1]
+
+            now = timezone.now()
+            for lot in changed.values():
+                lot.updated_at = now
+            Lot.objects.bulk_update(
+                changed.values(), ["quantity", "updated_at"], batch_size=LOT_BATCH_SIZE
+            )
+            LotService.refresh_products(by_product)
+
+    @staticmethod
+    def refresh_products(product_ids):
+        """
+        Recalcula os agregados dos produtos a partir dos lotes, em SQL.
+
+        quantity e initial_quantity são as somas dos lotes; expiration_date
+        e batch são os do lote que vence primeiro entre os que têm estoque
+        (ou do que vence primeiro, se nenhum tiver). O status é recalculado
+        em seguida com os novos valores. Produtos sem lotes não são
+        alterados. O índice de busca não muda: ele já tem os códigos de
+        todos os lotes (ver ProductSearchService).
+        """
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+        lots = Lot.objects.filter(product=OuterRef("pk"))
+        totals = lots.order_by().values("product")
+        current = lots.order_by(
+            Case(
+                When(quantity__gt=0, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ),
+            "expiration_date",
+            "id",
+        )
+        products = Product.objects.filter(pk__in=product_ids).filter(Exists(lots))
+        with transaction.atomic():
+            updated = products.update(
+                quantity=Subquery(
+                    totals.annotate(total=Sum("quantity")).values("total")
+                ),
+                initial_quantity=Subquery(
+                    totals.annotate(total=Sum("initial_quantity")).values("total")
+                ),
+                expiration_date=Subquery(current.values("expiration_date")[:1]),
+                batch=Subquery(current.values("batch")[:1]),
+                updated_at=timezone.now(),
+            )
+            products.update(status=Product.status_expression())
+        return updated
+
+    @staticmethod
+    def add_lot(product, quantity, expiration_date, batch=None):
+        """
+        Adiciona um lote ao produto e atualiza o produto e os contadores da
+        empresa.
+
+        Returns:
+            Lot: Lote criado
+        """
+        from in_stock.app.users.stats_service import CompanyStatsService
+
+        from .services import ProductService
+
+        if quantity <= 0:
+            raise ValueError("A quantidade deve ser maior que zero.")
+
+        with transaction.atomic():
+            lot = Lot.objects.create(
+                product=product,
+                company_id=product.company_id,
+                batch=batch or None,
+                quantity=quantity,
+                initial_quantity=quantity,
+                expiration_date=expiration_date,
+            )
+            LotService.refresh_products([product.pk])
+            # UPDATE não dispara sinais: o código do novo lote entra no
+            # índice de busca e os contadores da empresa são atualizados
+            ProductSearchService.index_product(product)
+            CompanyStatsService.apply_delta(
+                product.company_id,
+                total_stock=quantity,
+                stock_value=CompanyStatsService.stock_value(quantity, product.price),
+            )
+
+        from in_stock.app.pages.services import DashboardService
+
+        DashboardService.invalidate(product.company_id)
+        ProductService.invalidate_count(product.company_id)
+        CategoryStatsService.invalidate(product.company_id)
+        product.refresh_from_db(
+            fields=[
+                "quantity",
+                "initial_quantity",
+                "expiration_date",
+                "batch",
+                "status",
+                "updated_at",
+            ]
+        )
+        return lot
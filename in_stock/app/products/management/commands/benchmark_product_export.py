@@ -0,0 +1,114 @@
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from in_stock.app.products.export_service import (
+    EXPORT_CHUNK_SIZE,
+    ProductExportService,
+)
+from in_stock.app.products.models import Category, Product
+from in_stock.app.users.models import Company
+
+
+class Rollback(Exception):
+    """Desfaz os dados criados para o benchmark"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o tempo e o pico de memória da exportação XLSX de produtos. "
+        "Os produtos são criados no banco informado em --database (use um "
+        "banco de teste), em uma transação desfeita ao final"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            help="Alias do banco (em DATABASES) onde os produtos são criados. "
+            "Obrigatório: o benchmark não roda sem a escolha explícita do banco",
+        )
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=100000,
+            help="Quantidade de produtos exportados (padrão: 100000)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help=f"Produtos lidos do banco por vez (padrão: {EXPORT_CHUNK_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        database = options["database"]
+        if not database:
+            raise CommandError(
+                "Informe o banco com --database (de preferência um banco de "
+                "teste): o benchmark grava os produtos nele antes de desfazer."
+            )
+        if database not in connections.databases:
+            raise CommandError(f"Banco {database!r} não está em DATABASES.")
+
+        try:
+            with transaction.atomic(using=database):
+                self._run(
+                    database,
+                    max(1, options["products"]),
+                    max(1, options["chunk_size"]),
+                )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _run(self, database, total, chunk_size):
+        company = Company.objects.using(database).create(
+            name="Benchmark de exportação", cnpj="00000000000000"
+        )
+        category = Category.objects.using(database).create(
+            name="Benchmark", company=company
+        )
+        today = date.today()
+        Product.objects.using(database).bulk_create(
+            (
+                Product(
+                    name=f"Produto {i:06d}",
+                    category=category,
+                    batch=f"L{i % 100}",
+                    quantity=i % 500,
+                    initial_quantity=500,
+                    price=i % 1000 + 0.99,
+                    expiration_date=today + timedelta(days=i % 365),
+                    company=company,
+                )
+                for i in range(total)
+            ),
+            batch_size=5000,
+        )
+
+        products = Product.objects.using(database).filter(company=company)
+        with tempfile.TemporaryFile() as output:
+            started = time.perf_counter()
+            count = ProductExportService.write_xlsx(products, output, chunk_size)
+            elapsed = time.perf_counter() - started
+            size = output.tell()
+
+        # O tracemalloc deixa a execução mais lenta: a memória é medida em uma
+        # segunda execução, separada da medição de tempo
+        with tempfile.TemporaryFile() as output:
+            tracemalloc.start()
+            ProductExportService.write_xlsx(products, output, chunk_size)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{count} produto(s) exportado(s) em {elapsed:.2f}s, "
+                f"pico de memória {peak / 1024 / 1024:.1f} MB, "
+                f"arquivo com {size / 1024 / 1024:.1f} MB."
+            )
+        )
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from in_stock.app.products.image_service import ProductImageService
+
+
+class Command(BaseCommand):
+    help = (
+        "Move as imagens dos produtos para o armazenamento por hash do "
+        "conteúdo e gera as miniaturas WebP. Sem --force, processa apenas as "
+        "imagens enviadas antes do armazenamento por hash"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--product",
+            action="append",
+            dest="products",
+            help="ID do produto (pode ser repetido). Padrão: todos os produtos",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Quantidade de imagens processadas em paralelo (padrão: 4)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Gera novamente as variantes de todas as imagens",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = ProductImageService.backfill(
+            product_ids=options["products"],
+            workers=max(1, options["workers"]),
+            force=options["force"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['images']} imagem(ns) processada(s), "
+                f"{result['variants']} variante(s) gerada(s) "
+                f"em {time.perf_counter() - started:.3f}s."
+            )
+        )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from in_stock.app.products.forecast_service import HISTORY_DAYS, DemandForecastService
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a previsão de demanda e o ponto de pedido dos produtos a "
+        "partir das saídas recentes. Deve ser executado diariamente (ex.: via "
+        "cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--company",
+            action="append",
+            dest="companies",
+            help="ID da empresa (pode ser repetido). Padrão: todas as empresas",
+        )
+        parser.add_argument(
+            "--history-days",
+            type=int,
+            default=HISTORY_DAYS,
+            help=f"Dias de histórico de saídas (padrão: {HISTORY_DAYS})",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = DemandForecastService.recompute_all(
+            company_ids=options["companies"],
+            days=max(1, options["history_days"]),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{sum(result.values())} previsão(ões) calculada(s) para "
+                f"{len(result)} empresa(s) em {time.perf_counter() - started:.3f}s."
+            )
+        )
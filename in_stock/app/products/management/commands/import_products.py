@@ -0,0 +1,63 @@
+import time
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from in_stock.app.products.import_service import (
+    IMPORT_CHUNK_SIZE,
+    ProductImportService,
+)
+from in_stock.app.users.models import Company
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa produtos de uma planilha XLSX ou CSV para uma empresa, "
+        "lendo o arquivo como stream e gravando em blocos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Caminho do arquivo .xlsx ou .csv")
+        parser.add_argument(
+            "--company", type=int, required=True, help="ID da empresa dos produtos"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help=f"Linhas por bloco (padrão: {IMPORT_CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Apenas valida o arquivo, sem gravar",
+        )
+
+    def handle(self, *args, **options):
+        company = Company.objects.filter(pk=options["company"]).first()
+        if company is None:
+            raise CommandError(f"Empresa {options['company']} não encontrada.")
+
+        started = time.perf_counter()
+        try:
+            with open(options["path"], "rb") as handle:
+                result = ProductImportService.import_products(
+                    ProductImportService.read_rows(File(handle)),
+                    company,
+                    chunk_size=max(1, options["chunk_size"]),
+                    dry_run=options["dry_run"],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in result["errors"]:
+            self.stdout.write(f"Linha {error['line']}: {' '.join(error['errors'])}")
+
+        verb = "seriam importados" if options["dry_run"] else "importados"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['created']} produto(s) {verb}, "
+                f"{len(result['errors'])} linha(s) com erro, "
+                f"em {time.perf_counter() - started:.3f}s."
+            )
+        )
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from in_stock.app.products.search_service import (
+    REBUILD_CHUNK_SIZE,
+    ProductSearchService,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o índice de busca de produtos (termos do nome e do lote). "
+        "Deve ser executado após a instalação do índice ou depois de "
+        "alterações em massa feitas fora do Django"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--company",
+            action="append",
+            dest="companies",
+            help="ID da empresa (pode ser repetido). Padrão: todas as empresas",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=REBUILD_CHUNK_SIZE,
+            help=f"Produtos indexados por vez (padrão: {REBUILD_CHUNK_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = ProductSearchService.rebuild(
+            company_ids=options["companies"],
+            chunk_size=max(1, options["chunk_size"]),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['products']} produto(s) indexado(s), "
+                f"{result['terms']} termo(s) gravado(s) "
+                f"em {time.perf_counter() - started:.3f}s."
+            )
+        )
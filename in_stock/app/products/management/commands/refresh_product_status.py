@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from in_stock.app.products.services import ProductService
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula o status dos produtos (que depende da data de hoje) com "
+        "UPDATEs em lote, alterando apenas os produtos com status "
+        "desatualizado. Deve ser executado diariamente (ex.: via cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--company",
+            action="append",
+            dest="companies",
+            help="ID da empresa (pode ser repetido). Padrão: todas as empresas",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Tamanho da faixa de ids de cada UPDATE (padrão: 5000)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Apenas mostra quantos produtos seriam alterados",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = ProductService.refresh_statuses(
+            company_ids=options["companies"],
+            batch_size=max(1, options["batch_size"]),
+            dry_run=options["dry_run"],
+        )
+        companies = result.pop("companies")
+
+        verb = "seriam alterados" if options["dry_run"] else "alterados"
+        for status, info in result.items():
+            self.stdout.write(
+                f"{status}: {info['updated']} produto(s) {verb} "
+                f"em {info['seconds']:.3f}s"
+            )
+
+        total = sum(info["updated"] for info in result.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total} produto(s) {verb} ({len(companies)} empresa(s)) "
+                f"em {time.perf_counter() - started:.3f}s."
+            )
+        )
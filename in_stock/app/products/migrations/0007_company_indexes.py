@@ -0,0 +1,50 @@
+# Generated by Django 4.2.25 on 2026-10-17 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_alter_productsupplier_unique_together"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(
+                fields=["company", "name"], name="category_company_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["company", "name"], name="product_company_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["company", "category", "name"],
+                name="product_company_category_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["company", "expiration_date"], name="product_company_expiry_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["company", "quantity"], name="product_company_qty_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["company", "status"], name="product_company_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.25 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_company_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_company_name_idx",
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["company", "name", "expiration_date"],
+                name="product_company_name_exp_idx",
+            ),
+        ),
+    ]
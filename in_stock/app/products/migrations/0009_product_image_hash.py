@@ -0,0 +1,24 @@
+# Generated by Django 4.2.25 on 2026-10-17 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_product_lot_expiry_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="image_hash",
+            field=models.CharField(
+                blank=True, default="", max_length=64, verbose_name="Hash da imagem"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["image_hash"], name="product_image_hash_idx"),
+        ),
+    ]
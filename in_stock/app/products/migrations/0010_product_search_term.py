@@ -0,0 +1,57 @@
+# Generated by Django 4.2.25 on 2026-10-17 21:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0011_companystats"),
+        ("products", "0009_product_image_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchTerm",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=32)),
+                ("rank", models.PositiveSmallIntegerField()),
+                (
+                    "company",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="product_search_terms",
+                        to="users.company",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_terms",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["company", "rank", "term", "product"],
+                        name="product_search_term_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.25 on 2026-10-17 21:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0011_companystats"),
+        ("products", "0010_product_search_term"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductForecast",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="forecast",
+                        serialize=False,
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "moving_average",
+                    models.FloatField(
+                        default=0, verbose_name="Média móvel de saídas por dia"
+                    ),
+                ),
+                (
+                    "daily_demand",
+                    models.FloatField(
+                        default=0,
+                        verbose_name="Demanda diária (suavização exponencial)",
+                    ),
+                ),
+                (
+                    "demand_std",
+                    models.FloatField(
+                        default=0, verbose_name="Desvio padrão da demanda diária"
+                    ),
+                ),
+                (
+                    "safety_stock",
+                    models.IntegerField(default=0, verbose_name="Estoque de segurança"),
+                ),
+                (
+                    "reorder_point",
+                    models.IntegerField(default=0, verbose_name="Ponto de pedido"),
+                ),
+                ("computed_at", models.DateTimeField()),
+                (
+                    "company",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="product_forecasts",
+                        to="users.company",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["company", "reorder_point"],
+                        name="forecast_company_reorder_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.25 on 2026-10-17 21:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0011_companystats"),
+        ("products", "0011_product_forecast"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Lot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "batch",
+                    models.CharField(
+                        blank=True, max_length=100, null=True, verbose_name="Lote"
+                    ),
+                ),
+                ("quantity", models.IntegerField(default=0)),
+                (
+                    "initial_quantity",
+                    models.IntegerField(
+                        default=0, verbose_name="Quantidade Inicial do Lote"
+                    ),
+                ),
+                ("expiration_date", models.DateField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "company",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lots",
+                        to="users.company",
+                        verbose_name="Empresa",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lots",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["expiration_date", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["product", "expiration_date"],
+                        name="lot_product_expiry_idx",
+                    )
+                ],
+            },
+        ),
+    ]
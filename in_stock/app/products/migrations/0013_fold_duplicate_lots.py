@@ -0,0 +1,333 @@
+"""
+Cria o lote inicial de cada produto e junta os produtos duplicados.
+
+Antes do modelo Lot, cada lote de um item era uma linha de Product com o
+mesmo nome na mesma empresa (em categorias diferentes, por causa de
+unique_together = ("name", "category")). As linhas de um grupo com o mesmo
+preço viram um único produto (o de menor id) com um lote por linha
+original:
+
+- movimentações, fornecedores e lotes passam para o produto mantido, que
+  fica com a categoria e o preço dele;
+- os checkpoints do produto mantido recebem o estoque que os duplicados
+  tinham no mesmo instante, e um checkpoint do produto junto é gravado;
+- a imagem do primeiro duplicado é usada se o produto mantido não tiver;
+- o índice de busca do produto junto inclui os códigos de todos os lotes.
+
+Linhas com outro preço não são juntadas. Essas linhas e as juntadas que
+estavam em outra categoria são registradas no log (logger desta migração,
+nível INFO), sem escrever na saída do migrate.
+
+A junção é irreversível de propósito: as linhas duplicadas (e suas
+previsões de demanda) são excluídas. Desfazer a migração não altera os
+dados (RunPython.noop), para não bloquear a reversão do esquema; os
+produtos continuam juntos.
+
+O índice de busca é montado aqui com as mesmas regras de
+ProductSearchService.build_terms, copiadas para que mudanças futuras no
+serviço não alterem esta migração.
+"""
+
+import logging
+import re
+import unicodedata
+from datetime import date
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Mesmos valores de products.models e products.lot_service
+NEAR_EXPIRATION_DAYS = 7
+CHUNK_SIZE = 2000
+
+# Regras do índice de busca (products.search_service) nesta migração
+MAX_TERM_LENGTH = 32
+MIN_SUBSTRING_LENGTH = 2
+RANK_NAME_WORD = 0
+RANK_BATCH_WORD = 1
+RANK_NAME_SUBSTRING = 2
+RANK_BATCH_SUBSTRING = 3
+
+
+def search_terms(name, batches):
+    """Termos de busca do nome e dos códigos de lote: {termo: rank}"""
+    batch = " ".join(dict.fromkeys(value for value in batches if value))
+    terms = {}
+    for text, word_rank, substring_rank in (
+        (name, RANK_NAME_WORD, RANK_NAME_SUBSTRING),
+        (batch, RANK_BATCH_WORD, RANK_BATCH_SUBSTRING),
+    ):
+        folded = unicodedata.normalize("NFKD", str(text or ""))
+        folded = "".join(c for c in folded if not unicodedata.combining(c)).lower()
+        for token in re.findall(r"[a-z0-9]+", folded):
+            candidates = [(token, word_rank)] + [
+                (token[start:], substring_rank)
+                for start in range(1, len(token) - MIN_SUBSTRING_LENGTH + 1)
+            ]
+            for term, rank in candidates:
+                term = term[:MAX_TERM_LENGTH]
+                if rank < terms.get(term, rank + 1):
+                    terms[term] = rank
+    return terms
+
+
+def status_for(quantity, initial_quantity, expiration_date, today):
+    """Mesma regra de Product.get_status()"""
+    if 0 <= (expiration_date - today).days < NEAR_EXPIRATION_DAYS:
+        return "proximo_vencimento"
+    if quantity < initial_quantity / 2:
+        return "baixo"
+    return "ok"
+
+
+LOT_COLUMNS = (
+    "product_id",
+    "company_id",
+    "batch",
+    "quantity",
+    "initial_quantity",
+    "expiration_date",
+)
+
+
+def create_lots(Product, Lot):
+    """Um lote por produto, com os dados da própria linha, em blocos por id"""
+    last_id = 0
+    while True:
+        rows = list(
+            Product.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", *LOT_COLUMNS[1:])[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        Lot.objects.bulk_create([Lot(**dict(zip(LOT_COLUMNS, row))) for row in rows])
+        last_id = rows[-1][0]
+
+
+def signed_quantity():
+    """Quantidade da movimentação com sinal (+ entrada, - saída)"""
+    return Case(
+        When(type="entry", then=F("quantity")),
+        When(type="exits", then=F("quantity") * Value(-1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def merge_checkpoints(apps, keep, duplicates):
+    """
+    Soma nos checkpoints do produto mantido o estoque que os duplicados
+    tinham no mesmo instante (quantidade atual menos as movimentações
+    posteriores), antes de as movimentações serem transferidas.
+    """
+    Product = apps.get_model("products", "Product")
+    Sale = apps.get_model("sales", "Sale")
+    StockCheckpoint = apps.get_model("sales", "StockCheckpoint")
+
+    rows = list(
+        Product.objects.filter(pk__in=duplicates).values_list(
+            "id", "quantity", "created_at"
+        )
+    )
+    for checkpoint in StockCheckpoint.objects.filter(product_id=keep):
+        existing = [
+            pk for pk, _, created_at in rows if created_at <= checkpoint.taken_at
+        ]
+        if not existing:
+            continue
+        later = dict(
+            Sale.objects.filter(
+                product_id__in=existing, created_at__gt=checkpoint.taken_at
+            )
+            .values("product_id")
+            .order_by()
+            .annotate(total=Sum(signed_quantity()))
+            .values_list("product_id", "total")
+        )
+        checkpoint.quantity += sum(
+            quantity - (later.get(pk) or 0)
+            for pk, quantity, _ in rows
+            if pk in existing
+        )
+        checkpoint.save(update_fields=["quantity"])
+    StockCheckpoint.objects.filter(product_id__in=duplicates).delete()
+
+
+def fold_group(apps, keep, duplicates, today, now):
+    Product = apps.get_model("products", "Product")
+    Lot = apps.get_model("products", "Lot")
+    ProductSearchTerm = apps.get_model("products", "ProductSearchTerm")
+    ProductSupplier = apps.get_model("products", "ProductSupplier")
+    Sale = apps.get_model("sales", "Sale")
+    StockCheckpoint = apps.get_model("sales", "StockCheckpoint")
+
+    merge_checkpoints(apps, keep, duplicates)
+    Lot.objects.filter(product_id__in=duplicates).update(product_id=keep)
+    Sale.objects.filter(product_id__in=duplicates).update(product_id=keep)
+
+    # Um vínculo por fornecedor, preferindo o do produto mantido (menor id)
+    seen = set()
+    repeated = []
+    moved = []
+    links = ProductSupplier.objects.filter(
+        product_id__in=[keep] + duplicates
+    ).values_list("id", "product_id", "supplier_id")
+    for pk, product_id, supplier_id in links.order_by("product_id", "id"):
+        if supplier_id in seen:
+            repeated.append(pk)
+        else:
+            seen.add(supplier_id)
+            if product_id != keep:
+                moved.append(pk)
+    ProductSupplier.objects.filter(pk__in=repeated).delete()
+    ProductSupplier.objects.filter(pk__in=moved).update(product_id=keep)
+
+    # Produto mantido sem imagem: usa a do primeiro duplicado que tiver
+    kept = Product.objects.get(pk=keep)
+    if not kept.image:
+        image = (
+            Product.objects.filter(pk__in=duplicates)
+            .exclude(image="")
+            .exclude(image__isnull=True)
+            .order_by("id")
+            .values_list("image", "image_hash")
+            .first()
+        )
+        if image:
+            Product.objects.filter(pk=keep).update(image=image[0], image_hash=image[1])
+
+    Product.objects.filter(pk__in=duplicates).delete()
+
+    lots = list(
+        Lot.objects.filter(product_id=keep).values_list(
+            "quantity", "initial_quantity", "expiration_date", "batch", "id"
+        )
+    )
+    quantity = sum(lot[0] for lot in lots)
+    initial_quantity = sum(lot[1] for lot in lots)
+    current = min(lots, key=lambda lot: (lot[0] <= 0, lot[2], lot[4]))
+    Product.objects.filter(pk=keep).update(
+        quantity=quantity,
+        initial_quantity=initial_quantity,
+        expiration_date=current[2],
+        batch=current[3],
+        status=status_for(quantity, initial_quantity, current[2], today),
+    )
+
+    # Checkpoint do produto junto, como em build_stock_checkpoints
+    StockCheckpoint.objects.get_or_create(
+        product_id=keep,
+        taken_at=now,
+        defaults={"company_id": kept.company_id, "quantity": quantity},
+    )
+
+    # Termos de busca com os códigos de todos os lotes
+    batches = [current[3]] + [lot[3] for lot in sorted(lots, key=lambda lot: lot[4])]
+    ProductSearchTerm.objects.filter(product_id=keep).delete()
+    ProductSearchTerm.objects.bulk_create(
+        [
+            ProductSearchTerm(
+                product_id=keep, company_id=kept.company_id, term=term, rank=rank
+            )
+            for term, rank in search_terms(kept.name, batches).items()
+        ]
+    )
+
+
+def fold_duplicate_lots(apps, schema_editor=None):
+    """
+    Cria os lotes e junta os duplicados.
+
+    Returns:
+        list: Linhas do relatório (grupos não juntados ou com categoria trocada)
+    """
+    Product = apps.get_model("products", "Product")
+    Lot = apps.get_model("products", "Lot")
+    CompanyStats = apps.get_model("users", "CompanyStats")
+
+    create_lots(Product, Lot)
+
+    today = date.today()
+    now = timezone.now()
+    companies = set()
+    report = []
+    groups = (
+        Product.objects.values("company_id", "name")
+        .annotate(rows=Count("id"))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for group in groups:
+        rows = list(
+            Product.objects.filter(company_id=group["company_id"], name=group["name"])
+            .order_by("id")
+            .values_list("id", "price", "category_id")
+        )
+        keep, price, category_id = rows[0]
+        # Só linhas com o mesmo preço viram lotes: o valor em estoque do
+        # produto junto continua o mesmo
+        same_price = [row for row in rows[1:] if row[1] == price]
+        other_price = [row for row in rows[1:] if row[1] != price]
+        if other_price:
+            report.append(
+                f"{group['name']!r} (empresa {group['company_id']}): produtos "
+                f"{[row[0] for row in other_price]} não foram juntados ao "
+                f"{keep} por terem outro preço"
+            )
+        if not same_price:
+            continue
+        other_category = [row[0] for row in same_price if row[2] != category_id]
+        if other_category:
+            report.append(
+                f"{group['name']!r} (empresa {group['company_id']}): produtos "
+                f"{other_category} juntados ao {keep} mudaram para a categoria "
+                f"{category_id}"
+            )
+        fold_group(apps, keep, [row[0] for row in same_price], today, now)
+        companies.add(group["company_id"])
+
+    # Os totais de produtos mudam com a junção
+    companies.discard(None)
+    for company_id in companies:
+        totals = Product.objects.filter(company_id=company_id).aggregate(
+            total_products=Count("id"),
+            total_stock=Coalesce(Sum("quantity"), 0),
+            stock_value=Sum(F("quantity") * F("price"), output_field=DecimalField()),
+        )
+        totals["stock_value"] = totals["stock_value"] or Decimal("0.00")
+        CompanyStats.objects.filter(company_id=company_id).update(**totals)
+
+    for line in report:
+        logger.info("products.0013: %s", line)
+    return report
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_lot"),
+        ("sales", "0008_sale_lot"),
+        ("users", "0011_companystats"),
+    ]
+
+    operations = [
+        # A junção não é desfeita (ver o docstring do módulo)
+        migrations.RunPython(
+            fold_duplicate_lots, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -1,8 +1,13 @@
 from datetime import timedelta
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.lookups import LessThan
 from django.utils import timezone
 
+# Dias antes do vencimento em que o produto passa a "Próximo do Vencimento"
+NEAR_EXPIRATION_DAYS = 7
+
 
 class Category(models.Model):
     STATUS_CHOICES = (
@@ -25,6 +30,9 @@ class Category(models.Model):
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["company", "name"], name="category_company_name_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -52,6 +60,10 @@ class Product(models.Model):
         verbose_name="Status do Estoque",
     )
     image = models.ImageField(upload_to="uploads", blank=True, null=True)
+    # SHA-256 do conteúdo da imagem: nome do arquivo original e das variantes
+    image_hash = models.CharField(
+        max_length=64, blank=True, default="", verbose_name="Hash da imagem"
+    )
     category = models.ForeignKey(
         Category, on_delete=models.CASCADE, related_name="products_category", null=False
     )
@@ -74,17 +86,63 @@ class Product(models.Model):
     class Meta:
         unique_together = ("name", "category")
         ordering = ["name"]
+        # Índices iniciados pela empresa (multi-tenant), no formato das
+        # consultas da listagem, da exportação e dos alertas do dashboard
+        indexes = [
+            # Também atende a busca de lotes por vencimento (FEFO)
+            models.Index(
+                fields=["company", "name", "expiration_date"],
+                name="product_company_name_exp_idx",
+            ),
+            models.Index(
+                fields=["company", "category", "name"],
+                name="product_company_category_idx",
+            ),
+            models.Index(
+                fields=["company", "expiration_date"],
+                name="product_company_expiry_idx",
+            ),
+            models.Index(
+                fields=["company", "quantity"], name="product_company_qty_idx"
+            ),
+            models.Index(
+                fields=["company", "status"], name="product_company_status_idx"
+            ),
+            # Contagem de referências a uma imagem (ver image_service.py)
+            models.Index(fields=["image_hash"], name="product_image_hash_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def image_url(self, variant="thumb"):
+        """
+        URL de uma variante da imagem ("thumb" ou "medium"). Imagens ainda
+        não processadas usam o arquivo original.
+        """
+        if self.image_hash:
+            from .image_service import ProductImageService
+
+            return ProductImageService.variant_url(self.image_hash, variant)
+        if self.image:
+            return self.image.url
+        return None
+
+    @property
+    def thumbnail_url(self):
+        return self.image_url("thumb")
+
+    @property
+    def medium_image_url(self):
+        return self.image_url("medium")
+
     def get_status(self):
         """Calcula o status baseado na quantidade e vencimento"""
         hoje = timezone.now().date()
         dias_para_vencer = (self.expiration_date - hoje).days
 
         # Verifica se está próximo do vencimento (menos de 7 dias)
-        if dias_para_vencer < 7 and dias_para_vencer >= 0:
+        if dias_para_vencer < NEAR_EXPIRATION_DAYS and dias_para_vencer >= 0:
             return "proximo_vencimento"
 
         # Verifica se está abaixo da metade da quantidade inicial
@@ -93,10 +151,56 @@ class Product(models.Model):
 
         return "ok"
 
+    @staticmethod
+    def status_conditions(today=None, quantity=None):
+        """
+        Condições SQL de cada status, na ordem de prioridade de get_status().
+
+        Returns:
+            list: [(status, condição), ...]; o status "ok" é o padrão quando
+                nenhuma condição é atendida
+        """
+        today = today or timezone.now().date()
+        if quantity is None:
+            quantity = F("quantity")
+
+        return [
+            (
+                "proximo_vencimento",
+                Q(
+                    expiration_date__gte=today,
+                    expiration_date__lt=today + timedelta(days=NEAR_EXPIRATION_DAYS),
+                ),
+            ),
+            ("baixo", Q(LessThan(quantity * 2, F("initial_quantity")))),
+        ]
+
+    @staticmethod
+    def status_expression(today=None, quantity=None):
+        """
+        Expressão SQL (CASE) equivalente a get_status().
+
+        Permite recalcular o status dentro de um UPDATE, sem carregar os
+        produtos. Use `quantity` para informar a nova quantidade quando ela
+        é alterada no mesmo UPDATE (ex.: F("quantity") - 5).
+        """
+        return Case(
+            *[
+                When(condition, then=Value(status))
+                for status, condition in Product.status_conditions(today, quantity)
+            ],
+            default=Value("ok"),
+            output_field=models.CharField(),
+        )
+
     def save(self, *args, **kwargs):
-        """Atualiza status automaticamente ao salvar"""
+        """
+        Atualiza status automaticamente ao salvar. A gravação e os sinais de
+        post_save (contadores de CompanyStats, lotes) ficam na mesma transação.
+        """
         self.status = self.get_status()
-        super().save(*args, **kwargs)
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
 
 
 class ProductSupplier(models.Model):
@@ -117,3 +221,136 @@ class ProductSupplier(models.Model):
 
     def __str__(self):
         return f"{self.product.name} fornecido por {self.supplier.name}"
+
+
+class ProductSearchTerm(models.Model):
+    """
+    Índice de busca de produtos (ver search_service.py).
+
+    Cada linha é um termo normalizado (sem acentos, em minúsculas) de um
+    produto: as palavras do nome e do lote e os sufixos dessas palavras,
+    para que a busca por substring também seja uma busca por prefixo.
+    """
+
+    # Relevância do termo: menor é melhor
+    RANK_NAME_WORD = 0
+    RANK_BATCH_WORD = 1
+    RANK_NAME_SUBSTRING = 2
+    RANK_BATCH_SUBSTRING = 3
+
+    company = models.ForeignKey(
+        "users.Company",
+        on_delete=models.CASCADE,
+        related_name="product_search_terms",
+        null=True,
+        blank=True,
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="search_terms"
+    )
+    term = models.CharField(max_length=32)
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            # Busca por prefixo em cada faixa de relevância da empresa, já
+            # na ordem dos resultados e sem ler a tabela
+            models.Index(
+                fields=["company", "rank", "term", "product"],
+                name="product_search_term_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+class ProductForecast(models.Model):
+    """
+    Previsão de demanda e ponto de pedido de um produto (ver
+    forecast_service.py), recalculada periodicamente a partir das saídas.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="forecast",
+    )
+    company = models.ForeignKey(
+        "users.Company",
+        on_delete=models.CASCADE,
+        related_name="product_forecasts",
+        null=True,
+        blank=True,
+    )
+    moving_average = models.FloatField(
+        default=0, verbose_name="Média móvel de saídas por dia"
+    )
+    daily_demand = models.FloatField(
+        default=0, verbose_name="Demanda diária (suavização exponencial)"
+    )
+    demand_std = models.FloatField(
+        default=0, verbose_name="Desvio padrão da demanda diária"
+    )
+    safety_stock = models.IntegerField(default=0, verbose_name="Estoque de segurança")
+    reorder_point = models.IntegerField(default=0, verbose_name="Ponto de pedido")
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["company", "reorder_point"],
+                name="forecast_company_reorder_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Previsão de {self.product_id}"
+
+    def days_of_stock(self, quantity):
+        """Dias até o estoque acabar na demanda prevista (None sem demanda)"""
+        if self.daily_demand <= 0:
+            return None
+        return quantity / self.daily_demand
+
+
+class Lot(models.Model):
+    """
+    Lote de um produto, com quantidade, código e vencimento próprios.
+
+    A quantidade, a quantidade inicial, o vencimento e o lote do Product
+    são agregados dos lotes (ver lot_service.py): o estoque é a soma dos
+    lotes e o vencimento e o lote são os do lote que vence primeiro entre
+    os que ainda têm estoque.
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="lots")
+    company = models.ForeignKey(
+        "users.Company",
+        on_delete=models.CASCADE,
+        related_name="lots",
+        null=True,
+        blank=True,
+        verbose_name="Empresa",
+    )
+    batch = models.CharField(max_length=100, null=True, blank=True, verbose_name="Lote")
+    quantity = models.IntegerField(default=0)
+    initial_quantity = models.IntegerField(
+        default=0, verbose_name="Quantidade Inicial do Lote"
+    )
+    expiration_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["expiration_date", "id"]
+        indexes = [
+            # Lotes de um produto por vencimento (FEFO e agregados do produto)
+            models.Index(
+                fields=["product", "expiration_date"], name="lot_product_expiry_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.batch or 'sem lote'}"
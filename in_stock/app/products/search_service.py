@@ -0,0 +1,367 @@
+"""
+Serviço de Busca - Índice de termos por empresa para a busca de produtos
+"""
+
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Lot, Product, ProductSearchTerm
+
+# Tamanho máximo de um termo no índice (termos maiores são truncados)
+MAX_TERM_LENGTH = ProductSearchTerm._meta.get_field("term").max_length
+
+# Tamanho mínimo de um sufixo indexado: buscas por substring precisam de
+# pelo menos 2 caracteres
+MIN_SUBSTRING_LENGTH = 2
+
+# Quantidade máxima de palavras consideradas em uma busca
+MAX_QUERY_TOKENS = 5
+
+SEARCH_LIMIT = 10
+
+# Quantidade de produtos indexados por vez na reconstrução do índice
+REBUILD_CHUNK_SIZE = 2000
+
+# Campos do produto que alteram o índice
+INDEXED_FIELDS = {"name", "batch", "company"}
+
+WORD_RANKS = (ProductSearchTerm.RANK_NAME_WORD, ProductSearchTerm.RANK_BATCH_WORD)
+SUBSTRING_RANKS = (
+    ProductSearchTerm.RANK_NAME_SUBSTRING,
+    ProductSearchTerm.RANK_BATCH_SUBSTRING,
+)
+
+
+def fold(text):
+    """Remove acentos e converte para minúsculas"""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Divide o texto em palavras normalizadas (apenas letras e números)"""
+    return re.findall(r"[a-z0-9]+", fold(text))
+
+
+class ProductSearchService:
+    """
+    Busca de produtos por nome e lote.
+
+    Cada produto tem no índice (ProductSearchTerm) as palavras do nome e do
+    lote, sem acentos e em minúsculas, e os sufixos dessas palavras: buscar
+    "ite" encontra "leite" pelo sufixo "ite". Toda busca, por prefixo ou
+    por substring, vira uma faixa de valores no índice
+    (company, rank, term, product), em vez de um LIKE '%...%' que lê todos
+    os produtos. O índice é atualizado quando um produto é salvo (ver
+    signals.py) ou ganha um lote e removido com ele (CASCADE).
+
+    Os termos de lote incluem os códigos de todos os lotes do produto, não
+    apenas o do lote exibido no produto: as movimentações, que trocam o lote
+    exibido, não precisam reindexar o produto.
+    """
+
+    @staticmethod
+    def build_terms(name, batch=None):
+        """
+        Gera os termos de um produto.
+
+        Returns:
+            dict: {termo: rank}, com o menor rank de cada termo
+        """
+        terms = {}
+        for text, word_rank, substring_rank in (
+            (
+                name,
+                ProductSearchTerm.RANK_NAME_WORD,
+                ProductSearchTerm.RANK_NAME_SUBSTRING,
+            ),
+            (
+                batch,
+                ProductSearchTerm.RANK_BATCH_WORD,
+                ProductSearchTerm.RANK_BATCH_SUBSTRING,
+            ),
+        ):
+            for token in tokenize(text):
+                candidates = [(token, word_rank)] + [
+                    (token[start:], substring_rank)
+                    for start in range(1, len(token) - MIN_SUBSTRING_LENGTH + 1)
+                ]
+                for term, rank in candidates:
+                    term = term[:MAX_TERM_LENGTH]
+                    if rank < terms.get(term, rank + 1):
+                        terms[term] = rank
+        return terms
+
+    @staticmethod
+    def batch_text(batch, lot_batches=()):
+        """Códigos de lote do produto em um único texto, sem repetições"""
+        batches = []
+        for value in (batch, *lot_batches):
+            if value and value not in batches:
+                batches.append(value)
+        return " ".join(batches)
+
+    @staticmethod
+    def lot_batches(product_ids):
+        """Códigos dos lotes de cada produto (uma query)"""
+        batches = {}
+        rows = Lot.objects.filter(product_id__in=list(product_ids)).values_list(
+            "product_id", "batch"
+        )
+        for product_id, batch in rows.order_by("product_id", "id"):
+            batches.setdefault(product_id, []).append(batch)
+        return batches
+
+    @staticmethod
+    def _term_objects(product_id, company_id, name, batch):
+        return [
+            ProductSearchTerm(
+                product_id=product_id, company_id=company_id, term=term, rank=rank
+            )
+            for term, rank in ProductSearchService.build_terms(name, batch).items()
+        ]
+
+    @staticmethod
+    def index_products(products, created=False):
+        """
+        Atualiza os termos dos produtos informados (já salvos).
+
+        Args:
+            products: Produtos
+            created: Os produtos acabaram de ser criados (não há termos
+                antigos a remover e o único lote tem o lote do produto)
+        """
+        products = [product for product in products if product.pk is not None]
+        if not products:
+            return 0
+        batches = (
+            {}
+            if created
+            else ProductSearchService.lot_batches(product.pk for product in products)
+        )
+        terms = []
+        for product in products:
+            terms += ProductSearchService._term_objects(
+                product.pk,
+                product.company_id,
+                product.name,
+                ProductSearchService.batch_text(
+                    product.batch, batches.get(product.pk, ())
+                ),
+            )
+        if created:
+            ProductSearchTerm.objects.bulk_create(terms, batch_size=1000)
+            return len(terms)
+        with transaction.atomic():
+            ProductSearchTerm.objects.filter(
+                product_id__in=[product.pk for product in products]
+            ).delete()
+            ProductSearchTerm.objects.bulk_create(terms, batch_size=1000)
+        return len(terms)
+
+    @staticmethod
+    def index_product(product):
+        """Atualiza os termos de um produto"""
+        return ProductSearchService.index_products([product])
+
+    @staticmethod
+    def rebuild(company_ids=None, chunk_size=REBUILD_CHUNK_SIZE):
+        """
+        Reconstrói o índice, de todas as empresas ou apenas das informadas.
+
+        Os produtos são lidos em blocos por id, e cada bloco é gravado com
+        bulk_create em uma transação própria.
+
+        Returns:
+            dict: products (produtos indexados) e terms (termos gravados)
+        """
+        products = Product.objects.all()
+        terms = ProductSearchTerm.objects.all()
+        if company_ids:
+            products = products.filter(company_id__in=company_ids)
+            terms = terms.filter(company_id__in=company_ids)
+        terms.delete()
+
+        indexed = 0
+        created = 0
+        last_id = 0
+        while True:
+            chunk = list(
+                products.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "company_id", "name", "batch")[:chunk_size]
+            )
+            if not chunk:
+                break
+            batches = ProductSearchService.lot_batches(row[0] for row in chunk)
+            objects = []
+            for product_id, company_id, name, batch in chunk:
+                objects += ProductSearchService._term_objects(
+                    product_id,
+                    company_id,
+                    name,
+                    ProductSearchService.batch_text(batch, batches.get(product_id, ())),
+                )
+            with transaction.atomic():
+                ProductSearchTerm.objects.bulk_create(objects, batch_size=1000)
+            indexed += len(chunk)
+            created += len(objects)
+            last_id = chunk[-1][0]
+        return {"products": indexed, "terms": created}
+
+    @staticmethod
+    def _query_tokens(text):
+        """Palavras da busca, sem repetições e truncadas como no índice"""
+        tokens = []
+        for token in tokenize(text):
+            token = token[:MAX_TERM_LENGTH]
+            if token not in tokens:
+                tokens.append(token)
+        return tokens[:MAX_QUERY_TOKENS]
+
+    @staticmethod
+    def _prefix_range(token):
+        """
+        Filtro dos termos que começam com token, como faixa de valores.
+
+        Os termos só têm letras minúsculas e números, e "z" é o maior desses
+        caracteres em qualquer collation: os termos com o prefixo estão
+        entre token e token seguido de "z" até o tamanho máximo. A faixa usa
+        o índice em qualquer banco, ao contrário de LIKE 'token%'.
+        """
+        return {
+            "term__gte": token,
+            "term__lte": token + "z" * (MAX_TERM_LENGTH - len(token)),
+        }
+
+    @staticmethod
+    def _ranks(token):
+        if len(token) < MIN_SUBSTRING_LENGTH:
+            return WORD_RANKS
+        return WORD_RANKS + SUBSTRING_RANKS
+
+    @staticmethod
+    def _terms(company=None):
+        terms = ProductSearchTerm.objects.all()
+        if company is not None:
+            terms = terms.filter(company=company)
+        return terms
+
+    @staticmethod
+    def filter(queryset, text, company=None):
+        """
+        Filtra o queryset pelos produtos que contêm todas as palavras da
+        busca (no início ou no meio de uma palavra do nome ou do lote),
+        mantendo a ordenação e a paginação de quem chama.
+
+        Args:
+            queryset: Produtos
+            text: Texto da busca
+            company: Empresa dos produtos (None: todas), para que a busca
+                use o índice da empresa
+        """
+        for token in ProductSearchService._query_tokens(text):
+            matching = ProductSearchService._terms(company).filter(
+                # As faixas de relevância são listadas para que o índice
+                # (company, rank, term) seja usado em cada uma
+                rank__in=ProductSearchService._ranks(token),
+                **ProductSearchService._prefix_range(token),
+            )
+            queryset = queryset.filter(pk__in=matching.values("product_id"))
+        return queryset
+
+    @staticmethod
+    def search(text, company=None, filters=None, limit=SEARCH_LIMIT):
+        """
+        Busca ranqueada para o typeahead.
+
+        A palavra mais longa da busca define a relevância: primeiro os
+        produtos com uma palavra do nome que começa com ela, depois do lote,
+        depois os que a contêm no meio de uma palavra do nome e, por fim, do
+        lote. Dentro de cada faixa, os termos mais curtos (a palavra exata)
+        vêm antes. As demais palavras e os filtros (category, batch e
+        expiration_date) apenas restringem os resultados. Cada faixa é lida
+        na ordem do índice e para assim que limit produtos são encontrados.
+
+        Args:
+            text: Texto da busca
+            company: Empresa dos produtos (None: todas)
+            filters: Filtros da listagem, como em ProductService.filter_values()
+            limit: Quantidade máxima de resultados
+
+        Returns:
+            list: [{"id", "text", "category", "batch", "expiration_date",
+                "quantity", "match"}, ...]
+        """
+        tokens = ProductSearchService._query_tokens(text)
+        if not tokens:
+            return []
+        tokens.sort(key=len, reverse=True)
+        primary, others = tokens[0], tokens[1:]
+
+        terms = ProductSearchService._terms(company)
+        filters = filters or {}
+        if "category" in filters:
+            terms = terms.filter(product__category_id=filters["category"])
+        if "batch" in filters:
+            terms = terms.filter(product__batch__icontains=filters["batch"])
+        if "expiration_date" in filters:
+            terms = terms.filter(product__expiration_date=filters["expiration_date"])
+        for token in others:
+            terms = terms.filter(
+                Exists(
+                    ProductSearchTerm.objects.filter(
+                        product_id=OuterRef("product_id"),
+                        rank__in=ProductSearchService._ranks(token),
+                        **ProductSearchService._prefix_range(token),
+                    )
+                )
+            )
+
+        found = {}
+        for rank in ProductSearchService._ranks(primary):
+            rows = (
+                terms.filter(rank=rank, **ProductSearchService._prefix_range(primary))
+                .order_by("term", "product_id")
+                .values_list("product_id", flat=True)
+            )
+            # Um produto pode ter vários termos na faixa: lê em blocos até
+            # completar o limite
+            offset = 0
+            while len(found) < limit:
+                chunk = list(rows[offset : offset + limit * 2])
+                for product_id in chunk:
+                    if product_id not in found and len(found) < limit:
+                        found[product_id] = rank
+                if len(chunk) < limit * 2:
+                    break
+                offset += len(chunk)
+            if len(found) >= limit:
+                break
+
+        products = {
+            row[0]: row[1:]
+            for row in Product.objects.filter(pk__in=list(found)).values_list(
+                "id", "name", "category__name", "batch", "expiration_date", "quantity"
+            )
+        }
+        results = []
+        for pk, rank in found.items():
+            if pk not in products:
+                continue
+            name, category, batch, expiration_date, quantity = products[pk]
+            results.append(
+                {
+                    "id": pk,
+                    "text": name,
+                    "category": category,
+                    "batch": batch,
+                    "expiration_date": expiration_date.isoformat(),
+                    "quantity": quantity,
+                    "match": "word" if rank in WORD_RANKS else "substring",
+                }
+            )
+        return results
@@ -1,9 +1,36 @@
-from django.core.files.storage import default_storage
+import binascii
+import hashlib
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
 
-from in_stock.app.suppliers.models import Supplier
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
 
+from in_stock.app.users.stats_service import CompanyStatsService
+
+from .autocomplete import AUTOCOMPLETE_LIMIT
 from .forms import ProductForm
+from .image_service import ProductImageService
 from .models import Category, Product, ProductSupplier
+from .search_service import ProductSearchService
+
+# Quantidade de produtos por página na listagem
+PRODUCTS_PAGE_SIZE = 50
+
+# Tempo (em segundos) que a contagem de produtos filtrados fica em cache
+PRODUCTS_COUNT_CACHE_TIMEOUT = 300
+
+# Ordenações aceitas na listagem (parâmetro "sort") e o campo correspondente
+PRODUCT_SORTS = {
+    "name": "name",
+    "quantity": "quantity",
+    "expiration": "expiration_date",
+    "price": "price",
+}
+DEFAULT_PRODUCT_SORT = "name"
 
 
 class ProductService:
@@ -12,6 +39,208 @@ class ProductService:
         """Retorna todos os produtos com categoria relacionada"""
         return Product.objects.select_related("category").all()
 
+    @staticmethod
+    def filter_values(params):
+        """
+        Lê os filtros da listagem (q, categoria, lote e vencimento) de params
+        (request.GET ou request.POST). Valores vazios ou "None" são
+        ignorados.
+
+        Returns:
+            dict: {filtro: valor}
+        """
+        values = {}
+        for name in ("q", "category", "batch", "expiration_date"):
+            value = (params.get(name) or "").strip()
+            if value and value != "None":
+                values[name] = value
+        return values
+
+    @staticmethod
+    def apply_filters(queryset, params, company=None):
+        """
+        Aplica os filtros da listagem lidos de params (ver filter_values()).
+        A busca (q) usa o índice de busca da empresa informada.
+        """
+        values = ProductService.filter_values(params)
+        if "q" in values:
+            queryset = ProductSearchService.filter(queryset, values["q"], company)
+        if "category" in values:
+            queryset = queryset.filter(category_id=values["category"])
+        if "batch" in values:
+            queryset = queryset.filter(batch__icontains=values["batch"])
+        if "expiration_date" in values:
+            queryset = queryset.filter(expiration_date=values["expiration_date"])
+        return queryset
+
+    @staticmethod
+    def sort(queryset, sort=None):
+        """
+        Ordena os produtos pelo campo escolhido ("price", "-price", ...).
+
+        O id é usado como desempate para que a ordem seja estável entre as
+        páginas; no nome, os lotes de um mesmo item ficam em ordem de
+        vencimento, seguindo o índice (company, name, expiration_date).
+        Ordenações desconhecidas voltam para o nome.
+
+        Returns:
+            tuple: (queryset ordenado, ordenação aplicada)
+        """
+        sort = sort or DEFAULT_PRODUCT_SORT
+        field = PRODUCT_SORTS.get(sort.lstrip("-"))
+        if field is None:
+            sort, field = DEFAULT_PRODUCT_SORT, PRODUCT_SORTS[DEFAULT_PRODUCT_SORT]
+
+        fields = [field, "id"]
+        if field == "name":
+            fields.insert(1, "expiration_date")
+        if sort.startswith("-"):
+            fields = [f"-{name}" for name in fields]
+        return queryset.order_by(*fields), sort
+
+    @staticmethod
+    def encode_cursor(product):
+        """Gera o cursor (name, expiration_date, id) de um produto"""
+        raw = f"{product.pk}|{product.expiration_date.isoformat()}|{product.name}"
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Lê um cursor gerado por encode_cursor (None se for inválido)"""
+        try:
+            pk, expiration_date, name = (
+                urlsafe_b64decode(cursor.encode()).decode().split("|", 2)
+            )
+            return name, date.fromisoformat(expiration_date), int(pk)
+        except (ValueError, UnicodeError, binascii.Error):
+            return None
+
+    @staticmethod
+    def paginate(
+        queryset,
+        sort=None,
+        page=1,
+        after=None,
+        before=None,
+        page_size=PRODUCTS_PAGE_SIZE,
+    ):
+        """
+        Pagina a listagem de produtos.
+
+        Na ordenação padrão (nome) a navegação é por cursor (keyset) em
+        (name, expiration_date, id), usando o índice (company, name,
+        expiration_date): qualquer página custa o mesmo que a primeira. As
+        demais ordenações usam o número da página.
+
+        Args:
+            queryset: Produtos já filtrados
+            sort: Ordenação (ver PRODUCT_SORTS, com "-" para decrescente)
+            page: Número da página (ordenações diferentes do nome)
+            after: Cursor do último produto visto (próxima página)
+            before: Cursor do primeiro produto visto (página anterior)
+            page_size: Quantidade de produtos por página
+
+        Returns:
+            dict: products, sort, page, next_cursor e previous_cursor (na
+                ordenação por nome), has_next e has_previous
+        """
+        queryset, sort = ProductService.sort(queryset, sort)
+        result = {"sort": sort, "page": 1, "next_cursor": None, "previous_cursor": None}
+
+        if sort != DEFAULT_PRODUCT_SORT:
+            try:
+                page = max(1, int(page))
+            except (TypeError, ValueError):
+                page = 1
+            offset = (page - 1) * page_size
+            rows = list(queryset[offset : offset + page_size + 1])
+            result.update(
+                products=rows[:page_size],
+                page=page,
+                has_next=len(rows) > page_size,
+                has_previous=page > 1,
+            )
+            return result
+
+        after = ProductService.decode_cursor(after) if after else None
+        before = ProductService.decode_cursor(before) if before else None
+
+        if before:
+            name, expiration_date, pk = before
+            rows = list(
+                queryset.filter(
+                    Q(name__lt=name)
+                    | Q(name=name, expiration_date__lt=expiration_date)
+                    | Q(name=name, expiration_date=expiration_date, id__lt=pk)
+                ).order_by("-name", "-expiration_date", "-id")[: page_size + 1]
+            )
+            has_previous = len(rows) > page_size
+            products = rows[:page_size][::-1]
+            has_next = True
+        else:
+            if after:
+                name, expiration_date, pk = after
+                queryset = queryset.filter(
+                    Q(name__gt=name)
+                    | Q(name=name, expiration_date__gt=expiration_date)
+                    | Q(name=name, expiration_date=expiration_date, id__gt=pk)
+                )
+            rows = list(queryset[: page_size + 1])
+            has_next = len(rows) > page_size
+            products = rows[:page_size]
+            has_previous = after is not None
+
+        result.update(
+            products=products,
+            has_next=bool(products) and has_next,
+            has_previous=bool(products) and has_previous,
+        )
+        if result["has_next"]:
+            result["next_cursor"] = ProductService.encode_cursor(products[-1])
+        if result["has_previous"]:
+            result["previous_cursor"] = ProductService.encode_cursor(products[0])
+        return result
+
+    @staticmethod
+    def _count_version_key(company_id):
+        return f"products:count:version:{company_id or 'all'}"
+
+    @staticmethod
+    def invalidate_count(company_id=None):
+        """Invalida as contagens em cache da empresa e da visão geral"""
+        for scope in {company_id, None}:
+            key = ProductService._count_version_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), None)
+
+    @staticmethod
+    def count_products(queryset, company=None, filters=None):
+        """
+        Retorna o total de produtos para o cabeçalho da listagem.
+
+        Sem filtros, o total da empresa vem de CompanyStats. Com filtros, a
+        contagem fica em cache por empresa e é invalidada (por versão) quando
+        um produto da empresa é criado, alterado ou excluído.
+        """
+        filters = {key: value for key, value in (filters or {}).items() if value}
+        if company and not filters:
+            return CompanyStatsService.get_stats(company)["total_products"]
+
+        company_id = company.pk if company else None
+        version_key = ProductService._count_version_key(company_id)
+        version = cache.get(version_key)
+        if version is None:
+            cache.add(version_key, time.time_ns(), None)
+            version = cache.get(version_key)
+
+        digest = hashlib.md5(repr(sorted(filters.items())).encode()).hexdigest()
+        key = f"products:count:{company_id or 'all'}:{version}:{digest}"
+        return cache.get_or_set(
+            key, lambda: queryset.count(), PRODUCTS_COUNT_CACHE_TIMEOUT
+        )
+
     @staticmethod
     def get_product_by_id(id_product):
         """Retorna um produto pelo ID"""
@@ -20,12 +249,42 @@ class ProductService:
         except Product.DoesNotExist:
             return None
 
+    @staticmethod
+    def autocomplete(queryset, term, limit=AUTOCOMPLETE_LIMIT):
+        """
+        Busca produtos pelo início do nome, para os campos de autocomplete.
+
+        A busca por prefixo usa o índice (company, name, expiration_date);
+        lotes do mesmo item aparecem em ordem de vencimento.
+
+        Returns:
+            list: [{"id", "text", "batch", "expiration_date", "quantity"}, ...]
+        """
+        products = queryset.filter(name__istartswith=term.strip()).order_by(
+            "name", "expiration_date", "id"
+        )
+        return [
+            {
+                "id": pk,
+                "text": name,
+                "batch": batch,
+                "expiration_date": expiration_date.isoformat(),
+                "quantity": quantity,
+            }
+            for pk, name, batch, expiration_date, quantity in products.values_list(
+                "id", "name", "batch", "expiration_date", "quantity"
+            )[:limit]
+        ]
+
     @staticmethod
     def create_product(request):
         """Cria um novo produto"""
-        form = ProductForm(request.POST, request.FILES)
+        form = ProductForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             product = form.save(commit=False)
+            upload = request.FILES.get("image")
+            if upload:
+                ProductImageService.attach(product, upload)
             product.save()
 
             # Associar fornecedor se fornecido no form
@@ -39,36 +298,230 @@ class ProductService:
     @staticmethod
     def update_product(request, product):
         """Atualiza um produto existente"""
-        form = ProductForm(request.POST, request.FILES, instance=product)
+        form = ProductForm(
+            request.POST, request.FILES, instance=product, user=request.user
+        )
+        previous_image = None
         if form.is_valid():
             product = form.save(commit=False)
-
-            # Atualizar fornecedor se fornecido
-            supplier_id = request.POST.get("supplier")
-            if supplier_id:
-                try:
-                    supplier = Supplier.objects.get(id=supplier_id)
-                    # Remove associação anterior e cria nova
-                    ProductSupplier.objects.filter(product=product).delete()
-                    ProductSupplier.objects.create(product=product, supplier=supplier)
-                except Supplier.DoesNotExist:
-                    pass
+            upload = request.FILES.get("image")
+            if upload:
+                # O form já trocou a imagem da instância: a anterior vem do banco
+                stored = Product.objects.filter(pk=product.pk).values_list(
+                    "image", "image_hash"
+                )
+                previous_image = stored.first()
+                ProductImageService.attach(product, upload)
 
             product.save()
+
+            # Atualizar fornecedor se fornecido (já validado pelo form): os
+            # vínculos só são alterados se o fornecedor mudou
+            supplier = form.cleaned_data.get("supplier")
+            if supplier:
+                ProductService.set_suppliers(product, [supplier])
+
+            if previous_image:
+                ProductImageService.release(*previous_image)
             return product
         return None
 
+    @staticmethod
+    def _ids(objects):
+        """IDs dos objetos (ou dos próprios IDs), sem repetições"""
+        return {getattr(obj, "pk", obj) for obj in objects if obj is not None}
+
+    @staticmethod
+    def apply_supplier_links(desired):
+        """
+        Aplica os vínculos produto-fornecedor desejados, alterando apenas o
+        que mudou.
+
+        Os vínculos atuais dos produtos são lidos em uma query e comparados
+        com os desejados: os que sobram são removidos em um único DELETE e
+        os que faltam são criados com bulk_create. Vínculos que não mudaram
+        (e o created_at deles) são mantidos; vínculos duplicados são
+        removidos.
+
+        Args:
+            desired: {produto ou id: fornecedores ou ids}, com o conjunto
+                completo de fornecedores de cada produto
+
+        Returns:
+            dict: created e deleted (quantidade de vínculos)
+        """
+        desired = {
+            getattr(product, "pk", product): ProductService._ids(suppliers)
+            for product, suppliers in desired.items()
+        }
+        if not desired:
+            return {"created": 0, "deleted": 0}
+
+        current = set()
+        to_delete = []
+        for pk, product_id, supplier_id in ProductSupplier.objects.filter(
+            product_id__in=desired
+        ).values_list("pk", "product_id", "supplier_id"):
+            link = (product_id, supplier_id)
+            if supplier_id in desired[product_id] and link not in current:
+                current.add(link)
+            else:
+                to_delete.append(pk)
+
+        to_create = [
+            ProductSupplier(product_id=product_id, supplier_id=supplier_id)
+            for product_id, supplier_ids in desired.items()
+            for supplier_id in sorted(supplier_ids)
+            if (product_id, supplier_id) not in current
+        ]
+
+        if to_delete or to_create:
+            with transaction.atomic():
+                if to_delete:
+                    ProductSupplier.objects.filter(pk__in=to_delete).delete()
+                if to_create:
+                    ProductSupplier.objects.bulk_create(to_create, batch_size=500)
+        return {"created": len(to_create), "deleted": len(to_delete)}
+
+    @staticmethod
+    def set_suppliers(product, suppliers):
+        """
+        Define os fornecedores do produto (um ou vários), alterando apenas os
+        vínculos que mudaram.
+
+        Returns:
+            dict: created e deleted (quantidade de vínculos)
+        """
+        return ProductService.apply_supplier_links({product: suppliers})
+
+    @staticmethod
+    def link_products(supplier, products, exclusive=False):
+        """
+        Vincula vários produtos a um fornecedor de uma vez.
+
+        Args:
+            supplier: Fornecedor (ou id)
+            products: Produtos (ou ids)
+            exclusive: Remove os demais fornecedores dos produtos, tornando
+                supplier o único (troca de fornecedor em lote)
+
+        Returns:
+            dict: created e deleted (quantidade de vínculos)
+        """
+        supplier_id = getattr(supplier, "pk", supplier)
+        product_ids = ProductService._ids(products)
+        if exclusive:
+            return ProductService.apply_supplier_links(
+                {product_id: {supplier_id} for product_id in product_ids}
+            )
+
+        linked = set(
+            ProductSupplier.objects.filter(
+                supplier_id=supplier_id, product_id__in=product_ids
+            ).values_list("product_id", flat=True)
+        )
+        to_create = [
+            ProductSupplier(product_id=product_id, supplier_id=supplier_id)
+            for product_id in sorted(product_ids - linked)
+        ]
+        ProductSupplier.objects.bulk_create(to_create, batch_size=500)
+        return {"created": len(to_create), "deleted": 0}
+
+    @staticmethod
+    def unlink_products(supplier, products):
+        """
+        Remove em um único DELETE o vínculo de vários produtos com um
+        fornecedor.
+
+        Returns:
+            int: Quantidade de vínculos removidos
+        """
+        deleted, _ = ProductSupplier.objects.filter(
+            supplier_id=getattr(supplier, "pk", supplier),
+            product_id__in=ProductService._ids(products),
+        ).delete()
+        return deleted
+
+    @staticmethod
+    def refresh_statuses(today=None, company_ids=None, batch_size=5000, dry_run=False):
+        """
+        Recalcula o status (que depende da data de hoje) de todos os produtos.
+
+        Em vez de chamar save() por produto, cada status é aplicado com um
+        UPDATE por faixa de ids (batch_size), filtrando apenas as linhas cujo
+        status gravado é diferente do calculado. Produtos já corretos não são
+        alterados.
+
+        Args:
+            today: Data de referência (padrão: hoje)
+            company_ids: Limita a atualização a estas empresas
+            batch_size: Tamanho da faixa de ids de cada UPDATE
+            dry_run: Apenas conta as linhas que seriam alteradas
+
+        Returns:
+            dict: {status: {"updated": linhas, "seconds": tempo}}, além das
+                empresas afetadas em "companies"
+        """
+        today = today or timezone.now().date()
+        products = Product.objects.all()
+        if company_ids is not None:
+            products = products.filter(company_id__in=company_ids)
+
+        bounds = products.aggregate(first=Min("id"), last=Max("id"))
+        conditions = Product.status_conditions(today)
+        buckets = []
+        previous = Q()
+        for status, condition in conditions:
+            buckets.append((status, condition & ~previous if previous else condition))
+            previous |= condition
+        buckets.append(("ok", ~previous))
+
+        result = {status: {"updated": 0, "seconds": 0.0} for status, _ in buckets}
+        companies = set()
+        if bounds["first"] is None:
+            result["companies"] = companies
+            return result
+
+        now = timezone.now()
+        for start in range(bounds["first"], bounds["last"] + 1, batch_size):
+            chunk = products.filter(id__gte=start, id__lt=start + batch_size)
+            for status, condition in buckets:
+                started = time.perf_counter()
+                stale = chunk.filter(condition).exclude(status=status)
+                with transaction.atomic():
+                    changed = set(
+                        stale.order_by().values_list("company_id", flat=True).distinct()
+                    )
+                    if dry_run:
+                        updated = stale.count()
+                    else:
+                        updated = stale.update(status=status, updated_at=now)
+                companies |= changed
+                result[status]["updated"] += updated
+                result[status]["seconds"] += time.perf_counter() - started
+
+        if not dry_run:
+            # UPDATE não dispara sinais: invalida os caches das empresas afetadas
+            from in_stock.app.pages.services import DashboardService
+
+            for company_id in companies:
+                DashboardService.invalidate(company_id)
+
+        result["companies"] = companies
+        return result
+
     @staticmethod
     def delete_product_by_id(id_product):
-        """Deleta um produto pelo ID e remove sua imagem"""
+        """
+        Deleta um produto pelo ID e remove sua imagem, se nenhum outro
+        produto a utiliza
+        """
         try:
             product = Product.objects.get(pk=id_product)
-
-            # Deleta imagem, se existir
-            if product.image and default_storage.exists(product.image.name):
-                default_storage.delete(product.image.name)
+            image = (product.image.name if product.image else None, product.image_hash)
 
             product.delete()
+            ProductImageService.release(*image)
             return True
 
         except Product.DoesNotExist:
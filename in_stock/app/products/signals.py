@@ -0,0 +1,74 @@
+"""
+Sinais que invalidam as contagens em cache da listagem de produtos e das
+categorias e mantêm o índice de busca e os lotes
+"""
+
+from django.db.models.signals import post_delete, post_save
+
+from .category_stats_service import CategoryStatsService
+from .lot_service import LOT_FIELDS, LotService
+from .models import Category, Product
+from .search_service import INDEXED_FIELDS, ProductSearchService
+from .services import ProductService
+
+
+def invalidate_product_count(sender, instance, **kwargs):
+    """Invalida as contagens da empresa do produto alterado"""
+    ProductService.invalidate_count(instance.company_id)
+
+
+def invalidate_category_stats(sender, instance, **kwargs):
+    """Invalida as estatísticas de categorias da empresa do objeto alterado"""
+    CategoryStatsService.invalidate(instance.company_id)
+
+
+def index_product_search(sender, instance, update_fields=None, **kwargs):
+    """
+    Atualiza os termos de busca do produto salvo. Os termos são removidos
+    com o produto (CASCADE).
+    """
+    if update_fields is not None and not INDEXED_FIELDS & set(update_fields):
+        return
+    ProductSearchService.index_product(instance)
+
+
+def sync_product_lots(sender, instance, created, update_fields=None, **kwargs):
+    """Cria o lote inicial do produto novo ou ajusta os lotes do produto salvo"""
+    if update_fields is not None and not LOT_FIELDS & set(update_fields):
+        return
+    LotService.sync_product(instance, created)
+
+
+post_save.connect(
+    invalidate_product_count,
+    sender=Product,
+    dispatch_uid="products_count_post_save",
+)
+post_delete.connect(
+    invalidate_product_count,
+    sender=Product,
+    dispatch_uid="products_count_post_delete",
+)
+# Os lotes são sincronizados antes da indexação, que lê os códigos dos lotes
+post_save.connect(
+    sync_product_lots,
+    sender=Product,
+    dispatch_uid="products_lots_post_save",
+)
+post_save.connect(
+    index_product_search,
+    sender=Product,
+    dispatch_uid="products_search_post_save",
+)
+
+for model in (Product, Category):
+    post_save.connect(
+        invalidate_category_stats,
+        sender=model,
+        dispatch_uid=f"category_stats_post_save_{model.__name__}",
+    )
+    post_delete.connect(
+        invalidate_category_stats,
+        sender=model,
+        dispatch_uid=f"category_stats_post_delete_{model.__name__}",
+    )
@@ -1,10 +1,85 @@
-from datetime import date, timedelta
+import csv
+import json
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-from django.test import TestCase
+import numpy as np
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.session import SessionStorage
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from PIL import Image
 
+from in_stock.app.pages.services import DashboardService
+from in_stock.app.sales.history_service import StockHistoryService
+from in_stock.app.sales.models import Sale, StockCheckpoint
+from in_stock.app.sales.services import SaleService
 from in_stock.app.suppliers.models import Supplier
+from in_stock.app.users.models import Company
 
-from .models import Category, Product, ProductSupplier
+from .autocomplete import for_user
+from .category_stats_service import CategoryStatsService
+from .expiration_service import ExpirationCalendarService
+from .export_service import ProductExportService
+from .forecast_service import DemandForecastService
+from .forms import ProductForm
+from .image_service import ProductImageService
+from .import_service import ProductImportService
+from .lot_service import LotService
+from .models import (
+    Category,
+    Lot,
+    Product,
+    ProductForecast,
+    ProductSearchTerm,
+    ProductSupplier,
+)
+from .search_service import ProductSearchService
+from .services import ProductService
+from .views import (
+    CategoryListView,
+    ExpirationCalendarView,
+    ProductAutocompleteView,
+    ProductCsvExportView,
+    ProductExportView,
+    ProductImportView,
+    ProductListCreateView,
+    ProductLotCreateView,
+    ProductSearchView,
+)
+
+User = get_user_model()
+
+
+class QueryPlanAssertions:
+    """
+    Asserções sobre o plano de execução (EXPLAIN) das consultas, usadas
+    também pelos testes de sales.
+
+    Os textos conferidos são os do SQLite: use junto com
+    skipUnless(connection.vendor == "sqlite", ...).
+    """
+
+    def assertUsesIndex(self, queryset, index, covering=False):
+        """Confere se a consulta lê pelo índice, sem ordenação extra"""
+        plan = queryset.explain()
+        using = "USING COVERING INDEX" if covering else "USING INDEX"
+        self.assertIn(f"{using} {index}", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
 
 
 class CategoryModelTests(TestCase):
@@ -134,3 +209,1591 @@ class ProductSupplierModelTests(TestCase):
 #    """Testa se um produto só pode ter uma relação com um fornecedor"""
 #   with self.assertRaises(Exception):
 #      ProductSupplier.objects.create(product=self.product, supplier=self.supplier)
+
+
+@skipUnless(connection.vendor == "sqlite", "Plano de execução específico do SQLite")
+class ProductIndexTests(QueryPlanAssertions, TestCase):
+    """Testa se as consultas de listagem, exportação e alertas usam os índices"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.products = Product.objects.filter(company=self.company)
+
+    def test_list_uses_index(self):
+        """Testa o índice da listagem e da exportação (ordenadas por nome)"""
+        self.assertUsesIndex(self.products, "product_company_name_exp_idx")
+        self.assertUsesIndex(
+            ProductService.sort(self.products)[0][:51], "product_company_name_exp_idx"
+        )
+        self.assertUsesIndex(
+            self.products.filter(category=self.category),
+            "product_company_category_idx",
+        )
+
+    def test_dashboard_alerts_use_index(self):
+        """Testa os índices dos alertas de vencimento e estoque baixo"""
+        self.assertUsesIndex(
+            self.products.filter(expiration_date__lt=date.today()).order_by(
+                "expiration_date"
+            )[:5],
+            "product_company_expiry_idx",
+        )
+        self.assertUsesIndex(
+            self.products.filter(quantity__lt=10).order_by("quantity")[:5],
+            "product_company_qty_idx",
+        )
+
+    def test_category_list_uses_index(self):
+        """Testa o índice da listagem de categorias da empresa"""
+        self.assertUsesIndex(
+            Category.objects.filter(company=self.company), "category_company_name_idx"
+        )
+
+
+class ProductPaginationTests(TestCase):
+    """Testa a paginação, a ordenação e a contagem da listagem de produtos"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        cache.clear()
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.categories = [
+            Category.objects.create(name=f"Categoria {i}", company=self.company)
+            for i in range(2)
+        ]
+        # Nomes repetidos entre categorias para testar o desempate por id
+        for i in range(14):
+            Product.objects.create(
+                name=f"Produto {i % 7}",
+                category=self.categories[i // 7],
+                quantity=i,
+                price=i + 1,
+                expiration_date=date.today() + timedelta(days=i),
+                company=self.company,
+            )
+        self.products = Product.objects.filter(company=self.company)
+        self.expected = list(self.products.order_by("name", "expiration_date", "id"))
+
+    def test_keyset_pages_cover_all_products(self):
+        """Testa se as páginas por nome percorrem todos os produtos em ordem"""
+        seen, cursor = [], None
+        while True:
+            page = ProductService.paginate(self.products, after=cursor, page_size=3)
+            seen += page["products"]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, self.expected)
+
+        back = ProductService.paginate(
+            self.products, before=ProductService.encode_cursor(seen[6]), page_size=3
+        )
+        self.assertEqual(back["products"], seen[3:6])
+
+    def test_sort_by_price_uses_page_numbers(self):
+        """Testa a ordenação decrescente por preço com número de página"""
+        page = ProductService.paginate(
+            self.products, sort="-price", page=2, page_size=4
+        )
+
+        prices = list(
+            self.products.order_by("-price", "-id").values_list("price", flat=True)
+        )
+        self.assertEqual([p.price for p in page["products"]], prices[4:8])
+        self.assertTrue(page["has_previous"])
+        self.assertIsNone(page["next_cursor"])
+
+    def test_unknown_sort_falls_back_to_name(self):
+        """Testa se uma ordenação desconhecida volta para o nome"""
+        page = ProductService.paginate(self.products, sort="password", page_size=50)
+        self.assertEqual(page["sort"], "name")
+        self.assertEqual(page["products"], self.expected)
+
+    def test_filtered_count_is_cached_and_invalidated(self):
+        """Testa o cache da contagem filtrada e a invalidação por produto"""
+        filtered = self.products.filter(category=self.categories[0])
+        filters = {"category": str(self.categories[0].pk)}
+        self.assertEqual(
+            ProductService.count_products(filtered, self.company, filters), 7
+        )
+
+        with self.assertNumQueries(0):
+            ProductService.count_products(filtered, self.company, filters)
+
+        Product.objects.create(
+            name="Novo",
+            category=self.categories[0],
+            price=1,
+            expiration_date=date.today(),
+            company=self.company,
+        )
+        self.assertEqual(
+            ProductService.count_products(filtered, self.company, filters), 8
+        )
+
+    def test_list_view_renders_one_page(self):
+        """Testa se a listagem mostra apenas uma página e o total"""
+        request = RequestFactory().get("/products/", {"sort": "quantity"})
+        request.user = self.user
+        response = ProductListCreateView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "(14 produtos)")
+        self.assertContains(response, "fa-sort-up")
+
+
+class ProductStatusRefreshTests(TestCase):
+    """Testa o recálculo em lote do status dos produtos"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.today = date.today()
+        self.fresh = self._create("Arroz", quantity=10, days=10)
+        self.low = self._create("Feijão", quantity=2, days=60)
+        self.ok = self._create("Milho", quantity=10, days=60)
+
+    def _create(self, name, quantity, days):
+        return Product.objects.create(
+            name=name,
+            category=self.category,
+            quantity=quantity,
+            initial_quantity=10,
+            price=5,
+            expiration_date=self.today + timedelta(days=days),
+            company=self.company,
+        )
+
+    def _statuses(self):
+        return dict(Product.objects.order_by("name").values_list("name", "status"))
+
+    def test_refresh_updates_only_stale_rows(self):
+        """Testa se apenas os status desatualizados são gravados"""
+        Product.objects.filter(pk=self.low.pk).update(status="ok")
+        untouched = Product.objects.get(pk=self.ok.pk).updated_at
+
+        # Cinco dias depois, o Arroz passa a estar próximo do vencimento
+        result = ProductService.refresh_statuses(today=self.today + timedelta(days=5))
+
+        self.assertEqual(
+            self._statuses(),
+            {"Arroz": "proximo_vencimento", "Feijão": "baixo", "Milho": "ok"},
+        )
+        self.assertEqual(result["proximo_vencimento"]["updated"], 1)
+        self.assertEqual(result["baixo"]["updated"], 1)
+        self.assertEqual(result["ok"]["updated"], 0)
+        self.assertEqual(result["companies"], {self.company.pk})
+        self.assertEqual(Product.objects.get(pk=self.ok.pk).updated_at, untouched)
+
+        again = ProductService.refresh_statuses(today=self.today + timedelta(days=5))
+        self.assertEqual(sum(again[s]["updated"] for s in ("ok", "baixo")), 0)
+
+    def test_refresh_matches_get_status(self):
+        """Testa se o status em lote é o mesmo calculado por get_status()"""
+        for i in range(12):
+            self._create(f"Produto {i}", quantity=i, days=i - 3)
+        Product.objects.update(status="ok")
+
+        ProductService.refresh_statuses(batch_size=4)
+
+        for product in Product.objects.all():
+            self.assertEqual(product.status, product.get_status(), product.name)
+
+    def test_command_reports_timings(self):
+        """Testa a saída do comando em modo de simulação"""
+        Product.objects.update(status="baixo")
+        out = StringIO()
+        call_command("refresh_product_status", dry_run=True, stdout=out)
+
+        self.assertIn("ok: 2 produto(s) seriam alterados em", out.getvalue())
+        self.assertIn("(1 empresa(s))", out.getvalue())
+        self.assertEqual(set(self._statuses().values()), {"baixo"})
+
+
+class ExpirationCalendarTests(QueryPlanAssertions, TestCase):
+    """Testa o calendário de vencimentos"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.today = date.today()
+        # Dias até o vencimento: -5 e -1 vencidos, 0 e 7 na faixa 0-7, 8 e 30
+        # na 8-30, 31 e 90 na 31-90 e 91 fora do calendário
+        for i, days in enumerate((-5, -1, 0, 7, 8, 30, 31, 90, 91)):
+            Product.objects.create(
+                name=f"Produto {i}",
+                category=self.category,
+                quantity=days + 10,
+                price=5,
+                expiration_date=self.today + timedelta(days=days),
+                company=self.company,
+            )
+        Product.objects.create(
+            name="Outro",
+            category=Category.objects.create(
+                name="Bebidas", company=self.other_company
+            ),
+            price=5,
+            expiration_date=self.today,
+            company=self.other_company,
+        )
+
+    def test_summary_counts_each_bucket_in_one_query(self):
+        """Testa as contagens por faixa, separadas por empresa"""
+        with self.assertNumQueries(1):
+            summary = ExpirationCalendarService.get_summary(self.company, self.today)
+
+        self.assertEqual(
+            {key: value["count"] for key, value in summary.items()},
+            {"expired": 2, "0-7": 2, "8-30": 2, "31-90": 2},
+        )
+        self.assertEqual(summary["0-7"]["units"], 10 + 17)
+
+    def test_pages_inside_bucket(self):
+        """Testa a paginação por cursor dentro de uma faixa"""
+        first = ExpirationCalendarService.get_page(
+            self.company, "31-90", page_size=1, today=self.today
+        )
+        second = ExpirationCalendarService.get_page(
+            self.company,
+            "31-90",
+            after=first["next_cursor"],
+            page_size=1,
+            today=self.today,
+        )
+
+        self.assertEqual([p.name for p in first["products"]], ["Produto 6"])
+        self.assertEqual([p.name for p in second["products"]], ["Produto 7"])
+        self.assertIsNone(second["next_cursor"])
+
+    def test_endpoint_returns_buckets(self):
+        """Testa o endpoint JSON do calendário"""
+        request = RequestFactory().get("/products/expiration-calendar/")
+        request.user = self.user
+        data = json.loads(ExpirationCalendarView.as_view()(request).content)
+
+        self.assertEqual(
+            [bucket["key"] for bucket in data["buckets"]],
+            ["expired", "0-7", "8-30", "31-90"],
+        )
+        self.assertEqual(data["buckets"][0]["products"][0]["days_to_expiry"], -5)
+
+        request = RequestFactory().get(
+            "/products/expiration-calendar/", {"bucket": "8-30", "limit": 1}
+        )
+        request.user = self.user
+        data = json.loads(ExpirationCalendarView.as_view()(request).content)
+        self.assertEqual(len(data["buckets"]), 1)
+        self.assertEqual(data["buckets"][0]["count"], 2)
+        self.assertIsNotNone(data["buckets"][0]["next_cursor"])
+
+    def test_endpoint_rejects_unknown_bucket(self):
+        """Testa a resposta para uma faixa inexistente"""
+        request = RequestFactory().get(
+            "/products/expiration-calendar/", {"bucket": "1-2"}
+        )
+        request.user = self.user
+        self.assertEqual(ExpirationCalendarView.as_view()(request).status_code, 400)
+
+    @skipUnless(connection.vendor == "sqlite", "Plano de execução do SQLite")
+    def test_bucket_page_uses_index(self):
+        """Testa se a página de uma faixa usa o índice de vencimento"""
+        queryset = Product.objects.filter(
+            company=self.company,
+            expiration_date__gte=self.today,
+            expiration_date__lte=self.today + timedelta(days=7),
+        ).order_by("expiration_date", "id")[:21]
+        self.assertUsesIndex(queryset, "product_company_expiry_idx")
+
+
+class ProductImportTests(TestCase):
+    """Testa a importação de produtos em lote"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.supplier = Supplier.objects.create(
+            name="Fornecedor", cnpj="12.345.678/0001-90", company=self.company
+        )
+
+    def _csv(self, lines, name="produtos.csv"):
+        return SimpleUploadedFile(name, "\n".join(lines).encode("utf-8"))
+
+    def _import(self, upload, **kwargs):
+        return ProductImportService.import_products(
+            ProductImportService.read_rows(upload), self.company, **kwargs
+        )
+
+    def test_imports_csv(self):
+        """Testa a importação de um CSV com cabeçalhos em português"""
+        result = self._import(
+            self._csv(
+                [
+                    "Nome;Categoria;Lote;Quantidade;Preço (R$);Vencimento;Fornecedor",
+                    "Arroz;alimentos;L1;10;12,50;2030-01-31;12345678000190",
+                    "Suco;Bebidas;;5;4.00;31/12/2030;",
+                ]
+            )
+        )
+
+        self.assertEqual(result, {"created": 2, "errors": []})
+        rice = Product.objects.get(name="Arroz")
+        self.assertEqual(rice.category, self.category)
+        self.assertEqual(rice.price, Decimal("12.50"))
+        self.assertEqual(rice.initial_quantity, 10)
+        self.assertEqual(rice.status, "ok")
+        self.assertTrue(
+            ProductSupplier.objects.filter(
+                product=rice, supplier=self.supplier
+            ).exists()
+        )
+        juice = Product.objects.get(name="Suco")
+        self.assertEqual(juice.category.name, "Bebidas")
+        self.assertEqual(juice.category.company, self.company)
+        self.assertEqual(juice.expiration_date, date(2030, 12, 31))
+        self.assertEqual(self.company.stats.total_products, 2)
+        self.assertEqual(self.company.stats.total_stock, 15)
+
+    def test_imports_xlsx(self):
+        """Testa a importação de uma planilha XLSX"""
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["name", "category", "quantity", "price", "expiration_date"])
+        sheet.append(["Feijão", "Alimentos", 3, 8.9, date(2030, 5, 1)])
+        buffer = BytesIO()
+        workbook.save(buffer)
+
+        result = self._import(SimpleUploadedFile("produtos.xlsx", buffer.getvalue()))
+
+        self.assertEqual(result["created"], 1)
+        product = Product.objects.get(name="Feijão")
+        self.assertEqual(product.price, Decimal("8.90"))
+        self.assertEqual(product.expiration_date, date(2030, 5, 1))
+
+    def test_reports_errors_by_line(self):
+        """Testa os erros por linha e a rejeição de duplicados"""
+        Product.objects.create(
+            name="Arroz",
+            category=self.category,
+            price=5,
+            expiration_date=date(2030, 1, 1),
+            company=self.company,
+        )
+        result = self._import(
+            self._csv(
+                [
+                    "name,category,quantity,price,expiration_date,supplier",
+                    "Arroz,Alimentos,1,5,2030-01-01,",
+                    "Café,Alimentos,-1,abc,2030-02-30,",
+                    "Leite,Alimentos,1,5,2030-01-01,Desconhecido",
+                    "Açúcar,Alimentos,1,5,2030-01-01,",
+                    "Açúcar,Alimentos,1,5,2030-01-01,",
+                ]
+            )
+        )
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual([e["line"] for e in result["errors"]], [2, 3, 4, 6])
+        self.assertEqual(len(result["errors"][1]["errors"]), 3)
+        self.assertEqual(Product.objects.filter(name="Açúcar").count(), 1)
+
+    def test_duplicates_ignore_case(self):
+        """Testa a rejeição de nomes que diferem só em maiúsculas"""
+        Product.objects.create(
+            name="Arroz",
+            category=self.category,
+            price=5,
+            expiration_date=date(2030, 1, 1),
+            company=self.company,
+        )
+        result = self._import(
+            self._csv(
+                [
+                    "name,category,price,expiration_date",
+                    "ARROZ,Alimentos,5,2030-01-01",
+                    "Leite,Alimentos,5,2030-01-01",
+                    "leite,Alimentos,5,2030-01-01",
+                    "Leite,Bebidas,5,2030-01-01",
+                    "leite,bebidas,5,2030-01-01",
+                ]
+            )
+        )
+
+        self.assertEqual(result["created"], 2)
+        self.assertEqual([e["line"] for e in result["errors"]], [2, 4, 6])
+        self.assertEqual(
+            sorted(Product.objects.values_list("name", "category__name")),
+            [("Arroz", "Alimentos"), ("Leite", "Alimentos"), ("Leite", "Bebidas")],
+        )
+
+    def test_rejects_missing_columns_and_formats(self):
+        """Testa a validação do cabeçalho e da extensão do arquivo"""
+        with self.assertRaisesMessage(ValueError, "expiration_date, price"):
+            self._import(self._csv(["name,category", "Arroz,Alimentos"]))
+        with self.assertRaises(ValueError):
+            self._import(SimpleUploadedFile("produtos.txt", b"name"))
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Testa se o número de queries por bloco não depende das linhas"""
+        header = "name,category,price,expiration_date,supplier"
+
+        def upload(count, prefix):
+            return self._csv(
+                [header]
+                + [
+                    f"{prefix} {i},Categoria {prefix},5,2030-01-01,Fornecedor"
+                    for i in range(count)
+                ]
+            )
+
+        with self.assertNumQueries(13) as small:
+            self._import(upload(2, "A"))
+        with self.assertNumQueries(len(small.captured_queries)):
+            self._import(upload(50, "B"), chunk_size=100)
+        self.assertEqual(Product.objects.count(), 52)
+
+    def test_dry_run_does_not_write(self):
+        """Testa a validação sem gravação"""
+        result = self._import(
+            self._csv(
+                ["name,category,price,expiration_date", "Arroz,Novos,5,2030-01-01"]
+            ),
+            dry_run=True,
+        )
+
+        self.assertEqual(result["created"], 1)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.filter(name="Novos").exists())
+
+    def test_view_imports_upload(self):
+        """Testa a página de importação"""
+        request = RequestFactory().post(
+            "/products/import/",
+            {
+                "file": self._csv(
+                    [
+                        "name,category,price,expiration_date",
+                        "Arroz,Alimentos,5,2030-01-01",
+                        "Feijão,Alimentos,x,2030-01-01",
+                    ]
+                )
+            },
+        )
+        request.user = self.user
+        request.session = {}
+        request._messages = SessionStorage(request)
+        response = ProductImportView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Preço inválido.")
+        self.assertTrue(Product.objects.filter(name="Arroz").exists())
+
+
+class ProductExportTests(TestCase):
+    """Testa a exportação de produtos para XLSX"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        for name, batch in (("Feijão", None), ("Arroz", "L1")):
+            Product.objects.create(
+                name=name,
+                category=self.category,
+                batch=batch,
+                quantity=10,
+                price=Decimal("12.50"),
+                expiration_date=date(2030, 1, 31),
+                company=self.company,
+            )
+        Product.objects.create(
+            name="Outro",
+            category=Category.objects.create(
+                name="Bebidas", company=self.other_company
+            ),
+            price=5,
+            expiration_date=date(2030, 1, 31),
+            company=self.other_company,
+        )
+
+    def test_writes_styled_rows(self):
+        """Testa o conteúdo e os estilos da planilha"""
+        output = BytesIO()
+        count = ProductExportService.write_xlsx(
+            Product.objects.filter(company=self.company), output
+        )
+
+        self.assertEqual(count, 2)
+        sheet = load_workbook(output).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][:2], ("ID", "Nome"))
+        self.assertEqual(rows[1][1:5], ("Arroz", "Alimentos", "L1", 10))
+        self.assertEqual(rows[1][5], 12.5)
+        self.assertEqual(rows[1][6].date(), date(2030, 1, 31))
+        self.assertEqual(rows[2][3], "-")
+        self.assertEqual(sheet["A1"].style, "export_header")
+        self.assertEqual(sheet["F2"].number_format, '"R$" #,##0.00')
+
+    def test_reads_products_in_chunks(self):
+        """Testa se os produtos são lidos em blocos (keyset), sem montar objetos"""
+        Product.objects.create(
+            name="Arroz",
+            category=Category.objects.create(name="Grãos", company=self.company),
+            quantity=5,
+            price=Decimal("12.50"),
+            expiration_date=date(2030, 1, 31),
+            company=self.company,
+        )
+        # Um bloco por produto e um último bloco vazio
+        with self.assertNumQueries(4):
+            rows = list(
+                ProductExportService.get_rows(
+                    Product.objects.filter(company=self.company), chunk_size=1
+                )
+            )
+        self.assertEqual([row[1] for row in rows], ["Arroz", "Arroz", "Feijão"])
+        self.assertLess(rows[0][0], rows[1][0])
+
+    def test_benchmark_requires_database(self):
+        """Testa se o benchmark só roda com o banco informado e desfaz os dados"""
+        with self.assertRaisesMessage(CommandError, "--database"):
+            call_command("benchmark_product_export", products=3, stdout=StringIO())
+
+        out = StringIO()
+        call_command(
+            "benchmark_product_export", products=3, database="default", stdout=out
+        )
+        self.assertIn("3 produto(s) exportado(s)", out.getvalue())
+        self.assertFalse(Company.objects.filter(cnpj="00000000000000").exists())
+
+    def test_export_is_reimportable(self):
+        """Testa se a planilha exportada pode ser importada de volta"""
+        output = BytesIO()
+        ProductExportService.write_xlsx(
+            Product.objects.filter(company=self.company), output
+        )
+        Product.objects.filter(company=self.company).delete()
+
+        result = ProductImportService.import_products(
+            ProductImportService.read_rows(
+                SimpleUploadedFile("produtos.xlsx", output.getvalue())
+            ),
+            self.company,
+        )
+        self.assertEqual(result, {"created": 2, "errors": []})
+
+    def test_view_streams_company_products(self):
+        """Testa a resposta da exportação, restrita à empresa do usuário"""
+        request = RequestFactory().post("/products/export/")
+        request.user = self.user
+        response = ProductExportView.as_view()(request)
+
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        sheet = load_workbook(BytesIO(b"".join(response.streaming_content))).active
+        names = [row[1] for row in sheet.iter_rows(min_row=2, values_only=True)]
+        self.assertEqual(names, ["Arroz", "Feijão"])
+
+    def test_csv_view_streams_filtered_products(self):
+        """Testa o CSV de produtos com os filtros da listagem"""
+        request = RequestFactory().get("/products/export/csv/", {"batch": "l1"})
+        request.user = self.user
+        response = ProductCsvExportView.as_view()(request)
+
+        self.assertTrue(response.streaming)
+        rows = list(
+            csv.DictReader(b"".join(response.streaming_content).decode().splitlines())
+        )
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["name"], "Arroz")
+        self.assertEqual(rows[0]["price"], "12.50")
+        self.assertEqual(rows[0]["expiration_date"], "2030-01-31")
+
+    def test_csv_reads_products_in_chunks(self):
+        """Testa se o CSV lê os produtos em blocos, um por query"""
+        lines = ProductExportService.iter_csv(
+            Product.objects.filter(company=self.company), chunk_size=1
+        )
+        with self.assertNumQueries(3):
+            rows = list(csv.DictReader("".join(lines).splitlines()))
+        self.assertEqual([row["name"] for row in rows], ["Arroz", "Feijão"])
+
+
+class ProductImageTests(TestCase):
+    """Testa o armazenamento das imagens por hash e as miniaturas"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.category = Category.objects.create(name="Alimentos")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _image(self, color="red", name="foto.png", size=(640, 320)):
+        buffer = BytesIO()
+        Image.new("RGB", size, color).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def _product(self, name, upload=None):
+        product = Product(
+            name=name,
+            category=self.category,
+            price=5,
+            expiration_date=date(2030, 1, 1),
+        )
+        if upload:
+            ProductImageService.attach(product, upload)
+        product.save()
+        return product
+
+    def test_duplicates_are_stored_once(self):
+        """Testa se a mesma imagem enviada duas vezes é gravada uma vez"""
+        first = self._product("Arroz", self._image(name="a.png"))
+        second = self._product("Feijão", self._image(name="b.png"))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(
+            first.image.name.startswith(f"products/{first.image_hash[:2]}/")
+        )
+        directory = f"products/{first.image_hash[:2]}"
+        self.assertEqual(len(default_storage.listdir(directory)[1]), 3)
+
+        with default_storage.open(
+            ProductImageService.variant_name(first.image_hash, "thumb")
+        ) as thumb:
+            image = Image.open(thumb)
+            self.assertEqual((image.format, image.size), ("WEBP", (96, 96)))
+        with default_storage.open(
+            ProductImageService.variant_name(first.image_hash, "medium")
+        ) as medium:
+            self.assertEqual(Image.open(medium).size, (480, 240))
+        self.assertTrue(first.thumbnail_url.endswith("_thumb.webp"))
+
+    def test_same_content_with_other_extension_has_one_name(self):
+        """Testa se a extensão do nome enviado não muda o nome gravado"""
+        first = self._product("Arroz", self._image(name="a.PNG"))
+        second = self._product("Feijão", self._image(name="b.jpeg"))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.endswith(".png"))
+
+    def test_release_checks_name_and_hash_separately(self):
+        """Testa a liberação de um original antigo com o mesmo hash"""
+        current = self._product("Arroz", self._image())
+        legacy = default_storage.save(
+            f"products/{current.image_hash[:2]}/{current.image_hash}.jpeg",
+            self._image(),
+        )
+        thumb = ProductImageService.variant_name(current.image_hash, "thumb")
+
+        self.assertTrue(ProductImageService.release(legacy, current.image_hash))
+        self.assertFalse(default_storage.exists(legacy))
+        self.assertTrue(default_storage.exists(current.image.name))
+        self.assertTrue(default_storage.exists(thumb))
+
+    def test_create_product_stores_upload_by_hash(self):
+        """Testa o envio da imagem pelo cadastro de produtos"""
+        supplier = Supplier.objects.create(name="Fornecedor", cnpj="12345678000190")
+        request = RequestFactory().post(
+            "/products/create/",
+            {
+                "name": "Arroz",
+                "category": self.category.pk,
+                "quantity": 1,
+                "initial_quantity": 1,
+                "price": "5.00",
+                "expiration_date": "2030-01-01",
+                "supplier": supplier.pk,
+                "image": self._image(),
+            },
+        )
+        request.user = User.objects.create_superuser(
+            email="admin@example.com", password="testpass123"
+        )
+
+        product = ProductService.create_product(request)
+
+        self.assertTrue(product.image.name.startswith("products/"))
+        self.assertFalse(default_storage.exists("uploads"))
+
+    def test_delete_keeps_files_still_referenced(self):
+        """Testa se a imagem só é removida com o último produto que a usa"""
+        first = self._product("Arroz", self._image())
+        second = self._product("Feijão", self._image())
+        names = [first.image.name] + [
+            ProductImageService.variant_name(first.image_hash, variant)
+            for variant in ("thumb", "medium")
+        ]
+
+        ProductService.delete_product_by_id(first.pk)
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+
+        ProductService.delete_product_by_id(second.pk)
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    def test_backfill_moves_legacy_uploads(self):
+        """Testa a migração das imagens antigas (uploads/) para o hash"""
+        legacy = default_storage.save("uploads/foto.png", self._image())
+        product = self._product("Arroz")
+        Product.objects.filter(pk=product.pk).update(image=legacy)
+        self.assertTrue(Product.objects.get(pk=product.pk).thumbnail_url)
+
+        result = ProductImageService.backfill(workers=1)
+
+        product.refresh_from_db()
+        self.assertEqual(result, {"images": 1, "variants": 2})
+        self.assertTrue(product.image_hash)
+        self.assertFalse(default_storage.exists(legacy))
+        self.assertTrue(
+            default_storage.exists(
+                ProductImageService.variant_name(product.image_hash, "thumb")
+            )
+        )
+        self.assertEqual(ProductImageService.backfill(workers=1)["images"], 0)
+
+
+class ProductAutocompleteTests(TestCase):
+    """Testa o autocomplete de produtos e os campos de escolha por empresa"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.other_category = Category.objects.create(
+            name="Bebidas", company=self.other_company
+        )
+        for name in ("Arroz Branco", "Arroz Integral", "Feijão", "Macarrão"):
+            Product.objects.create(
+                name=name,
+                category=self.category,
+                price=5,
+                expiration_date=date(2030, 1, 1),
+                company=self.company,
+            )
+        Product.objects.create(
+            name="Arroz Importado",
+            category=self.other_category,
+            price=5,
+            expiration_date=date(2030, 1, 1),
+            company=self.other_company,
+        )
+        self.supplier = Supplier.objects.create(
+            name="Fornecedor", cnpj="12345678000190", company=self.company
+        )
+        self.other_supplier = Supplier.objects.create(
+            name="Outro Fornecedor", cnpj="98765432000190", company=self.other_company
+        )
+
+    def _search(self, **params):
+        request = RequestFactory().get("/products/autocomplete/", params)
+        request.user = self.user
+        return json.loads(ProductAutocompleteView.as_view()(request).content)
+
+    def test_searches_by_prefix_in_company(self):
+        """Testa a busca por prefixo, restrita à empresa e ao limite"""
+        data = self._search(q="arr")
+        self.assertEqual(
+            [item["text"] for item in data["results"]],
+            ["Arroz Branco", "Arroz Integral"],
+        )
+        self.assertEqual(data["results"][0]["expiration_date"], "2030-01-01")
+
+        self.assertEqual(len(self._search(q="", limit=3)["results"]), 3)
+        self.assertEqual(self._search(q="ão")["results"], [])
+
+    def test_form_validates_submitted_supplier_only(self):
+        """Testa se o form valida o ID enviado, sem montar a lista de opções"""
+        data = {
+            "name": "Açúcar",
+            "category": self.category.pk,
+            "quantity": 1,
+            "initial_quantity": 1,
+            "price": "5.00",
+            "expiration_date": "2030-01-01",
+            "supplier": self.other_supplier.pk,
+        }
+        form = ProductForm(data, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn("supplier", form.errors)
+
+        data["supplier"] = self.supplier.pk
+        form = ProductForm(data, user=self.user)
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["supplier"], self.supplier)
+
+    def test_rendering_does_not_load_choices(self):
+        """Testa se o campo de fornecedor renderiza sem carregar as opções"""
+        with self.assertNumQueries(0):
+            html = str(ProductForm(user=self.user)["supplier"])
+        self.assertIn("data-autocomplete-url", html)
+        self.assertNotIn("Outro Fornecedor", html)
+
+        with self.assertNumQueries(1):
+            html = str(
+                ProductForm({"supplier": self.supplier.pk}, user=self.user)["supplier"]
+            )
+        self.assertIn('value="Fornecedor"', html)
+
+    def test_form_without_user_has_no_choices(self):
+        """Testa se o form sem usuário não aceita produtos de nenhuma empresa"""
+        admin = User.objects.create_superuser(
+            email="admin@example.com", password="testpass123"
+        )
+        self.assertFalse(for_user(Supplier.objects.all(), None).exists())
+        self.assertEqual(for_user(Supplier.objects.all(), admin).count(), 2)
+
+        form = ProductForm({"supplier": self.supplier.pk})
+        self.assertFalse(form.is_valid())
+        self.assertIn("supplier", form.errors)
+
+
+class ProductSearchTests(QueryPlanAssertions, TestCase):
+    """Testa o índice de busca e o typeahead de produtos"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.drinks = Category.objects.create(name="Bebidas", company=self.company)
+        self.milk = self._create("Leite Integral", self.drinks, batch="LT-2024")
+        self.coconut = self._create("Leite de Côco", self.drinks)
+        self.rice = self._create("Arroz Integral", self.category, batch="A-77")
+        self.beans = self._create("Feijão Carioca", self.category)
+        self._create(
+            "Leite Importado",
+            Category.objects.create(name="Bebidas", company=self.other_company),
+        )
+
+    def _create(self, name, category, batch=None):
+        return Product.objects.create(
+            name=name,
+            category=category,
+            batch=batch,
+            price=5,
+            expiration_date=date(2030, 1, 1),
+            company=category.company,
+        )
+
+    def _search(self, **params):
+        request = RequestFactory().get("/products/search/", params)
+        request.user = self.user
+        return json.loads(ProductSearchView.as_view()(request).content)["results"]
+
+    def _names(self, **params):
+        return [item["text"] for item in self._search(**params)]
+
+    def test_terms_are_folded_with_suffixes(self):
+        """Testa os termos gerados: sem acentos, com palavras e sufixos"""
+        terms = ProductSearchService.build_terms("Feijão Carioca", "L-01")
+        self.assertEqual(terms["feijao"], ProductSearchTerm.RANK_NAME_WORD)
+        self.assertEqual(terms["jao"], ProductSearchTerm.RANK_NAME_SUBSTRING)
+        self.assertEqual(terms["01"], ProductSearchTerm.RANK_BATCH_WORD)
+        self.assertNotIn("o", terms)
+
+    def test_ranks_word_matches_before_substrings(self):
+        """Testa a ordem: palavra do nome, lote e depois substring"""
+        # Termos iguais: desempate pelo id
+        self.assertEqual(self._names(q="inte"), ["Leite Integral", "Arroz Integral"])
+        results = self._search(q="ite")
+        self.assertEqual(
+            [item["text"] for item in results], ["Leite Integral", "Leite de Côco"]
+        )
+        self.assertEqual({item["match"] for item in results}, {"substring"})
+        self.assertEqual(self._names(q="lt"), ["Leite Integral"])
+
+    def test_accents_and_multiple_words(self):
+        """Testa a busca sem acentos e com várias palavras"""
+        self.assertEqual(self._names(q="COCO"), ["Leite de Côco"])
+        self.assertEqual(self._names(q="feijão"), ["Feijão Carioca"])
+        self.assertEqual(self._names(q="leite int"), ["Leite Integral"])
+        self.assertEqual(self._names(q="   "), [])
+
+    def test_filters_and_company(self):
+        """Testa os filtros da listagem e a restrição à empresa"""
+        self.assertEqual(
+            self._names(q="integral", category=self.category.pk), ["Arroz Integral"]
+        )
+        self.assertEqual(self._names(q="integral", batch="lt"), ["Leite Integral"])
+        self.assertEqual(len(self._names(q="leite", limit=1)), 1)
+        self.assertNotIn("Leite Importado", self._names(q="leite"))
+
+    def test_index_follows_save_and_delete(self):
+        """Testa se o índice acompanha as alterações dos produtos"""
+        self.rice.name = "Arroz Parboilizado"
+        self.rice.save()
+        self.assertEqual(self._names(q="parbo"), ["Arroz Parboilizado"])
+        self.assertEqual(self._names(q="arroz int"), [])
+
+        self.rice.delete()
+        self.assertEqual(self._names(q="arroz"), [])
+        self.assertFalse(ProductSearchTerm.objects.filter(product_id=self.rice.pk))
+
+    def test_list_filters_by_query(self):
+        """Testa a busca (q) na listagem de produtos"""
+        request = RequestFactory().get("/products/", {"q": "integral"})
+        request.user = self.user
+        response = ProductListCreateView.as_view()(request)
+        self.assertContains(response, "Leite Integral")
+        self.assertContains(response, "Arroz Integral")
+        self.assertNotContains(response, "Feijão Carioca")
+
+        products = ProductService.apply_filters(
+            Product.objects.all(), {"q": "carioca"}, self.company
+        )
+        self.assertEqual(list(products), [self.beans])
+
+    def test_rebuild_command(self):
+        """Testa a reconstrução do índice pelo comando"""
+        ProductSearchTerm.objects.all().delete()
+        self.assertEqual(self._names(q="arroz"), [])
+
+        out = StringIO()
+        call_command("rebuild_product_search", company=[self.company.pk], stdout=out)
+        self.assertIn("4 produto(s) indexado(s)", out.getvalue())
+        self.assertEqual(self._names(q="arroz"), ["Arroz Integral"])
+        self.assertFalse(
+            ProductSearchTerm.objects.filter(company=self.other_company).exists()
+        )
+
+    @skipUnless(connection.vendor == "sqlite", "Plano de execução do SQLite")
+    def test_prefix_search_uses_index(self):
+        """Testa se cada faixa da busca é lida pelo índice, sem ordenação"""
+        queryset = (
+            ProductSearchTerm.objects.filter(
+                company=self.company,
+                rank=ProductSearchTerm.RANK_NAME_WORD,
+                **ProductSearchService._prefix_range("lei"),
+            )
+            .order_by("term", "product_id")
+            .values_list("product_id", flat=True)[:20]
+        )
+        self.assertUsesIndex(queryset, "product_search_term_idx", covering=True)
+
+
+class ProductSupplierLinkTests(TestCase):
+    """Testa a atualização dos vínculos entre produtos e fornecedores"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.products = [
+            Product.objects.create(
+                name=f"Produto {i}",
+                category=self.category,
+                price=5,
+                expiration_date=date(2030, 1, 1),
+                company=self.company,
+            )
+            for i in range(3)
+        ]
+        self.suppliers = [
+            Supplier.objects.create(
+                name=f"Fornecedor {i}",
+                cnpj=f"1234567800019{i}",
+                company=self.company,
+            )
+            for i in range(3)
+        ]
+
+    def _links(self, product):
+        return set(
+            ProductSupplier.objects.filter(product=product).values_list(
+                "supplier_id", flat=True
+            )
+        )
+
+    def test_set_suppliers_applies_only_the_diff(self):
+        """Testa se apenas os vínculos alterados são criados ou removidos"""
+        product = self.products[0]
+        first, second, third = self.suppliers
+        kept = ProductSupplier.objects.create(product=product, supplier=first)
+        ProductSupplier.objects.create(product=product, supplier=second)
+        ProductSupplier.objects.create(product=product, supplier=second)
+
+        result = ProductService.set_suppliers(product, [first, third.pk])
+        self.assertEqual(result, {"created": 1, "deleted": 2})
+        self.assertEqual(self._links(product), {first.pk, third.pk})
+        self.assertTrue(ProductSupplier.objects.filter(pk=kept.pk).exists())
+
+        with self.assertNumQueries(1):
+            result = ProductService.set_suppliers(product, [third, first])
+        self.assertEqual(result, {"created": 0, "deleted": 0})
+
+    def test_link_products_in_bulk(self):
+        """Testa o vínculo e a troca de fornecedor de vários produtos"""
+        first, second, _ = self.suppliers
+        ProductSupplier.objects.create(product=self.products[0], supplier=first)
+
+        result = ProductService.link_products(second, self.products[:2])
+        self.assertEqual(result, {"created": 2, "deleted": 0})
+        self.assertEqual(self._links(self.products[0]), {first.pk, second.pk})
+
+        # Leitura, DELETE e INSERT (e o savepoint da transação)
+        with self.assertNumQueries(5):
+            result = ProductService.link_products(first, self.products, exclusive=True)
+        self.assertEqual(result, {"created": 2, "deleted": 2})
+        for product in self.products:
+            self.assertEqual(self._links(product), {first.pk})
+
+        self.assertEqual(ProductService.unlink_products(first, self.products), 3)
+        self.assertFalse(ProductSupplier.objects.exists())
+
+    def test_update_product_keeps_unchanged_link(self):
+        """Testa se editar o produto sem trocar o fornecedor mantém o vínculo"""
+        product = self.products[0]
+        link = ProductSupplier.objects.create(
+            product=product, supplier=self.suppliers[0]
+        )
+        data = {
+            "name": "Produto Editado",
+            "category": self.category.pk,
+            "quantity": 1,
+            "initial_quantity": 1,
+            "price": "5.00",
+            "expiration_date": "2030-01-01",
+            "supplier": self.suppliers[0].pk,
+        }
+        request = RequestFactory().post(f"/products/{product.pk}/", data)
+        request.user = self.user
+        self.assertTrue(ProductService.update_product(request, product))
+        self.assertEqual(list(ProductSupplier.objects.filter(product=product)), [link])
+
+        data["supplier"] = self.suppliers[1].pk
+        request = RequestFactory().post(f"/products/{product.pk}/", data)
+        request.user = self.user
+        ProductService.update_product(request, product)
+        self.assertEqual(self._links(product), {self.suppliers[1].pk})
+
+
+class DemandForecastTests(TestCase):
+    """Testa a previsão de demanda e o ponto de pedido"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.today = timezone.localdate()
+
+    def _create_product(self, name, quantity, days_ago=120):
+        product = Product.objects.create(
+            name=name,
+            category=self.category,
+            quantity=quantity,
+            initial_quantity=quantity,
+            price=5,
+            expiration_date=date(2030, 1, 1),
+            company=self.company,
+        )
+        created_at = timezone.make_aware(
+            datetime.combine(self.today - timedelta(days=days_ago), time(8))
+        )
+        Product.objects.filter(pk=product.pk).update(created_at=created_at)
+        return product
+
+    def _exit(self, product, quantity, days_ago, type_sale="exits"):
+        Sale.objects.create(
+            product=product,
+            user=self.user,
+            company=self.company,
+            type=type_sale,
+            quantity=quantity,
+            date=timezone.make_aware(
+                datetime.combine(self.today - timedelta(days=days_ago), time(12))
+            ),
+        )
+
+    def test_forecast_math(self):
+        """Testa a média, o desvio, a suavização e o ponto de pedido"""
+        history = np.array(
+            [
+                [2.0] * 30,
+                [0.0, 4.0] * 15,
+                [0.0] * 30,
+                [9.0] * 25 + [3.0] * 5,
+            ]
+        )
+        # O último produto foi cadastrado há 5 dias: o histórico anterior
+        # não entra nas contas
+        first_days = np.array([0, 0, 0, 25])
+        result = DemandForecastService.forecast(
+            history, first_days, window=10, alpha=0.5, lead_time=4, z=2
+        )
+
+        np.testing.assert_allclose(result["moving_average"], [2, 2, 0, 3])
+        np.testing.assert_allclose(result["daily_demand"][[0, 2, 3]], [2, 0, 3])
+        self.assertEqual(result["demand_std"][0], 0)
+        self.assertEqual(list(result["reorder_point"][[0, 2, 3]]), [8, 0, 12])
+        # Desvio padrão amostral de [0, 4] * 5 = 2,108: segurança = 2 x 2,108 x 2
+        self.assertAlmostEqual(result["demand_std"][1], 2.108, places=3)
+        self.assertEqual(result["safety_stock"][1], 9)
+
+    def test_recompute_uses_one_grouped_query(self):
+        """Testa o cálculo a partir das saídas, com um número fixo de queries"""
+        steady = self._create_product("Arroz", quantity=10)
+        idle = self._create_product("Feijão", quantity=3)
+        for days_ago in range(60):
+            self._exit(steady, 2, days_ago)
+        self._exit(steady, 100, 3, type_sale="entry")
+        self._exit(steady, 100, 200)
+
+        # Produtos, saídas agrupadas e a substituição das previsões
+        with self.assertNumQueries(6):
+            self.assertEqual(
+                DemandForecastService.recompute(self.company, self.today), 2
+            )
+
+        forecast = ProductForecast.objects.get(product=steady)
+        self.assertAlmostEqual(forecast.daily_demand, 2, places=3)
+        self.assertAlmostEqual(forecast.moving_average, 2)
+        self.assertEqual(forecast.reorder_point, 14)
+        self.assertAlmostEqual(forecast.days_of_stock(steady.quantity), 5, places=3)
+        self.assertEqual(ProductForecast.objects.get(product=idle).reorder_point, 0)
+
+    def test_dashboard_alerts_use_reorder_point(self):
+        """Testa o alerta de estoque baixo pelo ponto de pedido"""
+        steady = self._create_product("Arroz", quantity=12)
+        self._create_product("Feijão", quantity=15)
+        without_forecast = self._create_product("Milho", quantity=4)
+        for days_ago in range(30):
+            self._exit(steady, 2, days_ago)
+        DemandForecastService.recompute(self.company, self.today)
+        ProductForecast.objects.filter(product=without_forecast).delete()
+
+        metrics = DashboardService.get_metrics(self.company)
+        # Arroz (12 un., pedido em 14) e Milho (sem previsão, menos de 10
+        # un.); Feijão não tem saídas e está acima do limite fixo
+        self.assertEqual(metrics["low_stock_count"], 2)
+        self.assertEqual(
+            [product.name for product in metrics["low_stock_products"]],
+            ["Milho", "Arroz"],
+        )
+
+    def test_out_of_stock_without_exits_is_alerted(self):
+        """Testa se produto sem saídas (ponto de pedido zero) usa o limite fixo"""
+        out_of_stock = self._create_product("Feijão", quantity=0)
+        self._create_product("Milho", quantity=15)
+        DemandForecastService.recompute(self.company, self.today)
+        self.assertEqual(
+            ProductForecast.objects.get(product=out_of_stock).reorder_point, 0
+        )
+
+        metrics = DashboardService.get_metrics(self.company)
+        self.assertEqual(metrics["low_stock_count"], 1)
+        self.assertEqual(
+            [product.name for product in metrics["low_stock_products"]], ["Feijão"]
+        )
+
+    def test_recompute_replaces_forecast_of_transferred_product(self):
+        """Testa a previsão de produto que mudou de empresa depois do cálculo"""
+        other_company = Company.objects.create(name="Outra", cnpj="99888777000166")
+        product = self._create_product("Arroz", quantity=10)
+        ProductForecast.objects.create(
+            product=product,
+            company=other_company,
+            reorder_point=99,
+            computed_at=timezone.now(),
+        )
+
+        self.assertEqual(DemandForecastService.recompute(self.company, self.today), 1)
+        forecast = ProductForecast.objects.get(product=product)
+        self.assertEqual(forecast.company, self.company)
+        self.assertEqual(forecast.reorder_point, 0)
+
+    def test_command(self):
+        """Testa o cálculo pelo comando"""
+        self._create_product("Arroz", quantity=10)
+        out = StringIO()
+        call_command("compute_forecasts", company=[self.company.pk], stdout=out)
+        self.assertIn("1 previsão(ões) calculada(s) para 1 empresa(s)", out.getvalue())
+        self.assertTrue(ProductForecast.objects.filter(company=self.company).exists())
+
+
+class ProductLotTests(QueryPlanAssertions, TestCase):
+    """Testa os lotes dos produtos e os agregados no produto"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Laticínios", company=self.company)
+        self.today = timezone.localdate()
+        self.product = Product.objects.create(
+            name="Leite",
+            category=self.category,
+            batch="L1",
+            quantity=10,
+            initial_quantity=10,
+            price=4,
+            expiration_date=self.today + timedelta(days=60),
+            company=self.company,
+        )
+
+    def _lots(self):
+        return list(
+            self.product.lots.order_by("expiration_date").values_list(
+                "batch", "quantity"
+            )
+        )
+
+    def test_new_product_gets_initial_lot(self):
+        """Testa se o produto novo ganha um lote com os próprios dados"""
+        lot = self.product.lots.get()
+        self.assertEqual(lot.batch, "L1")
+        self.assertEqual(lot.quantity, 10)
+        self.assertEqual(lot.initial_quantity, 10)
+        self.assertEqual(lot.expiration_date, self.product.expiration_date)
+        self.assertEqual(lot.company, self.company)
+
+    def test_single_lot_follows_product(self):
+        """Testa se o lote único acompanha a edição do produto"""
+        self.product.quantity = 7
+        self.product.save()
+        self.assertEqual(self._lots(), [("L1", 7)])
+
+    def test_add_lot_updates_aggregates(self):
+        """Testa os agregados do produto depois de adicionar um lote"""
+        LotService.add_lot(self.product, 4, self.today + timedelta(days=3), "L2")
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 14)
+        self.assertEqual(self.product.initial_quantity, 14)
+        self.assertEqual(self.product.batch, "L2")
+        self.assertEqual(self.product.expiration_date, self.today + timedelta(days=3))
+        self.assertEqual(self.product.status, "proximo_vencimento")
+        self.assertEqual(self.company.stats.total_stock, 14)
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_movements_are_distributed_between_lots(self):
+        """Testa se saídas consomem primeiro o lote que vence antes"""
+        LotService.add_lot(self.product, 4, self.today + timedelta(days=3), "L2")
+
+        SaleService.record_movement(self.product, "exits", 6, self.user, self.company)
+        self.assertEqual(self._lots(), [("L2", 0), ("L1", 8)])
+        # Sem estoque no L2, o produto passa a mostrar o lote seguinte
+        self.assertEqual(self.product.quantity, 8)
+        self.assertEqual(self.product.batch, "L1")
+        self.assertEqual(self.product.status, "ok")
+
+        SaleService.record_movement(self.product, "entry", 3, self.user, self.company)
+        self.assertEqual(self._lots(), [("L2", 3), ("L1", 8)])
+        self.assertEqual(self.product.quantity, 11)
+
+    def test_bulk_movements_update_lots(self):
+        """Testa as movimentações em lote com e sem lote informado"""
+        lot = LotService.add_lot(self.product, 4, self.today + timedelta(days=90), "L2")
+
+        sales, errors = SaleService.record_bulk_movements(
+            [
+                {"product": self.product.pk, "type": "exits", "quantity": 3},
+                {
+                    "product": self.product.pk,
+                    "lot": lot.pk,
+                    "type": "exits",
+                    "quantity": 1,
+                },
+            ],
+            self.user,
+        )
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sales[1].lot, lot)
+        self.assertEqual(self._lots(), [("L1", 7), ("L2", 3)])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+
+    def test_editing_multi_lot_product_keeps_aggregates(self):
+        """Testa a edição da quantidade de um produto com vários lotes"""
+        LotService.add_lot(self.product, 4, self.today + timedelta(days=90), "L2")
+        self.product.refresh_from_db()
+
+        self.product.quantity = 5
+        self.product.save()
+
+        self.assertEqual(self._lots(), [("L1", 1), ("L2", 4)])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 5)
+        self.assertEqual(self.product.batch, "L1")
+
+    def test_every_lot_batch_is_searchable(self):
+        """Testa se o código de um lote que não é o exibido é encontrado"""
+        LotService.add_lot(self.product, 4, self.today + timedelta(days=90), "XY9")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.batch, "L1")
+
+        results = ProductSearchService.search("xy9", self.company)
+        self.assertEqual([result["id"] for result in results], [self.product.pk])
+
+        ProductSearchService.rebuild()
+        results = ProductSearchService.search("xy9", self.company)
+        self.assertEqual([result["id"] for result in results], [self.product.pk])
+
+    def test_add_lot_view(self):
+        """Testa a adição de lote pela tela de edição do produto"""
+        request = RequestFactory().post(
+            f"/products/{self.product.pk}/lots/create/",
+            {
+                "batch": "L2",
+                "quantity": 5,
+                "expiration_date": (self.today + timedelta(days=90)).isoformat(),
+            },
+        )
+        request.user = self.user
+        request.session = {}
+        request._messages = SessionStorage(request)
+
+        response = ProductLotCreateView.as_view()(request, id_product=self.product.pk)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self._lots(), [("L1", 10), ("L2", 5)])
+
+    @skipUnless(connection.vendor == "sqlite", "Plano de execução do SQLite")
+    def test_lot_lookup_uses_index(self):
+        """Testa se os lotes do produto são lidos pelo índice, já ordenados"""
+        self.assertUsesIndex(
+            self.product.lots.order_by("expiration_date", "id"),
+            "lot_product_expiry_idx",
+        )
+
+
+class FoldDuplicateLotsMigrationTests(TestCase):
+    """Testa a migração que junta os produtos duplicados em lotes"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.supplier = Supplier.objects.create(
+            name="Fornecedor", cnpj="11444777000161", company=self.company
+        )
+        today = timezone.localdate()
+        # Um lote por linha de Product, como antes do modelo Lot
+        self.rows = [
+            Product.objects.create(
+                name="Leite",
+                category=Category.objects.create(
+                    name=f"Laticínios {days}", company=self.company
+                ),
+                batch=f"L{days}",
+                quantity=5,
+                initial_quantity=5,
+                price=4,
+                expiration_date=today + timedelta(days=days),
+                company=self.company,
+            )
+            for days in (30, 10, 20)
+        ]
+        # Mesmo nome com outro preço: não é juntado
+        self.other_price = Product.objects.create(
+            name="Leite",
+            category=Category.objects.create(name="Outros", company=self.company),
+            batch="L40",
+            quantity=5,
+            initial_quantity=5,
+            price=9,
+            expiration_date=today + timedelta(days=40),
+            company=self.company,
+        )
+        for row in self.rows:
+            ProductSupplier.objects.create(product=row, supplier=self.supplier)
+        now = timezone.now()
+        Product.objects.update(created_at=now - timedelta(days=1))
+        self.checkpoint_at = now - timedelta(hours=1)
+        StockCheckpoint.objects.create(
+            product=self.rows[0],
+            company=self.company,
+            taken_at=self.checkpoint_at,
+            quantity=5,
+        )
+        Sale.objects.create(
+            product=self.rows[1],
+            user=self.user,
+            company=self.company,
+            type="entry",
+            quantity=5,
+        )
+        Lot.objects.all().delete()
+
+    def _migrate(self):
+        migration = import_module(
+            "in_stock.app.products.migrations.0013_fold_duplicate_lots"
+        )
+        output = StringIO()
+        with redirect_stdout(output):
+            report = migration.fold_duplicate_lots(django_apps, None)
+        # Nada é escrito na saída do migrate
+        self.assertEqual(output.getvalue(), "")
+        return "\n".join(report)
+
+    def test_duplicates_become_lots(self):
+        """Testa se os duplicados viram lotes do produto de menor id"""
+        output = self._migrate()
+
+        product = Product.objects.get(pk=self.rows[0].pk)
+        self.assertEqual(product.quantity, 15)
+        self.assertEqual(product.batch, "L10")
+        self.assertEqual(
+            list(product.lots.order_by("expiration_date").values_list("batch")),
+            [("L10",), ("L20",), ("L30",)],
+        )
+        self.assertEqual(Sale.objects.get().product, product)
+        self.assertEqual(ProductSupplier.objects.get().product, product)
+        self.assertEqual(self.company.stats.total_products, 2)
+        self.assertEqual(self.company.stats.total_stock, 20)
+        self.assertIn("mudaram para a categoria", output)
+
+    def test_other_price_is_not_folded(self):
+        """Testa se linhas com outro preço ficam separadas e são listadas"""
+        output = self._migrate()
+
+        self.other_price.refresh_from_db()
+        self.assertEqual(self.other_price.quantity, 5)
+        self.assertEqual(self.other_price.lots.get().batch, "L40")
+        self.assertIn(f"[{self.other_price.pk}]", output)
+        self.assertIn("outro preço", output)
+
+    def test_checkpoints_are_merged(self):
+        """Testa se o histórico do produto mantido inclui os duplicados"""
+        self._migrate()
+        product = Product.objects.get(pk=self.rows[0].pk)
+
+        # L30 (5) + L10 (5 antes da entrada) + L20 (5), menos a entrada
+        # registrada depois do checkpoint
+        self.assertEqual(
+            StockHistoryService.get_product_stock_at(product, self.checkpoint_at),
+            10,
+        )
+        self.assertEqual(
+            StockHistoryService.get_product_stock_at(product, timezone.now()), 15
+        )
+
+    def test_all_lot_batches_are_searchable(self):
+        """Testa se os códigos de todos os lotes entram no índice de busca"""
+        self._migrate()
+        products = ProductSearchService.filter(Product.objects.all(), "L20")
+        self.assertEqual(list(products), [self.rows[0]])
+
+        # Os termos montados na migração seguem as regras do serviço
+        migration = import_module(
+            "in_stock.app.products.migrations.0013_fold_duplicate_lots"
+        )
+        self.assertEqual(
+            migration.search_terms("Leite Integral", ["L10", "L20", "L10"]),
+            ProductSearchService.build_terms(
+                "Leite Integral", ProductSearchService.batch_text("L10", ["L20"])
+            ),
+        )
+
+
+class CategoryStatsTests(TestCase):
+    """Testa as estatísticas de produtos por categoria"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        cache.clear()
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.food = Category.objects.create(name="Alimentos", company=self.company)
+        self.drinks = Category.objects.create(name="Bebidas", company=self.company)
+        self.other = Category.objects.create(name="Outros", company=self.other_company)
+        self.rice = self._create_product("Arroz", self.food, 10, 5)
+        self._create_product("Feijão", self.food, 4, "2.50")
+        self._create_product("Café", self.other, 7, 20)
+
+    def _create_product(self, name, category, quantity, price):
+        return Product.objects.create(
+            name=name,
+            category=category,
+            quantity=quantity,
+            price=price,
+            expiration_date=date(2030, 1, 1),
+            company=category.company,
+        )
+
+    def test_totals_are_scoped_by_company(self):
+        """Testa os totais por categoria apenas da empresa"""
+        stats = CategoryStatsService.get_stats(self.company)
+
+        self.assertEqual(set(stats), {self.food.pk})
+        self.assertEqual(stats[self.food.pk]["product_count"], 2)
+        self.assertEqual(stats[self.food.pk]["units"], 14)
+        self.assertEqual(stats[self.food.pk]["stock_value"], Decimal("60.00"))
+
+    def test_stats_are_cached_and_invalidated(self):
+        """Testa o cache e a invalidação por alterações de produtos"""
+        CategoryStatsService.get_stats(self.company)
+        with self.assertNumQueries(0):
+            CategoryStatsService.get_stats(self.company)
+
+        SaleService.record_movement(self.rice, "exits", 3, self.user, self.company)
+        self.assertEqual(
+            CategoryStatsService.get_stats(self.company)[self.food.pk]["units"], 11
+        )
+
+        self._create_product("Suco", self.drinks, 2, 3)
+        stats = CategoryStatsService.get_stats(self.company)
+        self.assertEqual(stats[self.drinks.pk]["product_count"], 1)
+
+    def test_category_list_shows_totals(self):
+        """Testa os totais na listagem de categorias"""
+        request = RequestFactory().get("/products/categories/")
+        request.user = self.user
+
+        response = CategoryListView.as_view()(request)
+
+        self.assertContains(response, "R$ 60.00")
+        self.assertNotContains(response, "Outros")
@@ -22,11 +22,36 @@ urlpatterns = [
         views.ProductUpdateView.as_view(),
         name="product-update",
     ),
+    path(
+        "<int:id_product>/lots/create/",
+        views.ProductLotCreateView.as_view(),
+        name="product-lot-create",
+    ),
     path(
         "<int:id_product>/delete/",
         views.ProductDeleteView.as_view(),
         name="product-delete",
     ),
+    path(
+        "autocomplete/",
+        views.ProductAutocompleteView.as_view(),
+        name="product-autocomplete",
+    ),
+    path(
+        "search/",
+        views.ProductSearchView.as_view(),
+        name="product-search",
+    ),
+    path(
+        "import/",
+        views.ProductImportView.as_view(),
+        name="product-import",
+    ),
+    path(
+        "expiration-calendar/",
+        views.ExpirationCalendarView.as_view(),
+        name="product-expiration-calendar",
+    ),
     # Rota legada para GestaoProdutos
     path(
         "pages/GestaoProdutos.html",
@@ -55,4 +80,9 @@ urlpatterns = [
         name="category-delete",
     ),
     path("export/", views.ProductExportView.as_view(), name="product-export"),
+    path(
+        "export/csv/",
+        views.ProductCsvExportView.as_view(),
+        name="product-export-csv",
+    ),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,14 +1,26 @@
 from datetime import datetime
+from urllib.parse import urlencode
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.utils import timezone
 from django.views import View
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
 
-from .forms import CategoryForm, ProductEditForm, ProductForm
+from .autocomplete import for_user, get_limit
+from .category_stats_service import CategoryStatsService
+from .expiration_service import EXPIRATION_BUCKETS, ExpirationCalendarService
+from .export_service import (
+    CSV_CONTENT_TYPE,
+    XLSX_CONTENT_TYPE,
+    ProductExportService,
+)
+from .forms import CategoryForm, LotForm, ProductEditForm, ProductForm
+from .import_service import IMPORT_COLUMNS, ProductImportService
+from .lot_service import LotService
+from .models import Product
+from .search_service import ProductSearchService
 from .services import CategoryService, ProductService
 
 # =========================
@@ -27,6 +39,12 @@ class ProductListCreateView(LoginRequiredMixin, View):
             products = ProductService.get_all().filter(company=request.user.company_obj)
         else:
             products = ProductService.get_all().none()
+        company = None if request.user.is_instock_admin else request.user.company_obj
+
+        # Busca por nome ou lote (índice de busca da empresa)
+        query = request.GET.get("q")
+        if query and query.strip():
+            products = ProductSearchService.filter(products, query, company)
 
         # Filtro por categoria
         category_id = request.GET.get("category")
@@ -53,16 +71,63 @@ class ProductListCreateView(LoginRequiredMixin, View):
         else:
             categories = CategoryService.get_all().none()
 
+        # Paginação e ordenação no servidor (com a previsão de demanda, para
+        # o alerta de reposição)
+        page = ProductService.paginate(
+            products.select_related("forecast"),
+            sort=request.GET.get("sort"),
+            page=request.GET.get("page"),
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        )
+        filters = {
+            "q": query,
+            "category": category_id,
+            "batch": batch,
+            "expiration_date": expiration_date,
+        }
+        filters = {
+            key: value
+            for key, value in filters.items()
+            if value and value.strip() and value != "None"
+        }
+        total_count = (
+            ProductService.count_products(products, company, filters)
+            if request.user.is_instock_admin or company
+            else 0
+        )
+
+        # Links de navegação mantendo filtros e ordenação
+        params = {**filters, "sort": page["sort"]}
+        if page["next_cursor"]:
+            next_query = urlencode({**params, "after": page["next_cursor"]})
+        elif page["has_next"] and page["sort"] != "name":
+            next_query = urlencode({**params, "page": page["page"] + 1})
+        else:
+            next_query = None
+        if page["previous_cursor"]:
+            previous_query = urlencode({**params, "before": page["previous_cursor"]})
+        elif page["has_previous"] and page["sort"] != "name":
+            previous_query = urlencode({**params, "page": page["page"] - 1})
+        else:
+            previous_query = None
+
         return render(
             request,
             "products/list.html",
             {
-                "products": products,
+                "products": page["products"],
                 "categories": categories,
                 "active_page": "products",
+                "filter_query": filters.get("q", ""),
                 "filter_category": category_id,
                 "filter_batch": batch,
                 "filter_date": expiration_date,
+                "sort": page["sort"],
+                "sort_query": urlencode(filters),
+                "total_count": total_count,
+                "next_query": next_query,
+                "previous_query": previous_query,
             },
         )
 
@@ -83,114 +148,19 @@ class ProductExportView(LoginRequiredMixin, View):
                 products = ProductService.get_all().none()
 
             # Aplicar os mesmos filtros
-            category_id = request.POST.get("category")
-            if category_id and category_id.strip() and category_id != "None":
-                products = products.filter(category_id=category_id)
-
-            batch = request.POST.get("batch")
-            if batch and batch.strip() and batch != "None":
-                products = products.filter(batch__icontains=batch)
-
-            expiration_date = request.POST.get("expiration_date")
-            if (
-                expiration_date
-                and expiration_date.strip()
-                and expiration_date != "None"
-            ):
-                products = products.filter(expiration_date=expiration_date)
-
-            # Criar workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Produtos"
-
-            # Estilos
-            from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-
-            header_fill = PatternFill(
-                start_color="FF8C00", end_color="FF8C00", fill_type="solid"
+            company = (
+                None if request.user.is_instock_admin else request.user.company_obj
             )
-            header_font = Font(bold=True, color="FFFFFF", size=12)
-            border = Border(
-                left=Side(style="thin"),
-                right=Side(style="thin"),
-                top=Side(style="thin"),
-                bottom=Side(style="thin"),
-            )
-            center_alignment = Alignment(horizontal="center", vertical="center")
-
-            # Headers
-            headers = [
-                "ID",
-                "Nome",
-                "Categoria",
-                "Lote",
-                "Quantidade",
-                "Preço (R$)",
-                "Vencimento",
-                "Status",
-            ]
-            ws.append(headers)
-
-            # Aplicar estilo ao header
-            for cell in ws[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = center_alignment
-                cell.border = border
-
-            # Dados
-            for product in products:
-                # Determinar status
-                if product.status == "ok":
-                    status_text = "OK"
-                elif product.status == "baixo":
-                    status_text = "Abaixo do Estoque"
-                elif product.status == "proximo_vencimento":
-                    status_text = "Próximo Vencimento"
-                else:
-                    status_text = "-"
-
-                row = [
-                    product.id,
-                    product.name,
-                    product.category.name,
-                    product.batch or "-",
-                    product.quantity,
-                    f"R$ {product.price:.2f}",
-                    product.expiration_date.strftime("%d/%m/%Y"),
-                    status_text,
-                ]
-                ws.append(row)
-
-                # Aplicar border a todas as células
-                for cell in ws[ws.max_row]:
-                    cell.border = border
-                    if ws.max_row > 1:
-                        if isinstance(cell.value, (int, float)):
-                            cell.alignment = center_alignment
-
-            # Ajustar largura das colunas
-            ws.column_dimensions["A"].width = 8
-            ws.column_dimensions["B"].width = 25
-            ws.column_dimensions["C"].width = 15
-            ws.column_dimensions["D"].width = 15
-            ws.column_dimensions["E"].width = 12
-            ws.column_dimensions["F"].width = 15
-            ws.column_dimensions["G"].width = 15
-            ws.column_dimensions["H"].width = 20
-
-            # Preparar resposta
-            response = HttpResponse(
-                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-            response["Content-Disposition"] = (
-                f'attachment; filename="produtos_{datetime.now().strftime("%d_%m_%Y_%H%M%S")}.xlsx"'
+            products = ProductService.apply_filters(products, request.POST, company)
+
+            # Planilha gerada em arquivo temporário e enviada em partes
+            return FileResponse(
+                ProductExportService.export_xlsx(products),
+                as_attachment=True,
+                filename=f"produtos_{datetime.now().strftime('%d_%m_%Y_%H%M%S')}.xlsx",
+                content_type=XLSX_CONTENT_TYPE,
             )
 
-            wb.save(response)
-            return response
-
         except Exception as e:
             print(f"\n=== ERRO NA EXPORTAÇÃO ===")
             print(f"Erro: {str(e)}")
@@ -202,11 +172,79 @@ class ProductExportView(LoginRequiredMixin, View):
             return redirect("product-list-create")
 
 
+class ProductCsvExportView(LoginRequiredMixin, View):
+    """
+    Exporta produtos para CSV, com os mesmos filtros da exportação Excel
+    (parâmetros GET). O arquivo é enviado em partes, conforme é gerado.
+    """
+
+    def get(self, request):
+        if request.user.is_instock_admin:
+            products = ProductService.get_all()
+        elif request.user.company_obj:
+            products = ProductService.get_all().filter(company=request.user.company_obj)
+        else:
+            products = ProductService.get_all().none()
+
+        company = None if request.user.is_instock_admin else request.user.company_obj
+        products = ProductService.apply_filters(products, request.GET, company)
+        response = StreamingHttpResponse(
+            ProductExportService.iter_csv(products), content_type=CSV_CONTENT_TYPE
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="produtos_{datetime.now().strftime("%d_%m_%Y_%H%M%S")}.csv"'
+        )
+        return response
+
+
+class ProductAutocompleteView(LoginRequiredMixin, View):
+    """
+    Busca produtos da empresa pelo início do nome (parâmetros q e limit),
+    para os campos de autocomplete
+    """
+
+    def get(self, request):
+        products = for_user(Product.objects.all(), request.user)
+        return JsonResponse(
+            {
+                "results": ProductService.autocomplete(
+                    products, request.GET.get("q", ""), get_limit(request.GET)
+                )
+            }
+        )
+
+
+class ProductSearchView(LoginRequiredMixin, View):
+    """
+    Typeahead de produtos em JSON: busca por palavras do nome ou do lote,
+    sem diferenciar acentos, com os produtos que começam com o texto antes
+    dos que o contêm. Aceita os filtros da listagem (category, batch e
+    expiration_date) e o parâmetro limit.
+    """
+
+    def get(self, request):
+        if request.user.is_instock_admin:
+            company = None
+        elif request.user.company_obj:
+            company = request.user.company_obj
+        else:
+            return JsonResponse({"results": []})
+
+        filters = ProductService.filter_values(request.GET)
+        return JsonResponse(
+            {
+                "results": ProductSearchService.search(
+                    filters.pop("q", ""), company, filters, get_limit(request.GET)
+                )
+            }
+        )
+
+
 class ProductCreateView(LoginRequiredMixin, View):
     """Cria novo produto"""
 
     def get(self, request):
-        form = ProductForm()
+        form = ProductForm(user=request.user)
         return render(
             request,
             "products/create.html",
@@ -214,7 +252,7 @@ class ProductCreateView(LoginRequiredMixin, View):
         )
 
     def post(self, request):
-        form = ProductForm(request.POST, request.FILES)
+        form = ProductForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             try:
                 product = ProductService.create_product(request)
@@ -247,11 +285,17 @@ class ProductUpdateView(LoginRequiredMixin, View):
             messages.error(request, "Produto não encontrado.")
             return redirect("product-list-create")
 
-        form = ProductEditForm(instance=product)
+        form = ProductEditForm(instance=product, user=request.user)
         return render(
             request,
             "products/edit.html",
-            {"form": form, "product": product, "active_page": "products"},
+            {
+                "form": form,
+                "product": product,
+                "lots": product.lots.all(),
+                "lot_form": LotForm(),
+                "active_page": "products",
+            },
         )
 
     def post(self, request, id_product):
@@ -260,7 +304,7 @@ class ProductUpdateView(LoginRequiredMixin, View):
             messages.error(request, "Produto não encontrado.")
             return redirect("product-list-create")
 
-        form = ProductEditForm(request.POST, instance=product)
+        form = ProductEditForm(request.POST, instance=product, user=request.user)
         if form.is_valid():
             try:
                 form.save()
@@ -277,8 +321,42 @@ class ProductUpdateView(LoginRequiredMixin, View):
         return render(
             request,
             "products/edit.html",
-            {"form": form, "product": product, "active_page": "products"},
+            {
+                "form": form,
+                "product": product,
+                "lots": product.lots.all(),
+                "lot_form": LotForm(),
+                "active_page": "products",
+            },
+        )
+
+
+class ProductLotCreateView(LoginRequiredMixin, View):
+    """Adiciona um lote a um produto"""
+
+    def post(self, request, id_product):
+        product = (
+            for_user(Product.objects.all(), request.user).filter(pk=id_product).first()
         )
+        if not product:
+            messages.error(request, "Produto não encontrado.")
+            return redirect("product-list-create")
+
+        form = LotForm(request.POST)
+        if form.is_valid():
+            LotService.add_lot(
+                product,
+                form.cleaned_data["quantity"],
+                form.cleaned_data["expiration_date"],
+                batch=form.cleaned_data["batch"],
+            )
+            messages.success(request, "Lote adicionado com sucesso!")
+        else:
+            for field, errors in form.errors.items():
+                for error in errors:
+                    messages.error(request, f"{field}: {error}")
+
+        return redirect("product-update", id_product=product.pk)
 
 
 class ProductDeleteView(LoginRequiredMixin, View):
@@ -297,6 +375,117 @@ class ProductDeleteView(LoginRequiredMixin, View):
         return redirect("product-list-create")
 
 
+class ProductImportView(LoginRequiredMixin, View):
+    """Importa produtos em lote a partir de uma planilha XLSX ou CSV"""
+
+    # Quantidade máxima de erros exibidos na página de resultado
+    MAX_ERRORS_SHOWN = 200
+
+    def get(self, request):
+        return render(
+            request,
+            "products/import.html",
+            {"active_page": "products", "columns": IMPORT_COLUMNS},
+        )
+
+    def post(self, request):
+        context = {"active_page": "products", "columns": IMPORT_COLUMNS}
+        company = request.user.company_obj
+        upload = request.FILES.get("file")
+
+        if not company:
+            messages.error(request, "Seu usuário não está vinculado a uma empresa.")
+        elif not upload:
+            messages.error(request, "Selecione um arquivo para importar.")
+        else:
+            try:
+                result = ProductImportService.import_products(
+                    ProductImportService.read_rows(upload), company
+                )
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                if result["created"]:
+                    messages.success(
+                        request,
+                        f"{result['created']} produto(s) importado(s) com sucesso!",
+                    )
+                if result["errors"]:
+                    messages.error(
+                        request,
+                        f"{len(result['errors'])} linha(s) não foram importadas.",
+                    )
+                context["errors"] = result["errors"][: self.MAX_ERRORS_SHOWN]
+                context["hidden_errors"] = max(
+                    len(result["errors"]) - self.MAX_ERRORS_SHOWN, 0
+                )
+
+        return render(request, "products/import.html", context)
+
+
+class ExpirationCalendarView(LoginRequiredMixin, View):
+    """
+    Calendário de vencimentos em JSON.
+
+    Sem o parâmetro "bucket", retorna as faixas (vencidos, 0-7, 8-30 e 31-90
+    dias) com as contagens e a primeira página de cada uma. Com "bucket",
+    retorna apenas a faixa pedida, a partir do cursor "after".
+    """
+
+    def get(self, request):
+        # Filtra produtos pela empresa do usuário (multi-tenant)
+        if request.user.is_instock_admin:
+            company = None
+        elif request.user.company_obj:
+            company = request.user.company_obj
+        else:
+            return JsonResponse({"buckets": []})
+
+        try:
+            page_size = min(max(int(request.GET.get("limit", 20)), 1), 100)
+        except ValueError:
+            page_size = 20
+
+        today = timezone.now().date()
+        summary = ExpirationCalendarService.get_summary(company, today)
+
+        bucket = request.GET.get("bucket")
+        if bucket:
+            try:
+                ExpirationCalendarService.get_bucket(bucket)
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            keys = [bucket]
+        else:
+            keys = [key for key, _, _, _ in EXPIRATION_BUCKETS]
+
+        buckets = []
+        for key, label, _, _ in EXPIRATION_BUCKETS:
+            if key not in keys:
+                continue
+            page = ExpirationCalendarService.get_page(
+                company,
+                key,
+                after=request.GET.get("after") if bucket else None,
+                page_size=page_size,
+                today=today,
+            )
+            buckets.append(
+                {
+                    "key": key,
+                    "label": label,
+                    **summary[key],
+                    "products": [
+                        ExpirationCalendarService.serialize(product, today)
+                        for product in page["products"]
+                    ],
+                    "next_cursor": page["next_cursor"],
+                }
+            )
+
+        return JsonResponse({"today": today.isoformat(), "buckets": buckets})
+
+
 # =========================
 # CATEGORIAS
 # =========================
@@ -307,15 +496,18 @@ class CategoryListView(LoginRequiredMixin, View):
 
     def get(self, request):
         # Filtra categorias pela empresa do usuário (multi-tenant)
+        company = None
         if request.user.is_instock_admin:
             categories = CategoryService.get_all()
         elif request.user.company_obj:
-            categories = CategoryService.get_all().filter(
-                company=request.user.company_obj
-            )
+            company = request.user.company_obj
+            categories = CategoryService.get_all().filter(company=company)
         else:
             categories = CategoryService.get_all().none()
 
+        # Produtos, unidades e valor em estoque de cada categoria (em cache)
+        categories = CategoryStatsService.annotate(categories, company)
+
         return render(
             request,
             "products/categories/index.html",
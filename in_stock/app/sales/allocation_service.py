@@ -0,0 +1,129 @@
+"""
+Serviço de Alocação FEFO - Distribui saídas entre os lotes de um produto
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from in_stock.app.products.models import Lot, Product
+from in_stock.app.sales.services import SaleService
+
+
+class FefoAllocationService:
+    """
+    Alocação FEFO (first-expired, first-out) para saídas de estoque.
+
+    Cada lote de um produto é um Lot, com o próprio `batch`, quantidade e
+    `expiration_date`. A saída é dividida entre os lotes na ordem de
+    vencimento, começando pelo que vence primeiro, para reduzir perdas por
+    vencimento.
+    """
+
+    @staticmethod
+    def get_lots(product, today=None, lock=False):
+        """
+        Retorna os lotes do produto com estoque disponível, do que vence
+        primeiro ao que vence por último.
+
+        A busca usa o índice (product, expiration_date), então a ordenação
+        vem do próprio índice mesmo para produtos com centenas de lotes.
+        Lotes já vencidos não são considerados.
+        """
+        today = today or timezone.now().date()
+        lots = Lot.objects.filter(
+            product=product, quantity__gt=0, expiration_date__gte=today
+        )
+        if lock:
+            lots = lots.select_for_update()
+        return lots.order_by("expiration_date", "id")
+
+    @staticmethod
+    def plan(lots, quantity):
+        """
+        Divide a quantidade entre os lotes, na ordem recebida.
+
+        Returns:
+            list: [(lote, quantidade), ...]
+
+        Raises:
+            ValueError: Se os lotes não tiverem estoque suficiente
+        """
+        allocation = []
+        remaining = quantity
+        for lot in lots:
+            if remaining <= 0:
+                break
+            taken = min(lot.quantity, remaining)
+            allocation.append((lot, taken))
+            remaining -= taken
+
+        if remaining > 0:
+            available = quantity - remaining
+            raise ValueError(
+                f"Estoque insuficiente: disponível {available} "
+                f"nos lotes válidos, saída {quantity}."
+            )
+        return allocation
+
+    @staticmethod
+    def allocate_exit(
+        product,
+        quantity,
+        user,
+        company=None,
+        supplier=None,
+        description=None,
+    ):
+        """
+        Registra uma saída distribuída entre os lotes por ordem de vencimento.
+
+        O produto e os lotes são bloqueados (select_for_update), nessa ordem,
+        e as movimentações são gravadas em lote na mesma transação: ou a
+        saída inteira é registrada, ou nada é alterado.
+
+        Args:
+            product: Produto
+            quantity: Quantidade total da saída
+            user: Usuário que registra a saída
+            company: Empresa do produto (e das movimentações)
+            supplier: Fornecedor informado na movimentação
+            description: Descrição das movimentações
+
+        Returns:
+            list: Movimentações (Sale) criadas, uma por lote utilizado
+
+        Raises:
+            ValueError: Se a quantidade for inválida ou não houver estoque
+                suficiente nos lotes válidos
+        """
+        if quantity <= 0:
+            raise ValueError("A quantidade deve ser maior que zero.")
+
+        with transaction.atomic():
+            products = Product.objects.select_for_update().filter(pk=product.pk)
+            if company:
+                products = products.filter(company=company)
+            if not products.exists():
+                raise ValueError(f"Produto {product.pk} não encontrado.")
+            lots = FefoAllocationService.get_lots(product, lock=True)
+            allocation = FefoAllocationService.plan(lots, quantity)
+
+            sales, errors = SaleService.record_bulk_movements(
+                [
+                    {
+                        "product": product.pk,
+                        "lot": lot.pk,
+                        "type": "exits",
+                        "quantity": taken,
+                        "supplier": supplier.pk if supplier else None,
+                        "description": description,
+                    }
+                    for lot, taken in allocation
+                ],
+                user,
+            )
+            if errors:
+                raise ValueError(
+                    "; ".join(error for line in errors for error in line["errors"])
+                )
+        return sales
@@ -0,0 +1,227 @@
+"""
+Serviço de Exportação - Gera CSV e Parquet de movimentações sem carregá-las em memória
+"""
+
+import tempfile
+from datetime import datetime, time, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.db.models import Q
+from django.utils import timezone
+
+from in_stock.app.products.export_service import csv_lines
+
+from .models import Sale
+
+# Quantidade de movimentações lidas do banco por vez
+SALES_EXPORT_CHUNK_SIZE = 5000
+
+# Movimentações por row group na exportação Parquet
+SALES_PARQUET_ROW_GROUP_SIZE = 50000
+
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+
+# Nomes repetidos, gravados com dicionário (índice + lista de valores únicos)
+_DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+
+# Colunas da exportação Parquet: (campo de values_list, coluna Arrow)
+SALES_PARQUET_COLUMNS = (
+    ("id", pa.field("id", pa.int64(), nullable=False)),
+    ("date", pa.field("date", pa.timestamp("us", tz="UTC"), nullable=False)),
+    ("type", pa.field("type", pa.dictionary(pa.int8(), pa.string()), nullable=False)),
+    ("quantity", pa.field("quantity", pa.int32(), nullable=False)),
+    ("user_id", pa.field("user_id", pa.int64(), nullable=False)),
+    ("product_id", pa.field("product_id", pa.int64(), nullable=False)),
+    ("product__name", pa.field("product", pa.string(), nullable=False)),
+    ("product__batch", pa.field("batch", pa.string())),
+    ("product__price", pa.field("price", pa.decimal128(10, 2), nullable=False)),
+    ("product__expiration_date", pa.field("expiration_date", pa.date32())),
+    ("product__category_id", pa.field("category_id", pa.int64(), nullable=False)),
+    ("product__category__name", pa.field("category", _DICTIONARY, nullable=False)),
+    ("supplier_id", pa.field("supplier_id", pa.int64())),
+    ("supplier__name", pa.field("supplier", _DICTIONARY)),
+    ("description", pa.field("description", pa.string())),
+)
+
+# Colunas do CSV de movimentações
+SALES_CSV_COLUMNS = (
+    "id",
+    "date",
+    "type",
+    "product_id",
+    "product",
+    "batch",
+    "quantity",
+    "supplier_id",
+    "user_id",
+    "description",
+)
+
+
+class SaleExportService:
+    """
+    Exportação de movimentações para CSV e Parquet.
+
+    As movimentações são lidas em blocos por cursor (keyset) em (date, id):
+    cada bloco é uma query limitada que continua a partir da última linha do
+    anterior, atendida pelos índices (company, date) e (company, type, date).
+    Assim o tempo é linear e a memória constante mesmo em bancos cujo driver
+    carrega o resultado inteiro de uma query (PyMySQL).
+    """
+
+    @staticmethod
+    def parse_date(value):
+        """
+        Converte uma data AAAA-MM-DD (None se vazia).
+
+        Raises:
+            ValueError: Se a data for inválida
+        """
+        value = (value or "").strip()
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError(f"Data inválida: {value} (use AAAA-MM-DD).")
+
+    @staticmethod
+    def filter(queryset, start_date=None, end_date=None, type_filter="", product=""):
+        """
+        Filtra as movimentações pelo período (datas inclusivas), tipo e
+        nome do produto.
+
+        Raises:
+            ValueError: Se o tipo for inválido
+        """
+        if start_date:
+            queryset = queryset.filter(
+                date__gte=timezone.make_aware(datetime.combine(start_date, time.min))
+            )
+        if end_date:
+            queryset = queryset.filter(
+                date__lt=timezone.make_aware(
+                    datetime.combine(end_date + timedelta(days=1), time.min)
+                )
+            )
+        if type_filter:
+            if type_filter not in dict(Sale.TIPO):
+                raise ValueError(f"Tipo inválido: {type_filter}.")
+            queryset = queryset.filter(type=type_filter)
+        if product:
+            queryset = queryset.filter(product__name__icontains=product)
+        return queryset
+
+    @staticmethod
+    def iter_chunks(queryset, fields, chunk_size=SALES_EXPORT_CHUNK_SIZE):
+        """
+        Lê as movimentações em ordem de (date, id), em blocos de chunk_size.
+
+        Args:
+            queryset: Movimentações já filtradas
+            fields: Campos de values_list (devem incluir "id" e "date")
+            chunk_size: Quantidade de linhas por bloco
+
+        Returns:
+            generator: listas de tuplas com os valores de fields
+        """
+        id_index, date_index = fields.index("id"), fields.index("date")
+        queryset = queryset.order_by("date", "id").values_list(*fields)
+        last = None
+        while True:
+            chunk = queryset
+            if last:
+                date, pk = last
+                chunk = chunk.filter(Q(date__gt=date) | Q(date=date, id__gt=pk))
+            rows = list(chunk[:chunk_size])
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            last = rows[-1][date_index], rows[-1][id_index]
+
+    @staticmethod
+    def get_rows(queryset, chunk_size=SALES_EXPORT_CHUNK_SIZE):
+        """
+        Retorna as linhas do CSV em ordem de (date, id), lidas em blocos.
+
+        Returns:
+            generator: tuplas com os valores de SALES_CSV_COLUMNS
+        """
+        fields = [
+            "id",
+            "date",
+            "type",
+            "product_id",
+            "product__name",
+            "product__batch",
+            "quantity",
+            "supplier_id",
+            "user_id",
+            "description",
+        ]
+        for rows in SaleExportService.iter_chunks(queryset, fields, chunk_size):
+            for row in rows:
+                yield (row[0], row[1].isoformat()) + row[2:]
+
+    @staticmethod
+    def iter_csv(queryset, chunk_size=SALES_EXPORT_CHUNK_SIZE):
+        """Gera o CSV de movimentações linha a linha"""
+        return csv_lines(
+            SALES_CSV_COLUMNS, SaleExportService.get_rows(queryset, chunk_size)
+        )
+
+    @staticmethod
+    def write_parquet(queryset, output, row_group_size=SALES_PARQUET_ROW_GROUP_SIZE):
+        """
+        Grava as movimentações, com as dimensões de produto, categoria e
+        fornecedor, em formato Parquet (colunar).
+
+        Cada bloco lido do banco vira um row group: a memória depende do
+        tamanho do row group, não da quantidade de movimentações. As colunas
+        são tipadas (timestamp, date32, decimal128) e os nomes repetidos
+        (tipo, categoria, fornecedor) são gravados com dicionário.
+
+        Args:
+            queryset: Movimentações já filtradas
+            output: Caminho ou arquivo binário de destino
+            row_group_size: Quantidade de linhas por row group
+
+        Returns:
+            int: Quantidade de movimentações exportadas
+        """
+        fields = [field for field, _ in SALES_PARQUET_COLUMNS]
+        schema = pa.schema([column for _, column in SALES_PARQUET_COLUMNS])
+
+        count = 0
+        with pq.ParquetWriter(output, schema) as writer:
+            for rows in SaleExportService.iter_chunks(queryset, fields, row_group_size):
+                columns = [
+                    pa.array(values, type=column.type)
+                    for values, (_, column) in zip(zip(*rows), SALES_PARQUET_COLUMNS)
+                ]
+                writer.write_table(
+                    pa.Table.from_arrays(columns, schema=schema),
+                    row_group_size=row_group_size,
+                )
+                count += len(rows)
+        return count
+
+    @staticmethod
+    def export_parquet(queryset, row_group_size=SALES_PARQUET_ROW_GROUP_SIZE):
+        """
+        Gera o arquivo Parquet em um arquivo temporário, pronto para ser
+        enviado em partes (FileResponse).
+
+        Returns:
+            file: Arquivo temporário posicionado no início
+        """
+        output = tempfile.TemporaryFile()
+        try:
+            SaleExportService.write_parquet(queryset, output, row_group_size)
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+        return output
@@ -1,10 +1,33 @@
 from django import forms
 from django.utils import timezone
 
+from in_stock.app.products.autocomplete import (
+    AutocompleteModelChoiceField,
+    for_user,
+)
+from in_stock.app.products.models import Product
+from in_stock.app.suppliers.models import Supplier
+
 from .models import Sale
 
 
 class SaleForm(forms.ModelForm):
+    product = AutocompleteModelChoiceField(
+        queryset=Product.objects.all(),
+        url_name="product-autocomplete",
+        placeholder="Busque um produto pelo nome",
+        error_messages={
+            "required": "É necessário informar o produto.",
+            "invalid_choice": "Produto não encontrado.",
+        },
+    )
+    supplier = AutocompleteModelChoiceField(
+        queryset=Supplier.objects.all(),
+        url_name="supplier-autocomplete",
+        placeholder="Busque um fornecedor pelo nome ou CNPJ",
+        required=False,
+        error_messages={"invalid_choice": "Fornecedor não encontrado."},
+    )
 
     class Meta:
         model = Sale
@@ -22,10 +45,13 @@ class SaleForm(forms.ModelForm):
             },
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["date"].initial = timezone.now()
         self.fields["supplier"].required = False
+        # Produtos e fornecedores apenas da empresa do usuário
+        self.fields["product"].queryset = for_user(Product.objects.all(), user)
+        self.fields["supplier"].queryset = for_user(Supplier.objects.all(), user)
 
     def clean_quantity(self):
         quantity = self.cleaned_data.get("quantity")
@@ -0,0 +1,228 @@
+"""
+Serviço de Histórico de Estoque - Reconstrói o estoque em uma data passada
+"""
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.utils import timezone
+
+from in_stock.app.products.models import Product
+from in_stock.app.sales.models import Sale, StockCheckpoint
+
+
+def _signed_quantity():
+    """Quantidade da movimentação com sinal (+ entrada, - saída)"""
+    return Case(
+        When(type="entry", then=F("quantity")),
+        When(type="exits", then=F("quantity") * Value(-1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+class StockHistoryService:
+    """
+    Responde "qual era o estoque do produto X na data D".
+
+    A quantidade é reconstruída a partir do checkpoint mais próximo anterior
+    à data, somando as movimentações registradas depois dele. Quando o
+    produto ainda não tem checkpoint anterior à data, a quantidade atual do
+    produto funciona como checkpoint e as movimentações posteriores à data
+    são desfeitas. As movimentações são ordenadas por created_at, que é o
+    instante em que a quantidade do produto foi de fato alterada.
+
+    Alterações manuais de quantidade (edição do produto, sem movimentação)
+    só são refletidas a partir do próximo checkpoint.
+    """
+
+    @staticmethod
+    def _scoped_products(company=None, category=None, product=None):
+        products = Product.objects.all()
+        if company:
+            products = products.filter(company=company)
+        if category:
+            products = products.filter(category=category)
+        if product:
+            products = products.filter(pk=product.pk)
+        return products
+
+    @staticmethod
+    def build_checkpoints(company_id=None, taken_at=None):
+        """
+        Grava checkpoints com a quantidade atual dos produtos da empresa.
+
+        Produtos sem movimentações desde o último checkpoint são ignorados:
+        o checkpoint anterior continua exato e não há movimentações a
+        reaplicar a partir dele.
+
+        Os produtos são bloqueados (select_for_update) na leitura das
+        quantidades e o instante do checkpoint é tomado logo depois, ainda
+        com os bloqueios: as movimentações já gravadas ficam antes do
+        checkpoint e as seguintes esperam o fim da transação, ficando
+        depois dele. Nenhuma movimentação é contada duas vezes.
+
+        Args:
+            company_id: Empresa dos produtos. Quando None, processa os
+                produtos sem empresa.
+            taken_at: Instante do checkpoint (padrão: o momento da leitura).
+                Informar um instante só é seguro sem movimentações
+                simultâneas (ex.: testes)
+
+        Returns:
+            int: Quantidade de checkpoints criados
+        """
+        last_checkpoint = (
+            StockCheckpoint.objects.filter(
+                product=OuterRef("pk"), taken_at__lte=taken_at or timezone.now()
+            )
+            .order_by("-taken_at")
+            .values("taken_at")[:1]
+        )
+
+        with transaction.atomic():
+            products = (
+                Product.objects.select_for_update()
+                .filter(company_id=company_id)
+                .annotate(last_checkpoint=Subquery(last_checkpoint))
+                .filter(
+                    Q(last_checkpoint__isnull=True)
+                    | Exists(
+                        Sale.objects.filter(
+                            product=OuterRef("pk"),
+                            created_at__gt=OuterRef("last_checkpoint"),
+                        )
+                    )
+                )
+                .values_list("pk", "quantity")
+            )
+            rows = list(products)
+            # Instante tomado depois da leitura, com os produtos bloqueados
+            taken_at = taken_at or timezone.now()
+            checkpoints = [
+                StockCheckpoint(
+                    product_id=product_id,
+                    company_id=company_id,
+                    taken_at=taken_at,
+                    quantity=quantity,
+                )
+                for product_id, quantity in rows
+            ]
+            StockCheckpoint.objects.bulk_create(
+                checkpoints, batch_size=500, ignore_conflicts=True
+            )
+        return len(checkpoints)
+
+    @staticmethod
+    def get_stock_at(at, company=None, category=None, product=None):
+        """
+        Retorna o estoque de cada produto no instante informado.
+
+        Usa duas queries, independente da quantidade de produtos e de
+        movimentações: uma para os produtos com o checkpoint mais próximo e
+        outra agrupada por produto com as movimentações a aplicar.
+
+        A segunda query lê apenas as movimentações da empresa criadas depois
+        do checkpoint mais antigo usado (índice company, created_at) e as
+        agrupa por produto e por intervalo entre os instantes dos
+        checkpoints (os checkpoints de uma mesma execução de
+        build_checkpoints têm o mesmo instante). Cada produto soma apenas os
+        intervalos posteriores ao próprio checkpoint, sem subquery por
+        movimentação.
+
+        Args:
+            at: Data/hora da consulta
+            company: Filtra pela empresa
+            category: Filtra pela categoria
+            product: Consulta apenas um produto
+
+        Returns:
+            dict: {product_id: quantidade} apenas para os produtos que já
+                existiam na data
+        """
+        checkpoints = StockCheckpoint.objects.filter(
+            product=OuterRef("pk"), taken_at__lte=at
+        ).order_by("-taken_at")
+        products = (
+            StockHistoryService._scoped_products(company, category, product)
+            .filter(created_at__lte=at)
+            .annotate(
+                checkpoint_at=Subquery(checkpoints.values("taken_at")[:1]),
+                checkpoint_quantity=Subquery(checkpoints.values("quantity")[:1]),
+            )
+            .order_by()
+            .values_list("pk", "quantity", "checkpoint_at", "checkpoint_quantity")
+        )
+
+        stock = {}
+        checkpoint_times = {}
+        for product_id, quantity, checkpoint_at, checkpoint_quantity in products:
+            # Sem checkpoint anterior: parte da quantidade atual
+            stock[product_id] = (
+                quantity if checkpoint_at is None else checkpoint_quantity
+            )
+            checkpoint_times[product_id] = checkpoint_at
+        if not stock:
+            return stock
+
+        # Intervalos: o de índice i vai de bounds[i - 1] (exclusive) a
+        # bounds[i]; o último termina na data consultada e o seguinte tem as
+        # movimentações posteriores a ela
+        bounds = sorted({at, *filter(None, checkpoint_times.values())})
+        positions = {bound: index for index, bound in enumerate(bounds)}
+        at_index = positions[at]
+        interval = Case(
+            *(
+                When(created_at__lte=bound, then=Value(index))
+                for index, bound in enumerate(bounds)
+            ),
+            default=Value(len(bounds)),
+            output_field=IntegerField(),
+        )
+
+        sales = Sale.objects.filter(created_at__gt=bounds[0])
+        if company:
+            sales = sales.filter(company=company)
+        if category:
+            sales = sales.filter(product__category=category)
+        if product:
+            sales = sales.filter(product=product)
+        rows = (
+            sales.annotate(interval=interval)
+            .values_list("product_id", "interval")
+            .order_by()
+            .annotate(total=Sum(_signed_quantity()))
+        )
+
+        for product_id, index, total in rows:
+            if product_id not in stock:
+                continue
+            checkpoint_at = checkpoint_times[product_id]
+            if checkpoint_at is None:
+                # Sem checkpoint: desfaz as movimentações posteriores à data
+                if index > at_index:
+                    stock[product_id] -= total
+            elif positions[checkpoint_at] < index <= at_index:
+                # Com checkpoint: aplica as movimentações entre ele e a data
+                stock[product_id] += total
+        return stock
+
+    @staticmethod
+    def get_product_stock_at(product, at):
+        """Retorna o estoque de um produto no instante informado"""
+        return StockHistoryService.get_stock_at(at, product=product).get(product.pk, 0)
+
+    @staticmethod
+    def get_total_stock_at(at, company=None, category=None):
+        """Retorna o total de unidades (empresa ou categoria) no instante"""
+        return sum(StockHistoryService.get_stock_at(at, company, category).values())
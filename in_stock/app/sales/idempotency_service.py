@@ -0,0 +1,123 @@
+"""
+Serviço de Idempotência - Evita movimentações duplicadas em reenvios
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from in_stock.app.sales.models import IdempotencyKey
+
+# Cabeçalho HTTP e campo de formulário aceitos para a chave
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_FIELD = "idempotency_key"
+
+
+class IdempotencyService:
+    """
+    Executa uma ação no máximo uma vez por chave de idempotência.
+
+    A chave é gravada na mesma transação da movimentação, protegida por uma
+    restrição única (usuário, escopo, chave). Reenvios simultâneos esperam
+    apenas pelo índice da própria chave e recebem o resultado gravado; não
+    há linha ou contador compartilhado entre requisições diferentes.
+
+    Apenas resultados de sucesso são gravados: se a ação falhar, a chave é
+    desfeita junto com a transação e o cliente pode reenviar a requisição.
+    """
+
+    @staticmethod
+    def get_key(request):
+        """
+        Lê a chave do cabeçalho Idempotency-Key ou do campo idempotency_key.
+
+        Raises:
+            ValueError: Se a chave for maior que o tamanho permitido
+        """
+        key = request.headers.get(IDEMPOTENCY_HEADER) or request.POST.get(
+            IDEMPOTENCY_FIELD
+        )
+        key = (key or "").strip()
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            raise ValueError("Chave de idempotência muito longa.")
+        return key or None
+
+    @staticmethod
+    def _find(user, scope, key):
+        return IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+
+    @staticmethod
+    def run(user, scope, key, action):
+        """
+        Executa a ação ou devolve o resultado já gravado para a chave.
+
+        Args:
+            user: Usuário que enviou a requisição
+            scope: Nome da operação (ex.: "sale-create")
+            key: Chave enviada pelo cliente
+            action: Função sem argumentos que retorna (status_code, dict)
+
+        Returns:
+            tuple: (status_code, dict, replayed)
+        """
+        now = timezone.now()
+
+        # Caminho rápido para reenvios: apenas leitura, sem bloqueios
+        record = IdempotencyService._find(user, scope, key)
+        if record is not None:
+            if record.expires_at > now:
+                return record.status_code, record.response, True
+            record.delete()
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=user,
+                        scope=scope,
+                        key=key,
+                        expires_at=now
+                        + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    )
+            except IntegrityError:
+                # Outra requisição com a mesma chave foi concluída primeiro
+                record = None
+
+            if record is not None:
+                status_code, response = action()
+                if status_code >= 400:
+                    transaction.set_rollback(True)
+                else:
+                    record.status_code = status_code
+                    record.response = response
+                    record.save(update_fields=["status_code", "response"])
+                return status_code, response, False
+
+        record = IdempotencyService._find(user, scope, key)
+        if record is None:
+            # A requisição concorrente falhou e desfez a chave
+            return IdempotencyService.run(user, scope, key, action)
+        return record.status_code, record.response, True
+
+    @staticmethod
+    def clear_expired(batch_size=1000):
+        """
+        Remove as chaves expiradas em lotes pequenos, para não manter
+        bloqueios longos na tabela.
+
+        Returns:
+            int: Quantidade de chaves removidas
+        """
+        now = timezone.now()
+        removed = 0
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now).values_list(
+                    "pk", flat=True
+                )[:batch_size]
+            )
+            if not ids:
+                return removed
+            removed += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from in_stock.app.sales.history_service import StockHistoryService
+from in_stock.app.users.models import Company
+
+
+def _build(company_id):
+    """Cria os checkpoints de uma empresa em uma conexão própria da thread"""
+    try:
+        return StockHistoryService.build_checkpoints(company_id)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava checkpoints da quantidade em estoque dos produtos, usados para "
+        "consultar o estoque em datas passadas. Deve ser executado "
+        "periodicamente (ex.: diariamente via cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--company",
+            action="append",
+            dest="companies",
+            help="ID da empresa (pode ser repetido). Padrão: todas as empresas",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Quantidade de empresas processadas em paralelo (padrão: 4)",
+        )
+
+    def handle(self, *args, **options):
+        companies = Company.objects.all()
+        if options["companies"]:
+            companies = companies.filter(pk__in=options["companies"])
+        company_ids = list(companies.values_list("pk", flat=True))
+        if not options["companies"]:
+            # Produtos sem empresa também recebem checkpoints
+            company_ids.append(None)
+
+        # O instante de cada checkpoint é tomado na transação de cada empresa,
+        # no momento da leitura das quantidades (ver build_checkpoints)
+        workers = max(1, options["workers"])
+
+        if workers == 1:
+            results = {
+                company_id: StockHistoryService.build_checkpoints(company_id)
+                for company_id in company_ids
+            }
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(_build, company_id): company_id
+                    for company_id in company_ids
+                }
+                results = {
+                    futures[future]: future.result() for future in as_completed(futures)
+                }
+
+        for company_id, created in results.items():
+            if created and options["verbosity"] > 1:
+                self.stdout.write(f"{company_id or '-'}: {created} checkpoint(s)")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{sum(results.values())} checkpoint(s) criado(s) para "
+                f"{len(company_ids)} empresa(s)."
+            )
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from in_stock.app.sales.idempotency_service import IdempotencyService
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove as chaves de idempotência de movimentações já expiradas "
+        "(IDEMPOTENCY_KEY_TTL). Deve ser executado periodicamente"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Quantidade de chaves removidas por DELETE (padrão: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        removed = IdempotencyService.clear_expired(max(1, options["batch_size"]))
+        self.stdout.write(
+            self.style.SUCCESS(f"{removed} chave(s) de idempotência removida(s).")
+        )
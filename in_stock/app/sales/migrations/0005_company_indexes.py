@@ -0,0 +1,31 @@
+# Generated by Django 4.2.25 on 2026-10-17 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0004_sale_company"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(
+                fields=["company", "created_at", "id"], name="sale_company_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(
+                fields=["company", "date"], name="sale_company_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(
+                fields=["company", "type", "date"], name="sale_company_type_idx"
+            ),
+        ),
+    ]
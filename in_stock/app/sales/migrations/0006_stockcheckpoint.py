@@ -0,0 +1,61 @@
+# Generated by Django 4.2.25 on 2026-10-17 20:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_company_indexes"),
+        ("users", "0011_companystats"),
+        ("sales", "0005_company_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("taken_at", models.DateTimeField(verbose_name="Data do checkpoint")),
+                ("quantity", models.IntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "company",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_checkpoints",
+                        to="users.company",
+                        verbose_name="Empresa",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_checkpoints",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-taken_at"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="stockcheckpoint",
+            constraint=models.UniqueConstraint(
+                fields=("product", "taken_at"), name="unique_product_checkpoint"
+            ),
+        ),
+    ]
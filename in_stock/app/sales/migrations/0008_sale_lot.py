@@ -0,0 +1,27 @@
+# Generated by Django 4.2.25 on 2026-10-17 21:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_lot"),
+        ("sales", "0007_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sale",
+            name="lot",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="sales",
+                to="products.lot",
+                verbose_name="Lote",
+            ),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 
@@ -30,6 +30,15 @@ class Sale(models.Model):
         blank=True,
         verbose_name="Empresa",
     )
+    # Lote movimentado, quando a saída foi alocada por lote (FEFO)
+    lot = models.ForeignKey(
+        "products.Lot",
+        on_delete=models.SET_NULL,
+        related_name="sales",
+        null=True,
+        blank=True,
+        verbose_name="Lote",
+    )
     date = models.DateTimeField(default=timezone.now)
     TIPO = [("entry", "Entrada"), ("exits", "Saída")]
     type = models.CharField(max_length=5, choices=TIPO)
@@ -38,7 +47,99 @@ class Sale(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Índices iniciados pela empresa (multi-tenant): histórico paginado
+        # por (created_at, id), métricas por período e contagens por tipo
+        indexes = [
+            models.Index(
+                fields=["company", "created_at", "id"],
+                name="sale_company_created_idx",
+            ),
+            models.Index(fields=["company", "date"], name="sale_company_date_idx"),
+            models.Index(
+                fields=["company", "type", "date"], name="sale_company_type_idx"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Grava a movimentação e os contadores de CompanyStats na mesma transação"""
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         if self.description:
             return f"{self.get_type_display()} - {self.description} ({self.created_at.strftime('%d/%m/%Y')})"
         return f"{self.get_type_display()} - {self.product.name} ({self.created_at.strftime('%d/%m/%Y')})"
+
+
+class StockCheckpoint(models.Model):
+    """
+    Quantidade em estoque de um produto em um instante (checkpoint).
+
+    Usado para reconstruir o estoque em uma data passada sem reprocessar
+    todas as movimentações: parte-se do checkpoint mais próximo e aplicam-se
+    apenas as movimentações posteriores a ele.
+    """
+
+    product = models.ForeignKey(
+        "products.Product",
+        on_delete=models.CASCADE,
+        related_name="stock_checkpoints",
+    )
+    company = models.ForeignKey(
+        "users.Company",
+        on_delete=models.CASCADE,
+        related_name="stock_checkpoints",
+        null=True,
+        blank=True,
+        verbose_name="Empresa",
+    )
+    taken_at = models.DateTimeField(verbose_name="Data do checkpoint")
+    quantity = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-taken_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "taken_at"], name="unique_product_checkpoint"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product} - {self.quantity} ({self.taken_at.strftime('%d/%m/%Y %H:%M')})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Resultado de uma requisição de movimentação identificada por uma chave
+    enviada pelo cliente (Idempotency-Key).
+
+    Reenvios com a mesma chave devolvem o resultado gravado em vez de
+    registrar a movimentação novamente.
+    """
+
+    key = models.CharField(max_length=100)
+    scope = models.CharField(max_length=50)
+    user = models.ForeignKey(
+        "users.CustomUser",
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    status_code = models.PositiveSmallIntegerField(default=0)
+    response = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "scope", "key"], name="unique_idempotency_key"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotency_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}: {self.key}"
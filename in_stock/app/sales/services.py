@@ -1,10 +1,37 @@
+import binascii
+import hashlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, time, timedelta
+
 from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DateField, F, Q
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
 
-from in_stock.app.products.models import Product
+from in_stock.app.products.autocomplete import for_user
+from in_stock.app.products.category_stats_service import CategoryStatsService
+from in_stock.app.products.lot_service import LotService
+from in_stock.app.products.models import Lot, Product
 from in_stock.app.suppliers.models import Supplier
+from in_stock.app.users.stats_service import CompanyStatsService
 
 from .models import Sale
 
+# Funções de truncamento usadas para agrupar as movimentações por período
+SERIES_TRUNC = {
+    "day": TruncDate,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+
+# Quantidade de movimentações por página no histórico
+SALES_PAGE_SIZE = 50
+
+# Tempo (em segundos) que a contagem de movimentações filtradas fica em cache
+SALES_COUNT_CACHE_TIMEOUT = 60
+
 
 class SaleService:
 
@@ -17,7 +44,100 @@ class SaleService:
         return (
             Sale.objects.filter(company=company)
             .select_related("product", "user")
-            .order_by("-created_at")
+            .order_by("-created_at", "-id")
+        )
+
+    @staticmethod
+    def encode_cursor(sale):
+        """Gera o cursor (created_at, id) de uma movimentação"""
+        raw = f"{sale.created_at.isoformat()}|{sale.pk}"
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Lê um cursor gerado por encode_cursor (None se for inválido)"""
+        try:
+            created_at, pk = urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return datetime.fromisoformat(created_at), int(pk)
+        except (ValueError, UnicodeError, binascii.Error):
+            return None
+
+    @staticmethod
+    def paginate(queryset, after=None, before=None, page_size=SALES_PAGE_SIZE):
+        """
+        Pagina as movimentações por cursor (keyset) em (created_at, id).
+
+        Em vez de OFFSET, cada página continua a partir da última linha da
+        anterior, então qualquer página custa o mesmo que a primeira.
+
+        Args:
+            queryset: Movimentações (ordenadas de forma decrescente)
+            after: Cursor da última linha vista (próxima página)
+            before: Cursor da primeira linha vista (página anterior)
+            page_size: Quantidade de linhas por página
+
+        Returns:
+            dict: sales, next_cursor e previous_cursor (None quando não há)
+        """
+        queryset = queryset.order_by("-created_at", "-id")
+        after = SaleService.decode_cursor(after) if after else None
+        before = SaleService.decode_cursor(before) if before else None
+
+        if before:
+            created_at, pk = before
+            rows = list(
+                queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                ).order_by("created_at", "id")[: page_size + 1]
+            )
+            has_previous = len(rows) > page_size
+            sales = rows[:page_size][::-1]
+            has_next = True
+        else:
+            if after:
+                created_at, pk = after
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+            rows = list(queryset[: page_size + 1])
+            has_next = len(rows) > page_size
+            sales = rows[:page_size]
+            has_previous = after is not None
+
+        return {
+            "sales": sales,
+            "next_cursor": (
+                SaleService.encode_cursor(sales[-1]) if sales and has_next else None
+            ),
+            "previous_cursor": (
+                SaleService.encode_cursor(sales[0]) if sales and has_previous else None
+            ),
+        }
+
+    @staticmethod
+    def count_movements(queryset, company=None, type_filter="", product_filter=""):
+        """
+        Retorna o total de movimentações para o cabeçalho da listagem.
+
+        Sem filtro de produto, o total da empresa vem de CompanyStats (O(1)).
+        Nos demais casos, a contagem fica em cache por
+        SALES_COUNT_CACHE_TIMEOUT segundos.
+        """
+        if company and not product_filter and type_filter in ("", "entry", "exits"):
+            stats = CompanyStatsService.get_stats(company)
+            if type_filter == "entry":
+                return stats["total_entries"]
+            if type_filter == "exits":
+                return stats["total_exits"]
+            return stats["total_entries"] + stats["total_exits"]
+
+        company_id = company.pk if company else "all"
+        filters = hashlib.md5(
+            f"{type_filter}|{product_filter.lower()}".encode()
+        ).hexdigest()
+        key = f"sales:count:{company_id}:{filters}"
+        return cache.get_or_set(
+            key, lambda: queryset.count(), SALES_COUNT_CACHE_TIMEOUT
         )
 
     @staticmethod
@@ -33,29 +153,278 @@ class SaleService:
             )
             return None
 
-        sale = Sale()
-        sale.product = product
-        sale.user = request.user
-        sale.company = request.user.company_obj
-
+        supplier = None
         supplier_id = request.POST.get("supplier")
         if supplier_id:
+            supplier = Supplier.objects.filter(pk=supplier_id).first()
+
+        try:
+            if type_sale == "exits" and request.POST.get("fefo"):
+                # Saída distribuída entre os lotes do produto, do que vence
+                # primeiro ao que vence por último
+                from in_stock.app.sales.allocation_service import (
+                    FefoAllocationService,
+                )
+
+                return FefoAllocationService.allocate_exit(
+                    product,
+                    quantity,
+                    user=request.user,
+                    company=product.company,
+                    supplier=supplier,
+                    description=request.POST.get("description") or None,
+                )[0]
+
+            return SaleService.record_movement(
+                product,
+                type_sale,
+                quantity,
+                user=request.user,
+                company=product.company,
+                supplier=supplier,
+                description=request.POST.get("description") or None,
+            )
+        except ValueError as e:
+            messages.error(request, str(e))
+            return None
+
+    @staticmethod
+    def record_movement(
+        product: Product,
+        type_sale: str,
+        quantity: int,
+        user,
+        company=None,
+        supplier=None,
+        description=None,
+    ):
+        """
+        Registra uma movimentação e atualiza o estoque de forma atômica.
+
+        A quantidade do produto é alterada com um UPDATE condicional (F()),
+        então movimentações simultâneas do mesmo produto nunca perdem
+        atualizações e uma saída nunca deixa o estoque negativo. A
+        movimentação e a alteração do estoque fazem parte da mesma transação.
+
+        Raises:
+            ValueError: Se o tipo for inválido ou não houver estoque suficiente
+        """
+        with transaction.atomic():
+            SaleService.update_product_quantity(product, type_sale, quantity)
+
+            return Sale.objects.create(
+                product=product,
+                user=user,
+                company=company,
+                supplier=supplier,
+                type=type_sale,
+                quantity=quantity,
+                description=description,
+            )
+
+    @staticmethod
+    def record_bulk_movements(lines, user):
+        """
+        Registra várias movimentações (ex.: recebimento de mercadorias) de uma vez.
+
+        Todas as linhas são validadas antes de qualquer escrita. Em seguida,
+        dentro de uma única transação, os produtos são bloqueados
+        (select_for_update), as quantidades são aplicadas com um bulk_update e
+        as movimentações são criadas com bulk_create. O número de queries não
+        depende da quantidade de linhas.
+
+        Args:
+            lines: Lista de dicts com "product", "type", "quantity" e,
+                opcionalmente, "lot" (ID do lote movimentado; sem ele, a
+                variação é distribuída entre os lotes do produto), "supplier"
+                e "description"
+            user: Usuário que registra as movimentações. Produtos, lotes e
+                fornecedores são restritos à empresa dele (ver for_user):
+                Admin InStock movimenta qualquer empresa e usuário sem
+                empresa não movimenta nenhum produto
+
+        Returns:
+            tuple: (lista de Sale criadas, lista de erros). Quando há erros,
+                nada é gravado e a lista de Sale é vazia.
+        """
+        errors = []
+        parsed = []
+        for number, line in enumerate(lines, start=1):
+            line_errors = []
+            type_sale = (line.get("type") or "").strip()
+            if type_sale not in dict(Sale.TIPO):
+                line_errors.append("Tipo deve ser 'entry' ou 'exits'.")
             try:
-                sale.supplier = Supplier.objects.get(pk=supplier_id)
-            except Supplier.DoesNotExist:
-                sale.supplier = None
-        else:
-            sale.supplier = None
+                quantity = int(line.get("quantity"))
+                if quantity <= 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                quantity = None
+                line_errors.append("A quantidade deve ser um inteiro maior que zero.")
+            try:
+                product_id = int(line.get("product"))
+            except (TypeError, ValueError):
+                product_id = None
+                line_errors.append("É necessário informar o ID do produto.")
+            supplier_id = line.get("supplier") or None
+            try:
+                supplier_id = int(supplier_id) if supplier_id else None
+            except (TypeError, ValueError):
+                line_errors.append("ID de fornecedor inválido.")
+            lot_id = line.get("lot") or None
+            try:
+                lot_id = int(lot_id) if lot_id else None
+            except (TypeError, ValueError):
+                line_errors.append("ID de lote inválido.")
 
-        sale.type = type_sale
-        sale.quantity = quantity
-        sale.description = request.POST.get("description") or None
+            if line_errors:
+                errors.append({"line": number, "errors": line_errors})
+            parsed.append(
+                (number, product_id, type_sale, quantity, supplier_id, lot_id, line)
+            )
 
-        sale.save()
+        if errors:
+            return [], errors
 
-        SaleService.update_product_quantity(product, type_sale, quantity)
+        with transaction.atomic():
+            products = for_user(
+                Product.objects.select_for_update().filter(
+                    pk__in={item[1] for item in parsed}
+                ),
+                user,
+            ).in_bulk()
+            suppliers = for_user(
+                Supplier.objects.filter(pk__in={item[4] for item in parsed if item[4]}),
+                user,
+            ).in_bulk()
+            lot_ids = {item[5] for item in parsed if item[5]}
+            lot_products = (
+                dict(
+                    Lot.objects.filter(
+                        pk__in=lot_ids, product_id__in=products
+                    ).values_list("pk", "product_id")
+                )
+                if lot_ids
+                else {}
+            )
 
-        return sale
+            sales = []
+            totals = {}
+            product_deltas = {}
+            lot_deltas = {}
+            for (
+                number,
+                product_id,
+                type_sale,
+                quantity,
+                supplier_id,
+                lot_id,
+                line,
+            ) in parsed:
+                product = products.get(product_id)
+                if product is None:
+                    errors.append(
+                        {
+                            "line": number,
+                            "errors": [f"Produto {product_id} não encontrado."],
+                        }
+                    )
+                    continue
+                if supplier_id and supplier_id not in suppliers:
+                    errors.append(
+                        {
+                            "line": number,
+                            "errors": [f"Fornecedor {supplier_id} não encontrado."],
+                        }
+                    )
+                    continue
+                if lot_id and lot_products.get(lot_id) != product_id:
+                    errors.append(
+                        {
+                            "line": number,
+                            "errors": [f"Lote {lot_id} não encontrado no produto."],
+                        }
+                    )
+                    continue
+
+                delta = quantity if type_sale == "entry" else -quantity
+                if product.quantity + delta < 0:
+                    errors.append(
+                        {
+                            "line": number,
+                            "errors": [
+                                f"Estoque insuficiente para {product.name}: "
+                                f"disponível {product.quantity}, saída {quantity}."
+                            ],
+                        }
+                    )
+                    continue
+
+                product.quantity += delta
+                if lot_id:
+                    lot_deltas[lot_id] = lot_deltas.get(lot_id, 0) + delta
+                else:
+                    product_deltas[product_id] = (
+                        product_deltas.get(product_id, 0) + delta
+                    )
+                company_totals = totals.setdefault(
+                    product.company_id,
+                    {
+                        "total_stock": 0,
+                        "stock_value": 0,
+                        "total_entries": 0,
+                        "total_exits": 0,
+                    },
+                )
+                company_totals["total_stock"] += delta
+                company_totals["stock_value"] += CompanyStatsService.stock_value(
+                    delta, product.price
+                )
+                if type_sale == "entry":
+                    company_totals["total_entries"] += 1
+                else:
+                    company_totals["total_exits"] += 1
+
+                sales.append(
+                    Sale(
+                        product=product,
+                        lot_id=lot_id,
+                        user=user,
+                        # A empresa do produto, também quando o Admin InStock
+                        # (sem empresa) registra a movimentação
+                        company_id=product.company_id,
+                        supplier=suppliers.get(supplier_id),
+                        type=type_sale,
+                        quantity=quantity,
+                        description=line.get("description") or None,
+                    )
+                )
+
+            if errors:
+                return [], errors
+
+            now = timezone.now()
+            changed = list({sale.product_id: sale.product for sale in sales}.values())
+            for product in changed:
+                product.status = product.get_status()
+                product.updated_at = now
+            Product.objects.bulk_update(
+                changed, ["quantity", "status", "updated_at"], batch_size=500
+            )
+            LotService.apply_deltas(product_deltas, lot_deltas)
+            Sale.objects.bulk_create(sales, batch_size=500)
+
+            # bulk_create/bulk_update não disparam sinais
+            for company_id, deltas in totals.items():
+                CompanyStatsService.apply_delta(company_id, **deltas)
+
+        from in_stock.app.pages.services import DashboardService
+
+        for company_id in totals:
+            DashboardService.invalidate(company_id)
+            CategoryStatsService.invalidate(company_id)
+
+        return sales, []
 
     @staticmethod
     def create_sale_entry_standard(request, product: Product):
@@ -75,25 +444,72 @@ class SaleService:
 
     @staticmethod
     def update_product_quantity(product: Product, type_sale: str, quantity: int):
-        try:
-            if type_sale == "exits":
-                product.quantity = max(product.quantity - quantity, 0)
-            else:
-                product.quantity = product.quantity + quantity
+        """
+        Altera a quantidade do produto no banco com um UPDATE condicional.
+
+        O status é recalculado no mesmo UPDATE, a variação é distribuída
+        entre os lotes do produto (ver LotService.apply_deltas) e `product` é
+        atualizado com os valores gravados.
 
-            product.save()
+        Raises:
+            ValueError: Se o tipo for inválido ou não houver estoque suficiente
+        """
+        if type_sale == "exits":
+            delta = -quantity
+            products = Product.objects.filter(pk=product.pk, quantity__gte=quantity)
+        elif type_sale == "entry":
+            delta = quantity
+            products = Product.objects.filter(pk=product.pk)
+        else:
+            raise ValueError(f"Tipo de movimentação inválido: {type_sale}")
 
-        except Exception as e:
-            print(f"Erro ao atualizar quantidade do produto: {str(e)}")
+        with transaction.atomic():
+            new_quantity = F("quantity") + delta
+            updated = products.update(
+                quantity=new_quantity,
+                status=Product.status_expression(quantity=new_quantity),
+                updated_at=timezone.now(),
+            )
+            if not updated:
+                raise ValueError(
+                    f"Estoque insuficiente para {product.name}: "
+                    f"saída de {quantity} unidade(s) não permitida."
+                )
+
+            # UPDATE não dispara sinais: atualiza os contadores da empresa
+            CompanyStatsService.apply_delta(
+                product.company_id,
+                total_stock=delta,
+                stock_value=CompanyStatsService.stock_value(delta, product.price),
+            )
+            LotService.apply_deltas({product.pk: delta})
+
+        CategoryStatsService.invalidate(product.company_id)
+        product.refresh_from_db(
+            fields=[
+                "quantity",
+                "initial_quantity",
+                "expiration_date",
+                "batch",
+                "status",
+                "updated_at",
+            ]
+        )
 
     @staticmethod
     def get_sales_statistics(company=None):
-        query = Sale.objects.all()
         if company:
-            query = query.filter(company=company)
-
-        total_entries = query.filter(type="entry").count()
-        total_exits = query.filter(type="exits").count()
+            # Contadores mantidos de forma incremental em CompanyStats
+            stats = CompanyStatsService.get_stats(company)
+            total_entries = stats["total_entries"]
+            total_exits = stats["total_exits"]
+        else:
+            totals = Sale.objects.aggregate(
+                entries=Count("id", filter=Q(type="entry")),
+                exits=Count("id", filter=Q(type="exits")),
+            )
+            total_entries = totals["entries"]
+            total_exits = totals["exits"]
 
         return {
             "total_entries": total_entries,
@@ -107,3 +523,78 @@ class SaleService:
         if company:
             query = query.filter(company=company)
         return query.select_related("product", "user").order_by("-created_at")
+
+    @staticmethod
+    def _series_bucket(day, period):
+        """Retorna o início do período (dia, semana ou mês) que contém a data"""
+        if period == "week":
+            return day - timedelta(days=day.weekday())
+        if period == "month":
+            return day.replace(day=1)
+        return day
+
+    @staticmethod
+    def _next_series_bucket(bucket, period):
+        """Retorna o início do período seguinte"""
+        if period == "week":
+            return bucket + timedelta(days=7)
+        if period == "month":
+            if bucket.month == 12:
+                return bucket.replace(year=bucket.year + 1, month=1)
+            return bucket.replace(month=bucket.month + 1)
+        return bucket + timedelta(days=1)
+
+    @staticmethod
+    def get_movement_series(start_date, end_date, period="day", company=None):
+        """
+        Retorna entradas e saídas agrupadas por período em uma única query.
+
+        Os períodos sem movimentação são preenchidos com zero em Python, então
+        o custo é o mesmo para 7, 30 ou 365 dias.
+
+        Args:
+            start_date: Data inicial (inclusiva)
+            end_date: Data final (inclusiva)
+            period: "day", "week" ou "month"
+            company: Empresa para filtrar (None considera todas)
+
+        Returns:
+            list: [{"date": date, "entries": int, "exits": int}, ...]
+        """
+        if period not in SERIES_TRUNC:
+            raise ValueError(f"Período inválido: {period}")
+
+        tz = timezone.get_current_timezone()
+        start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+        end = timezone.make_aware(
+            datetime.combine(end_date + timedelta(days=1), time.min), tz
+        )
+
+        query = Sale.objects.filter(date__gte=start, date__lt=end)
+        if company:
+            query = query.filter(company=company)
+
+        trunc = SERIES_TRUNC[period]("date", output_field=DateField())
+        rows = (
+            query.annotate(bucket=trunc)
+            .values("bucket", "type")
+            .annotate(total=Count("id"))
+            .order_by()
+        )
+
+        totals = {}
+        for row in rows:
+            totals[(row["bucket"], row["type"])] = row["total"]
+
+        series = []
+        bucket = SaleService._series_bucket(start_date, period)
+        while bucket <= end_date:
+            series.append(
+                {
+                    "date": bucket,
+                    "entries": totals.get((bucket, "entry"), 0),
+                    "exits": totals.get((bucket, "exits"), 0),
+                }
+            )
+            bucket = SaleService._next_series_bucket(bucket, period)
+        return series
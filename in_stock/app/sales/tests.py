@@ -1,12 +1,43 @@
-from datetime import date, timedelta
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.contrib.auth.models import Permission
+from django.contrib.messages.storage.session import SessionStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from pyarrow import parquet
 
-from in_stock.app.products.models import Category, Product
-from in_stock.app.sales.models import Sale
+from in_stock.app.products.lot_service import LotService
+from in_stock.app.products.models import Category, Lot, Product
+from in_stock.app.products.tests import QueryPlanAssertions
+from in_stock.app.sales.allocation_service import FefoAllocationService
+from in_stock.app.sales.export_service import SaleExportService
+from in_stock.app.sales.forms import SaleForm
+from in_stock.app.sales.history_service import StockHistoryService
+from in_stock.app.sales.idempotency_service import IdempotencyService
+from in_stock.app.sales.models import IdempotencyKey, Sale, StockCheckpoint
+from in_stock.app.sales.services import SaleService
+from in_stock.app.sales.views import (
+    SaleBulkCreateView,
+    SaleCreateView,
+    SaleCsvExportView,
+    SaleListView,
+    SaleParquetExportView,
+)
 from in_stock.app.suppliers.models import Supplier
+from in_stock.app.users.models import Company
+from in_stock.app.users.stats_service import CompanyStatsService
 
 User = get_user_model()
 
@@ -103,3 +134,1041 @@ class SaleModelTests(TestCase):
         """Testa se a data padrão é a data atual"""
         sale = Sale.objects.create(product=self.product, user=self.user, type="entry")
         self.assertIsNotNone(sale.date)
+
+
+class SaleMovementSeriesTests(TestCase):
+    """Testa a série temporal de entradas e saídas"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.category = Category.objects.create(name="Eletrônicos")
+        self.product = Product.objects.create(
+            name="Notebook",
+            category=self.category,
+            quantity=10,
+            price=2500.00,
+            expiration_date=date.today() + timedelta(days=365),
+        )
+        self.today = timezone.now()
+
+    def _create_sale(self, type_sale, days_ago):
+        return Sale.objects.create(
+            product=self.product,
+            user=self.user,
+            type=type_sale,
+            date=self.today - timedelta(days=days_ago),
+        )
+
+    def test_daily_series_fills_empty_days(self):
+        """Testa se os dias sem movimentação aparecem com zero"""
+        self._create_sale("entry", 0)
+        self._create_sale("entry", 0)
+        self._create_sale("exits", 2)
+
+        series = SaleService.get_movement_series(
+            (self.today - timedelta(days=6)).date(), self.today.date()
+        )
+
+        self.assertEqual(len(series), 7)
+        self.assertEqual(
+            series[-1], {"date": self.today.date(), "entries": 2, "exits": 0}
+        )
+        self.assertEqual(series[-3]["exits"], 1)
+        self.assertEqual(sum(p["entries"] + p["exits"] for p in series), 3)
+
+    def test_series_uses_single_query(self):
+        """Testa se a série usa uma única query independente do período"""
+        for days_ago in range(0, 365, 5):
+            self._create_sale("exits", days_ago)
+
+        with self.assertNumQueries(1):
+            series = SaleService.get_movement_series(
+                (self.today - timedelta(days=364)).date(), self.today.date()
+            )
+        self.assertEqual(len(series), 365)
+        self.assertEqual(sum(p["exits"] for p in series), 73)
+
+    def test_monthly_series(self):
+        """Testa o agrupamento mensal"""
+        self._create_sale("entry", 0)
+        self._create_sale("exits", 0)
+        start = (self.today.date().replace(day=1) - timedelta(days=1)).replace(day=1)
+
+        series = SaleService.get_movement_series(
+            start, self.today.date(), period="month"
+        )
+
+        self.assertEqual([p["date"] for p in series][0], start)
+        self.assertEqual(series[-1]["entries"], 1)
+        self.assertEqual(series[-1]["exits"], 1)
+
+    def test_weekly_series_starts_on_monday(self):
+        """Testa se as semanas começam na segunda-feira"""
+        series = SaleService.get_movement_series(
+            (self.today - timedelta(days=30)).date(), self.today.date(), "week"
+        )
+        self.assertTrue(all(p["date"].weekday() == 0 for p in series))
+
+    def test_invalid_period(self):
+        """Testa se um período inválido gera erro"""
+        with self.assertRaises(ValueError):
+            SaleService.get_movement_series(date.today(), date.today(), "year")
+
+
+class SaleMovementTests(TestCase):
+    """Testa o registro atômico de movimentações"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Eletrônicos")
+        self.product = Product.objects.create(
+            name="Notebook",
+            category=self.category,
+            quantity=10,
+            initial_quantity=10,
+            price=2500.00,
+            expiration_date=date.today() + timedelta(days=365),
+            company=self.company,
+        )
+
+    def test_exit_decrements_quantity_and_updates_status(self):
+        """Testa se a saída reduz o estoque e recalcula o status"""
+        sale = SaleService.record_movement(
+            self.product, "exits", 6, user=self.user, company=self.company
+        )
+
+        self.assertEqual(sale.quantity, 6)
+        self.assertEqual(self.product.quantity, 4)
+        self.assertEqual(self.product.status, "baixo")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 4)
+
+    def test_entry_increments_quantity(self):
+        """Testa se a entrada aumenta o estoque"""
+        SaleService.record_movement(
+            self.product, "entry", 5, user=self.user, company=self.company
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 15)
+        self.assertEqual(CompanyStatsService.get_stats(self.company)["total_stock"], 15)
+
+    def test_exit_above_stock_is_rejected(self):
+        """Testa se uma saída maior que o estoque é rejeitada sem efeitos"""
+        with self.assertRaises(ValueError):
+            SaleService.record_movement(
+                self.product, "exits", 11, user=self.user, company=self.company
+            )
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_form_movement_uses_product_company(self):
+        """Testa se a movimentação pelo formulário fica na empresa do produto"""
+        admin = User.objects.create_superuser(
+            email="admin@example.com", password="testpass123"
+        )
+        request = RequestFactory().post(
+            "/sales/create/",
+            {"product": self.product.pk, "type": "entry", "quantity": 2},
+        )
+        request.user = admin
+        request.session = {}
+        request._messages = SessionStorage(request)
+
+        sale = SaleService.create_sale_by_type(request, "entry")
+        self.assertEqual(sale.company, self.company)
+        self.assertEqual(
+            CompanyStatsService.get_stats(self.company)["total_entries"], 1
+        )
+
+
+class ConcurrentSaleMovementTests(TransactionTestCase):
+    """Testa saídas simultâneas no mesmo produto"""
+
+    def test_parallel_exits_never_lose_updates(self):
+        """Testa se saídas paralelas resultam na quantidade exata"""
+        user = User.objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        category = Category.objects.create(name="Eletrônicos")
+        product = Product.objects.create(
+            name="Notebook",
+            category=category,
+            quantity=30,
+            initial_quantity=30,
+            price=2500.00,
+            expiration_date=date.today() + timedelta(days=365),
+        )
+
+        def exit_one():
+            # O SQLite em memória bloqueia a tabela inteira durante a escrita;
+            # como cada tentativa é atômica, basta repetir (como um terminal)
+            try:
+                while True:
+                    try:
+                        SaleService.record_movement(
+                            Product.objects.get(pk=product.pk), "exits", 1, user=user
+                        )
+                        return True
+                    except ValueError:
+                        return False
+                    except OperationalError:
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: exit_one(), range(40)))
+
+        product.refresh_from_db()
+        self.assertEqual(results.count(True), 30)
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(Sale.objects.filter(type="exits").count(), 30)
+
+
+class SaleBulkMovementTests(TestCase):
+    """Testa o registro de movimentações em lote"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_superuser(
+            email="admin@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.products = [
+            Product.objects.create(
+                name=f"Produto {i}",
+                category=self.category,
+                quantity=10,
+                initial_quantity=10,
+                price=5,
+                expiration_date=date.today() + timedelta(days=365),
+                company=self.company,
+            )
+            for i in range(100)
+        ]
+
+    def _lines(self, count):
+        return [
+            {"product": product.pk, "type": "entry", "quantity": 5}
+            for product in self.products[:count]
+        ]
+
+    def test_bulk_movements_update_stock(self):
+        """Testa se as entradas e saídas em lote atualizam o estoque"""
+        lines = self._lines(2) + [
+            {"product": self.products[0].pk, "type": "exits", "quantity": 12}
+        ]
+
+        sales, errors = SaleService.record_bulk_movements(lines, self.user)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(sales), 3)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 3)
+        self.assertEqual(self.products[0].status, "baixo")
+        stats = CompanyStatsService.get_stats(self.company)
+        self.assertEqual(stats["total_stock"], 1000 - 2)
+        self.assertEqual(stats["total_entries"], 2)
+        self.assertEqual(stats["total_exits"], 1)
+
+    def test_bulk_movements_without_company_use_product_company(self):
+        """Testa se as movimentações do Admin InStock ficam na empresa do produto"""
+        admin = User.objects.create_superuser(
+            email="instock@example.com", password="testpass123"
+        )
+        sales, errors = SaleService.record_bulk_movements(self._lines(2), admin)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            set(
+                Sale.objects.filter(pk__in=[sale.pk for sale in sales]).values_list(
+                    "company", flat=True
+                )
+            ),
+            {self.company.pk},
+        )
+        self.assertEqual(
+            CompanyStatsService.get_stats(self.company)["total_entries"], 2
+        )
+
+    def test_bulk_movements_are_restricted_to_user_company(self):
+        """Testa se usuários sem empresa ou de outra empresa não movimentam o produto"""
+        other_company = Company.objects.create(name="Outra", cnpj="99888777000166")
+        member = User.objects.create_user(
+            email="member@example.com",
+            password="testpass123",
+            company_obj=other_company,
+        )
+        without_company = User.objects.create_user(
+            email="nocompany@example.com", password="testpass123"
+        )
+        lines = self._lines(2)
+
+        for user in (member, without_company):
+            sales, errors = SaleService.record_bulk_movements(lines, user)
+            self.assertEqual(sales, [])
+            self.assertEqual([error["line"] for error in errors], [1, 2])
+
+        without_company.user_permissions.add(
+            Permission.objects.get(codename="add_sale")
+        )
+        request = RequestFactory().post(
+            "/sales/bulk/",
+            data=json.dumps({"movements": lines}),
+            content_type="application/json",
+        )
+        request.user = User.objects.get(pk=without_company.pk)
+        response = SaleBulkCreateView.as_view()(request)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Sale.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 10)
+
+    def test_query_count_does_not_depend_on_lines(self):
+        """Testa se o número de queries é constante"""
+        # Até 80 linhas cabem em um único INSERT mesmo no limite de parâmetros
+        # do SQLite (999); no MySQL o lote padrão é de 500 linhas
+        CompanyStatsService.get_stats(self.company)
+
+        with CaptureQueriesContext(connection) as small:
+            SaleService.record_bulk_movements(self._lines(5), self.user)
+        with CaptureQueriesContext(connection) as large:
+            SaleService.record_bulk_movements(self._lines(80), self.user)
+
+        self.assertEqual(len(small), len(large))
+
+    def test_invalid_lines_write_nothing(self):
+        """Testa se uma linha inválida impede todo o lote"""
+        lines = self._lines(3) + [
+            {"product": self.products[3].pk, "type": "exits", "quantity": 50},
+            {"product": "", "type": "x", "quantity": 0},
+        ]
+
+        sales, errors = SaleService.record_bulk_movements(lines, self.user)
+
+        self.assertEqual(sales, [])
+        self.assertEqual([e["line"] for e in errors], [5])
+        self.assertEqual(len(errors[0]["errors"]), 3)
+        self.assertFalse(Sale.objects.exists())
+
+        lines = self._lines(3) + [
+            {"product": self.products[3].pk, "type": "exits", "quantity": 50}
+        ]
+        sales, errors = SaleService.record_bulk_movements(lines, self.user)
+        self.assertEqual([e["line"] for e in errors], [4])
+        self.assertFalse(Sale.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 10)
+
+    def test_bulk_endpoint_accepts_csv(self):
+        """Testa o envio de um CSV para o endpoint de lote"""
+        content = "product,type,quantity,description\n"
+        for product in self.products[:3]:
+            content += f"{product.pk},exits,2,Venda balcão\n"
+        upload = SimpleUploadedFile("movimentos.csv", content.encode("utf-8"))
+
+        request = RequestFactory().post("/sales/bulk/", {"file": upload})
+        request.user = self.user
+        response = SaleBulkCreateView.as_view()(request)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content), {"created": 3})
+        self.assertEqual(Sale.objects.filter(type="exits").count(), 3)
+
+    def test_bulk_endpoint_accepts_json(self):
+        """Testa o envio de JSON para o endpoint de lote"""
+        request = RequestFactory().post(
+            "/sales/bulk/",
+            data=json.dumps({"movements": self._lines(4)}),
+            content_type="application/json",
+        )
+        request.user = self.user
+        response = SaleBulkCreateView.as_view()(request)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Sale.objects.count(), 4)
+
+
+class SalePaginationTests(TestCase):
+    """Testa a paginação por cursor do histórico de movimentações"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_superuser(
+            email="admin@example.com", password="testpass123", company_obj=self.company
+        )
+        category = Category.objects.create(name="Alimentos", company=self.company)
+        self.product = Product.objects.create(
+            name="Arroz",
+            category=category,
+            quantity=10,
+            price=5,
+            expiration_date=date.today() + timedelta(days=365),
+            company=self.company,
+        )
+        Sale.objects.bulk_create(
+            [
+                Sale(
+                    product=self.product,
+                    user=self.user,
+                    company=self.company,
+                    type="entry" if i % 2 else "exits",
+                )
+                for i in range(25)
+            ]
+        )
+        # bulk_create não dispara os sinais de CompanyStats
+        CompanyStatsService.rebuild(self.company.pk)
+        # Metade das linhas com o mesmo created_at para testar o desempate por id
+        same_time = timezone.now()
+        Sale.objects.filter(id__in=Sale.objects.order_by("id")[:12]).update(
+            created_at=same_time
+        )
+        self.expected = list(
+            Sale.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+
+    def _walk(self, queryset, page_size):
+        ids, cursor = [], None
+        while True:
+            page = SaleService.paginate(queryset, after=cursor, page_size=page_size)
+            ids += [sale.id for sale in page["sales"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                return ids
+
+    def test_pages_cover_all_rows_in_order(self):
+        """Testa se as páginas percorrem todas as linhas sem repetir"""
+        ids = self._walk(SaleService.get_by_company(self.company), page_size=4)
+        self.assertEqual(ids, self.expected)
+
+    def test_previous_page(self):
+        """Testa a navegação para a página anterior"""
+        queryset = SaleService.get_by_company(self.company)
+        first = SaleService.paginate(queryset, page_size=10)
+        second = SaleService.paginate(
+            queryset, after=first["next_cursor"], page_size=10
+        )
+        back = SaleService.paginate(
+            queryset, before=second["previous_cursor"], page_size=10
+        )
+
+        self.assertEqual(back["sales"], first["sales"])
+        self.assertIsNone(back["previous_cursor"])
+        self.assertEqual(back["next_cursor"], first["next_cursor"])
+
+    def test_deep_page_costs_one_query(self):
+        """Testa se uma página distante custa uma única query"""
+        queryset = SaleService.get_by_company(self.company)
+        cursor = SaleService.encode_cursor(Sale.objects.get(id=self.expected[20]))
+        with self.assertNumQueries(1):
+            page = SaleService.paginate(queryset, after=cursor, page_size=3)
+        self.assertEqual([s.id for s in page["sales"]], self.expected[21:24])
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Testa se um cursor inválido volta para a primeira página"""
+        page = SaleService.paginate(
+            SaleService.get_by_company(self.company), after="???", page_size=5
+        )
+        self.assertEqual([s.id for s in page["sales"]], self.expected[:5])
+
+    def test_list_view_uses_cached_count(self):
+        """Testa se a listagem mostra o total sem contar a tabela"""
+        request = RequestFactory().get("/sales/", {"type": "entry"})
+        request.user = self.user
+        response = SaleListView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Mais antigas", count=0)
+        self.assertEqual(
+            SaleService.count_movements(
+                Sale.objects.none(), self.company, type_filter="entry"
+            ),
+            12,
+        )
+
+
+@skipUnless(connection.vendor == "sqlite", "Plano de execução específico do SQLite")
+class SaleIndexTests(QueryPlanAssertions, TestCase):
+    """Testa se as consultas do histórico e do dashboard usam os índices"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+
+    def test_paginated_history_uses_index(self):
+        """Testa o índice da listagem paginada por (created_at, id)"""
+        queryset = SaleService.get_by_company(self.company)
+        self.assertUsesIndex(queryset[:51], "sale_company_created_idx")
+
+    def test_period_metrics_use_index(self):
+        """Testa o índice das métricas por período e das últimas movimentações"""
+        sales = Sale.objects.filter(company=self.company)
+        self.assertUsesIndex(
+            sales.filter(date__gte=timezone.now()), "sale_company_date_idx"
+        )
+        self.assertUsesIndex(sales.order_by("-date")[:5], "sale_company_date_idx")
+
+    def test_type_count_uses_index(self):
+        """Testa o índice da contagem por tipo de movimentação"""
+        self.assertUsesIndex(
+            Sale.objects.filter(company=self.company, type="entry"),
+            "sale_company_type_idx",
+        )
+
+
+class StockHistoryTests(TestCase):
+    """Testa a reconstrução do estoque em uma data passada"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.now = timezone.now()
+        self.product = self._create_product("Arroz", days_ago=10)
+
+    def _create_product(self, name, days_ago, quantity=10):
+        product = Product.objects.create(
+            name=name,
+            category=self.category,
+            quantity=quantity,
+            price=5,
+            expiration_date=date.today() + timedelta(days=365),
+            company=self.company,
+        )
+        Product.objects.filter(pk=product.pk).update(created_at=self.ago(days_ago))
+        return product
+
+    def ago(self, days):
+        return self.now - timedelta(days=days)
+
+    def _move(self, type_sale, quantity, days_ago, product=None):
+        sale = SaleService.record_movement(
+            product or self.product, type_sale, quantity, self.user, self.company
+        )
+        Sale.objects.filter(pk=sale.pk).update(created_at=self.ago(days_ago))
+
+    def test_without_checkpoint_undoes_later_movements(self):
+        """Testa a reconstrução a partir da quantidade atual"""
+        self._move("entry", 5, days_ago=8)
+        self._move("exits", 3, days_ago=6)
+
+        at = StockHistoryService.get_product_stock_at
+        self.assertEqual(at(self.product, self.ago(9)), 10)
+        self.assertEqual(at(self.product, self.ago(7)), 15)
+        self.assertEqual(at(self.product, self.now), 12)
+
+    def test_checkpoint_plus_later_movements(self):
+        """Testa a reconstrução a partir do checkpoint mais próximo"""
+        self._move("entry", 5, days_ago=8)
+        self._move("exits", 3, days_ago=6)
+        StockHistoryService.build_checkpoints(self.company.pk, self.ago(5))
+        self._move("entry", 4, days_ago=4)
+        # Quantidade atual alterada sem movimentação: não afeta as datas
+        # cobertas pelo checkpoint
+        Product.objects.filter(pk=self.product.pk).update(quantity=999)
+
+        at = StockHistoryService.get_product_stock_at
+        self.assertEqual(at(self.product, self.ago(5)), 12)
+        self.assertEqual(at(self.product, self.ago(3)), 16)
+
+    def test_build_skips_products_without_movements(self):
+        """Testa se produtos sem movimentações novas não geram checkpoint"""
+        self.assertEqual(
+            StockHistoryService.build_checkpoints(self.company.pk, self.ago(5)), 1
+        )
+        self.assertEqual(
+            StockHistoryService.build_checkpoints(self.company.pk, self.ago(4)), 0
+        )
+        self._move("exits", 1, days_ago=3)
+        self.assertEqual(
+            StockHistoryService.build_checkpoints(self.company.pk, self.ago(2)), 1
+        )
+
+    def test_company_stock_uses_fixed_queries(self):
+        """Testa o estoque da empresa em duas queries e a exclusão de produtos novos"""
+        other = self._create_product("Feijão", days_ago=7, quantity=20)
+        for days_ago in (6, 5, 4):
+            self._move("exits", 1, days_ago=days_ago, product=other)
+        StockHistoryService.build_checkpoints(self.company.pk, self.ago(3))
+        for days_ago in (2, 1, 0):
+            self._move("exits", 1, days_ago=days_ago, product=other)
+
+        with self.assertNumQueries(2):
+            stock = StockHistoryService.get_stock_at(self.ago(4), self.company)
+        self.assertEqual(stock, {self.product.pk: 10, other.pk: 17})
+        self.assertEqual(
+            StockHistoryService.get_total_stock_at(self.ago(8), self.company), 10
+        )
+        self.assertEqual(
+            StockHistoryService.get_total_stock_at(self.now, category=self.category),
+            24,
+        )
+
+    def test_products_with_different_checkpoints(self):
+        """Testa produtos com checkpoints de execuções diferentes"""
+        other = self._create_product("Feijão", days_ago=9, quantity=20)
+        self._move("exits", 2, days_ago=8)
+        StockHistoryService.build_checkpoints(self.company.pk, self.ago(7))
+        self._move("exits", 3, days_ago=6, product=other)
+        # Só o Feijão teve movimentação: o Arroz continua no checkpoint anterior
+        StockHistoryService.build_checkpoints(self.company.pk, self.ago(5))
+        self._move("entry", 4, days_ago=4)
+        self._move("exits", 1, days_ago=4, product=other)
+        self._move("entry", 6, days_ago=1)
+        newest = self._create_product("Milho", days_ago=3, quantity=5)
+        self._move("exits", 2, days_ago=2, product=newest)
+
+        with CaptureQueriesContext(connection) as queries:
+            stock = StockHistoryService.get_stock_at(self.ago(3), self.company)
+        self.assertEqual(stock, {self.product.pk: 12, other.pk: 16, newest.pk: 5})
+        # As movimentações são lidas sem consultar os checkpoints por linha
+        self.assertNotIn("sales_stockcheckpoint", queries[1]["sql"])
+        self.assertEqual(
+            StockHistoryService.get_stock_at(self.ago(6), product=other),
+            {other.pk: 17},
+        )
+
+    def test_movement_before_read_is_counted_once(self):
+        """Testa uma movimentação gravada entre o início do comando e a leitura"""
+        started_at = timezone.now()
+        moved = []
+
+        def move_before_read(execute, sql, params, many, context):
+            # Registra uma saída logo antes da leitura das quantidades
+            if not moved and 'FROM "products_product"' in sql:
+                moved.append(True)
+                SaleService.record_movement(
+                    self.product, "exits", 4, self.user, self.company
+                )
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(move_before_read):
+            call_command("build_stock_checkpoints", workers=1, stdout=StringIO())
+
+        checkpoint = StockCheckpoint.objects.get(product=self.product)
+        sale = Sale.objects.get(product=self.product)
+        self.assertEqual(checkpoint.quantity, 6)
+        self.assertGreater(sale.created_at, started_at)
+        self.assertLess(sale.created_at, checkpoint.taken_at)
+        self.assertEqual(
+            StockHistoryService.get_product_stock_at(self.product, timezone.now()), 6
+        )
+
+    def test_command_builds_checkpoints(self):
+        """Testa o comando de criação de checkpoints"""
+        self._create_product("Feijão", days_ago=7)
+        out = StringIO()
+        call_command("build_stock_checkpoints", workers=1, stdout=out)
+
+        self.assertEqual(
+            StockCheckpoint.objects.filter(company=self.company).count(), 2
+        )
+        self.assertIn("2 checkpoint(s)", out.getvalue())
+
+
+class IdempotencyTests(TestCase):
+    """Testa as chaves de idempotência no registro de movimentações"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_superuser(
+            email="admin@example.com", password="testpass123", company_obj=self.company
+        )
+        category = Category.objects.create(name="Alimentos", company=self.company)
+        self.product = Product.objects.create(
+            name="Arroz",
+            category=category,
+            quantity=10,
+            initial_quantity=10,
+            price=5,
+            expiration_date=date.today() + timedelta(days=365),
+            company=self.company,
+        )
+
+    def _form_post(self, key, quantity=3):
+        request = RequestFactory().post(
+            "/sales/create/",
+            {
+                "product": self.product.pk,
+                "type": "exits",
+                "quantity": quantity,
+                "date": "2025-01-10 10:00",
+                "idempotency_key": key,
+            },
+        )
+        request.user = self.user
+        request.session = {}
+        request._messages = SessionStorage(request)
+        return SaleCreateView.as_view()(request)
+
+    def _bulk_post(self, key):
+        request = RequestFactory().post(
+            "/sales/bulk/",
+            data=json.dumps(
+                [{"product": self.product.pk, "type": "exits", "quantity": 2}]
+            ),
+            content_type="application/json",
+            headers={"Idempotency-Key": key},
+        )
+        request.user = self.user
+        return SaleBulkCreateView.as_view()(request)
+
+    def test_form_retry_does_not_duplicate_movement(self):
+        """Testa se o reenvio do formulário não registra a saída de novo"""
+        first = self._form_post("terminal-1-0001")
+        retry = self._form_post("terminal-1-0001")
+
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(retry.status_code, 302)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 7)
+
+    def test_bulk_retry_returns_original_result(self):
+        """Testa se o reenvio do lote devolve a resposta original"""
+        first = self._bulk_post("lote-42")
+        retry = self._bulk_post("lote-42")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+
+    def test_failed_attempt_is_not_remembered(self):
+        """Testa se uma tentativa com erro pode ser reenviada com a mesma chave"""
+        self._form_post("terminal-1-0002", quantity=50)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self._form_post("terminal-1-0002", quantity=5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 5)
+
+    def test_expired_keys_are_cleared(self):
+        """Testa a remoção das chaves expiradas"""
+        calls = []
+
+        def action():
+            calls.append(1)
+            return 201, {"ok": True}
+
+        IdempotencyService.run(self.user, "teste", "a", action)
+        IdempotencyService.run(self.user, "teste", "b", action)
+        IdempotencyKey.objects.filter(key="a").update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(IdempotencyService.clear_expired(batch_size=1), 1)
+        _, _, replayed = IdempotencyService.run(self.user, "teste", "a", action)
+        self.assertFalse(replayed)
+        _, _, replayed = IdempotencyService.run(self.user, "teste", "b", action)
+        self.assertTrue(replayed)
+        self.assertEqual(len(calls), 3)
+
+
+class FefoAllocationTests(QueryPlanAssertions, TestCase):
+    """Testa a alocação FEFO de saídas entre lotes"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_superuser(
+            email="admin@example.com", password="testpass123", company_obj=self.company
+        )
+        today = date.today()
+        self.product = Product.objects.create(
+            name="Leite",
+            category=Category.objects.create(name="Laticínios", company=self.company),
+            batch="L30",
+            quantity=5,
+            initial_quantity=5,
+            price=4,
+            expiration_date=today + timedelta(days=30),
+            company=self.company,
+        )
+        self.lots = {30: self.product.lots.get()}
+        for days in (10, -2, 20):
+            self.lots[days] = LotService.add_lot(
+                self.product, 5, today + timedelta(days=days), batch=f"L{days}"
+            )
+
+    def _quantities(self):
+        return {
+            days: Lot.objects.get(pk=lot.pk).quantity for days, lot in self.lots.items()
+        }
+
+    def test_exit_is_split_by_expiration_order(self):
+        """Testa se a saída consome primeiro os lotes que vencem antes"""
+        sales = FefoAllocationService.allocate_exit(
+            self.product, 8, self.user, company=self.company
+        )
+
+        self.assertEqual([s.quantity for s in sales], [5, 3])
+        self.assertEqual(
+            [s.lot_id for s in sales], [self.lots[10].pk, self.lots[20].pk]
+        )
+        self.assertEqual(self._quantities(), {30: 5, 10: 0, -2: 5, 20: 2})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 12)
+        self.assertEqual(CompanyStatsService.get_stats(self.company)["total_exits"], 2)
+
+    def test_insufficient_stock_changes_nothing(self):
+        """Testa se a saída maior que os lotes válidos não altera nada"""
+        with self.assertRaisesMessage(ValueError, "disponível 15"):
+            FefoAllocationService.allocate_exit(
+                self.product, 16, self.user, company=self.company
+            )
+        self.assertEqual(self._quantities(), {30: 5, 10: 5, -2: 5, 20: 5})
+        self.assertFalse(Sale.objects.exists())
+
+    def test_form_exit_uses_fefo_when_requested(self):
+        """Testa a opção FEFO no registro de saída pelo formulário"""
+        request = RequestFactory().post(
+            "/sales/create/",
+            {
+                "product": self.product.pk,
+                "type": "exits",
+                "quantity": 6,
+                "fefo": "1",
+            },
+        )
+        request.user = self.user
+        request.session = {}
+        request._messages = SessionStorage(request)
+
+        self.assertIsNotNone(SaleService.create_sale_by_type(request, "exits"))
+        self.assertEqual(self._quantities(), {30: 5, 10: 0, -2: 5, 20: 4})
+
+    @skipUnless(connection.vendor == "sqlite", "Plano de execução do SQLite")
+    def test_lot_lookup_uses_index(self):
+        """Testa se a busca de lotes usa o índice sem ordenação extra"""
+        self.assertUsesIndex(
+            FefoAllocationService.get_lots(self.product), "lot_product_expiry_idx"
+        )
+
+
+class SaleExportTests(TestCase):
+    """Testa a exportação de movimentações para CSV e Parquet"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.user = User.objects.create_superuser(
+            email="admin@example.com", password="testpass123", company_obj=self.company
+        )
+        category = Category.objects.create(name="Alimentos", company=self.company)
+        self.product = Product.objects.create(
+            name="Arroz",
+            category=category,
+            batch="L1",
+            quantity=10,
+            price=5,
+            expiration_date=date.today() + timedelta(days=365),
+            company=self.company,
+        )
+        self.other_product = Product.objects.create(
+            name="Feijão",
+            category=category,
+            quantity=10,
+            price=5,
+            expiration_date=date.today() + timedelta(days=365),
+            company=self.company,
+        )
+        # Duas movimentações por dia, no mesmo horário, para testar o
+        # desempate por id entre os blocos
+        self.start = timezone.make_aware(datetime(2025, 3, 1, 12))
+        Sale.objects.bulk_create(
+            [
+                Sale(
+                    product=self.product if i % 3 else self.other_product,
+                    user=self.user,
+                    company=self.company,
+                    type="entry" if i % 2 else "exits",
+                    date=self.start + timedelta(days=i // 2),
+                )
+                for i in range(10)
+            ]
+        )
+        Sale.objects.create(
+            product=Product.objects.create(
+                name="Outro",
+                category=Category.objects.create(
+                    name="Bebidas", company=self.other_company
+                ),
+                price=5,
+                expiration_date=date.today() + timedelta(days=365),
+                company=self.other_company,
+            ),
+            user=self.user,
+            company=self.other_company,
+            type="entry",
+            date=self.start,
+        )
+
+    def test_reads_all_rows_in_chunks(self):
+        """Testa a leitura em blocos por cursor, sem perder linhas empatadas"""
+        sales = Sale.objects.filter(company=self.company)
+        expected = list(sales.order_by("date", "id").values_list("id", flat=True))
+
+        with self.assertNumQueries(3):
+            rows = list(SaleExportService.get_rows(sales, chunk_size=4))
+
+        self.assertEqual([row[0] for row in rows], expected)
+        self.assertEqual(rows[0][1], self.start.isoformat())
+
+    def test_filters_period_type_and_product(self):
+        """Testa os filtros de período, tipo e produto"""
+        sales = SaleExportService.filter(
+            Sale.objects.filter(company=self.company),
+            start_date=date(2025, 3, 2),
+            end_date=date(2025, 3, 3),
+        )
+        self.assertEqual(sales.count(), 4)
+
+        sales = SaleExportService.filter(
+            Sale.objects.filter(company=self.company),
+            type_filter="entry",
+            product="feij",
+        )
+        self.assertEqual(sales.count(), 2)
+
+        with self.assertRaises(ValueError):
+            SaleExportService.filter(Sale.objects.all(), type_filter="other")
+
+    def test_view_streams_company_movements(self):
+        """Testa o CSV enviado em partes, restrito à empresa do usuário"""
+        request = RequestFactory().get(
+            "/sales/export/csv/", {"start": "2025-03-01", "type": "exits"}
+        )
+        request.user = self.user
+        response = SaleCsvExportView.as_view()(request)
+
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        rows = list(
+            csv.DictReader(b"".join(response.streaming_content).decode().splitlines())
+        )
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row["type"] for row in rows}, {"exits"})
+        self.assertEqual(rows[1]["product"], "Arroz")
+        self.assertEqual(rows[1]["batch"], "L1")
+
+    def test_view_rejects_invalid_date(self):
+        """Testa a resposta para uma data inválida"""
+        request = RequestFactory().get("/sales/export/csv/", {"end": "31/03/2025"})
+        request.user = self.user
+        self.assertEqual(SaleCsvExportView.as_view()(request).status_code, 400)
+
+    def test_writes_typed_parquet_row_groups(self):
+        """Testa o Parquet: um row group por bloco, colunas tipadas e dicionários"""
+        supplier = Supplier.objects.create(
+            name="Fornecedor", cnpj="12345678000190", company=self.company
+        )
+        Sale.objects.filter(type="entry").update(supplier=supplier)
+        output = BytesIO()
+
+        count = SaleExportService.write_parquet(
+            Sale.objects.filter(company=self.company), output, row_group_size=4
+        )
+
+        self.assertEqual(count, 10)
+        parquet_file = parquet.ParquetFile(output)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        table = parquet_file.read()
+        self.assertEqual(str(table.schema.field("date").type), "timestamp[us, tz=UTC]")
+        self.assertEqual(str(table.schema.field("price").type), "decimal128(10, 2)")
+        self.assertEqual(
+            str(table.schema.field("category").type),
+            "dictionary<values=string, indices=int32, ordered=0>",
+        )
+        rows = table.to_pylist()
+        self.assertEqual(rows[0]["date"], self.start)
+        self.assertEqual(rows[0]["price"], Decimal("5.00"))
+        self.assertEqual(rows[0]["category"], "Alimentos")
+        self.assertEqual(rows[1]["supplier"], "Fornecedor")
+        self.assertIsNone(rows[0]["supplier"])
+
+    def test_parquet_view_applies_filters(self):
+        """Testa o endpoint Parquet com os filtros da exportação CSV"""
+        request = RequestFactory().get("/sales/export/parquet/", {"type": "entry"})
+        request.user = self.user
+        response = SaleParquetExportView.as_view()(request)
+
+        self.assertIn("attachment;", response["Content-Disposition"])
+        table = parquet.read_table(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(set(table.column("type").to_pylist()), {"entry"})
+
+
+class SaleFormTests(TestCase):
+    """Testa os campos de produto e fornecedor do formulário de movimentação"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.product = Product.objects.create(
+            name="Arroz",
+            category=Category.objects.create(name="Alimentos", company=self.company),
+            price=5,
+            expiration_date=date.today() + timedelta(days=365),
+            company=self.company,
+        )
+        self.other_product = Product.objects.create(
+            name="Feijão",
+            category=Category.objects.create(name="Grãos", company=other_company),
+            price=5,
+            expiration_date=date.today() + timedelta(days=365),
+            company=other_company,
+        )
+
+    def _data(self, product):
+        return {
+            "product": product.pk,
+            "date": "2025-03-01 12:00",
+            "type": "entry",
+            "quantity": 1,
+        }
+
+    def test_validates_product_of_company(self):
+        """Testa se apenas produtos da empresa do usuário são aceitos"""
+        self.assertTrue(SaleForm(self._data(self.product), user=self.user).is_valid())
+
+        form = SaleForm(self._data(self.other_product), user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["product"], ["Produto não encontrado."])
+
+    def test_renders_without_loading_choices(self):
+        """Testa se a página não carrega a lista de produtos e fornecedores"""
+        form = SaleForm(user=self.user)
+        with self.assertNumQueries(0):
+            html = str(form["product"]) + str(form["supplier"])
+        self.assertIn("/products/autocomplete/", html)
+        self.assertIn("/suppliers/autocomplete/", html)
@@ -5,4 +5,11 @@ from . import views
 urlpatterns = [
     path("", views.SaleListView.as_view(), name="sale-list"),
     path("create/", views.SaleCreateView.as_view(), name="sale-create"),
+    path("bulk/", views.SaleBulkCreateView.as_view(), name="sale-bulk-create"),
+    path("export/csv/", views.SaleCsvExportView.as_view(), name="sale-export-csv"),
+    path(
+        "export/parquet/",
+        views.SaleParquetExportView.as_view(),
+        name="sale-export-parquet",
+    ),
 ]
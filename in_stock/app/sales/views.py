@@ -1,13 +1,29 @@
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from urllib.parse import urlencode
+
 from django.contrib import messages
 from django.contrib.auth.mixins import (
     LoginRequiredMixin,
     PermissionRequiredMixin,
 )
-from django.http import HttpResponse
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import redirect, render
 from django.views import View
 
+from in_stock.app.products.export_service import CSV_CONTENT_TYPE
+
+from .export_service import PARQUET_CONTENT_TYPE, SaleExportService
 from .forms import SaleForm
+from .idempotency_service import IDEMPOTENCY_FIELD, IdempotencyService
 from .models import Sale
 from .services import SaleService
 
@@ -18,9 +34,10 @@ class SaleListView(LoginRequiredMixin, PermissionRequiredMixin, View):
         return ["sales.view_sale"]
 
     def get(self, request):
-        if request.user.company_obj:
-            sales = SaleService.get_by_company(request.user.company_obj)
-            stats = SaleService.get_sales_statistics(request.user.company_obj)
+        company = request.user.company_obj
+        if company:
+            sales = SaleService.get_by_company(company)
+            stats = SaleService.get_sales_statistics(company)
         else:
             sales = SaleService.get_all()
             stats = SaleService.get_sales_statistics()
@@ -33,8 +50,31 @@ class SaleListView(LoginRequiredMixin, PermissionRequiredMixin, View):
         if product_filter:
             sales = sales.filter(product__name__icontains=product_filter)
 
+        page = SaleService.paginate(
+            sales,
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        )
+
+        # Mantém os filtros nos links de navegação
+        filters = {"type": type_filter, "product": product_filter}
+        filters = {key: value for key, value in filters.items() if value}
+
         context = {
-            "sales": sales,
+            "sales": page["sales"],
+            "total_count": SaleService.count_movements(
+                sales, company, type_filter, product_filter
+            ),
+            "next_query": (
+                urlencode({**filters, "after": page["next_cursor"]})
+                if page["next_cursor"]
+                else None
+            ),
+            "previous_query": (
+                urlencode({**filters, "before": page["previous_cursor"]})
+                if page["previous_cursor"]
+                else None
+            ),
             "type_filter": type_filter,
             "product_filter": product_filter,
             "stats": stats,
@@ -43,6 +83,76 @@ class SaleListView(LoginRequiredMixin, PermissionRequiredMixin, View):
         return render(request, "sales/index.html", context)
 
 
+class SaleCsvExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """
+    Exporta as movimentações para CSV, enviado em partes conforme é gerado.
+
+    Filtros (GET): start e end (AAAA-MM-DD, inclusivos), type (entry ou
+    exits) e product (parte do nome do produto).
+    """
+
+    def get_permission_required(self):
+        return ["sales.view_sale"]
+
+    def get(self, request):
+        try:
+            sales = self.get_sales(request)
+        except ValueError as e:
+            return JsonResponse(
+                {"errors": [{"line": None, "errors": [str(e)]}]}, status=400
+            )
+        return self.export(sales)
+
+    @staticmethod
+    def get_sales(request):
+        """
+        Movimentações da empresa do usuário com os filtros da requisição.
+
+        Raises:
+            ValueError: Se uma data ou o tipo forem inválidos
+        """
+        company = request.user.company_obj
+        if company:
+            sales = Sale.objects.filter(company=company)
+        elif request.user.is_instock_admin:
+            sales = Sale.objects.all()
+        else:
+            sales = Sale.objects.none()
+
+        return SaleExportService.filter(
+            sales,
+            start_date=SaleExportService.parse_date(request.GET.get("start")),
+            end_date=SaleExportService.parse_date(request.GET.get("end")),
+            type_filter=request.GET.get("type", ""),
+            product=request.GET.get("product", ""),
+        )
+
+    def export(self, sales):
+        response = StreamingHttpResponse(
+            SaleExportService.iter_csv(sales), content_type=CSV_CONTENT_TYPE
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="movimentacoes_{datetime.now().strftime("%d_%m_%Y_%H%M%S")}.csv"'
+        )
+        return response
+
+
+class SaleParquetExportView(SaleCsvExportView):
+    """
+    Exporta as movimentações, com as dimensões de produto, categoria e
+    fornecedor, em formato Parquet (colunar) para análises. Aceita os
+    mesmos filtros da exportação CSV.
+    """
+
+    def export(self, sales):
+        return FileResponse(
+            SaleExportService.export_parquet(sales),
+            as_attachment=True,
+            filename=f"movimentacoes_{datetime.now().strftime('%d_%m_%Y_%H%M%S')}.parquet",
+            content_type=PARQUET_CONTENT_TYPE,
+        )
+
+
 class SaleCreateView(LoginRequiredMixin, PermissionRequiredMixin, View):
 
     def get_permission_required(self):
@@ -51,22 +161,45 @@ class SaleCreateView(LoginRequiredMixin, PermissionRequiredMixin, View):
         return ["sales.view_sale"]
 
     def get(self, request):
-        form = SaleForm()
-        return render(request, "sales/create.html", {"form": form})
+        form = SaleForm(user=request.user)
+        # Chave de idempotência do formulário: evita duplicar a movimentação
+        # quando o envio é repetido (duplo clique, reenvio pelo navegador)
+        return render(
+            request,
+            "sales/create.html",
+            {"form": form, "idempotency_key": uuid.uuid4().hex},
+        )
 
     def post(self, request):
-        form = SaleForm(request.POST or None)
+        form = SaleForm(request.POST or None, user=request.user)
+        context = {
+            "form": form,
+            "idempotency_key": request.POST.get(IDEMPOTENCY_FIELD) or uuid.uuid4().hex,
+        }
 
         if form.is_valid():
             type_sale = request.POST.get("type")
 
             try:
-                create_sale = SaleService.create_sale_by_type(request, type_sale)
+                key = IdempotencyService.get_key(request)
+                if key:
+                    status_code, _, replayed = IdempotencyService.run(
+                        request.user,
+                        "sale-create",
+                        key,
+                        lambda: self._create(request, type_sale),
+                    )
+                    if replayed:
+                        messages.info(request, "Esta movimentação já foi registrada.")
+                        return redirect("sale-list")
+                    create_sale = status_code < 400
+                else:
+                    create_sale = SaleService.create_sale_by_type(request, type_sale)
             except Exception as e:
                 messages.error(
                     request, f"Ocorreu um erro ao salvar a movimentação: {str(e)}"
                 )
-                return render(request, "sales/create.html", {"form": form})
+                return render(request, "sales/create.html", context)
 
             if not create_sale:
                 messages.error(request, "Não foi possível salvar a movimentação!")
@@ -79,4 +212,100 @@ class SaleCreateView(LoginRequiredMixin, PermissionRequiredMixin, View):
                 for error in errors:
                     messages.error(request, f"{field}: {error}")
 
-        return render(request, "sales/create.html", {"form": form})
+        return render(request, "sales/create.html", context)
+
+    @staticmethod
+    def _create(request, type_sale):
+        """Registra a movimentação e retorna (status, resultado) para a chave"""
+        sale = SaleService.create_sale_by_type(request, type_sale)
+        if sale is None:
+            return 400, {}
+        return 201, {"sale": sale.pk}
+
+
+class SaleBulkCreateView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """
+    Registra várias movimentações em uma única requisição.
+
+    Aceita um corpo JSON ({"movements": [...]} ou uma lista) ou um arquivo
+    CSV enviado no campo "file", com as colunas product, type, quantity,
+    supplier (opcional) e description (opcional).
+    """
+
+    def get_permission_required(self):
+        return ["sales.add_sale"]
+
+    def post(self, request):
+        if not (request.user.is_instock_admin or request.user.company_obj):
+            return JsonResponse(
+                {
+                    "errors": [
+                        {"line": None, "errors": ["Usuário sem empresa vinculada."]}
+                    ]
+                },
+                status=403,
+            )
+
+        try:
+            lines = self._read_lines(request)
+        except ValueError as e:
+            return JsonResponse(
+                {"errors": [{"line": None, "errors": [str(e)]}]}, status=400
+            )
+
+        if not lines:
+            return JsonResponse(
+                {
+                    "errors": [
+                        {"line": None, "errors": ["Nenhuma movimentação enviada."]}
+                    ]
+                },
+                status=400,
+            )
+
+        try:
+            key = IdempotencyService.get_key(request)
+        except ValueError as e:
+            return JsonResponse(
+                {"errors": [{"line": None, "errors": [str(e)]}]}, status=400
+            )
+
+        def record():
+            sales, errors = SaleService.record_bulk_movements(lines, request.user)
+            if errors:
+                return 400, {"errors": errors}
+            return 201, {"created": len(sales)}
+
+        if not key:
+            status_code, body = record()
+            return JsonResponse(body, status=status_code)
+
+        status_code, body, replayed = IdempotencyService.run(
+            request.user, "sale-bulk-create", key, record
+        )
+        response = JsonResponse(body, status=status_code)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
+
+    @staticmethod
+    def _read_lines(request):
+        """Lê as linhas do corpo JSON ou do CSV enviado"""
+        upload = request.FILES.get("file")
+        if upload:
+            try:
+                text = io.TextIOWrapper(upload.file, encoding="utf-8-sig")
+                return list(csv.DictReader(text))
+            except (UnicodeDecodeError, csv.Error):
+                raise ValueError("Arquivo CSV inválido.")
+
+        try:
+            data = json.loads(request.body or b"[]")
+        except json.JSONDecodeError:
+            raise ValueError("JSON inválido.")
+
+        if isinstance(data, dict):
+            data = data.get("movements", [])
+        if not isinstance(data, list) or not all(isinstance(i, dict) for i in data):
+            raise ValueError("Envie uma lista de movimentações.")
+        return data
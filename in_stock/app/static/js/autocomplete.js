@@ -0,0 +1,78 @@
+// Campos de autocomplete (AutocompleteSelect): busca as opções no endpoint
+// informado em data-autocomplete-url conforme o usuário digita, em vez de
+// carregar a lista inteira no <select>.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-autocomplete-url]').forEach(function(container) {
+        const url = container.dataset.autocompleteUrl;
+        const hidden = container.querySelector('input[type="hidden"]');
+        const input = container.querySelector('[data-autocomplete-input]');
+        const results = container.querySelector('.autocomplete-results');
+        let timer = null;
+        let controller = null;
+
+        function close() {
+            results.classList.add('hidden');
+            results.innerHTML = '';
+        }
+
+        function describe(item) {
+            const details = [];
+            if (item.batch) details.push('Lote ' + item.batch);
+            if (item.expiration_date) details.push('Vence ' + item.expiration_date.split('-').reverse().join('/'));
+            if (item.cnpj) details.push(item.cnpj);
+            return details.join(' · ');
+        }
+
+        function render(items) {
+            results.innerHTML = '';
+            if (items.length === 0) {
+                const empty = document.createElement('li');
+                empty.className = 'px-4 py-2 text-sm text-gray-500';
+                empty.textContent = 'Nenhum resultado encontrado.';
+                results.appendChild(empty);
+            }
+            items.forEach(function(item) {
+                const option = document.createElement('li');
+                option.className = 'px-4 py-2 text-sm cursor-pointer hover:bg-orange-50';
+                option.textContent = item.text;
+                const details = describe(item);
+                if (details) {
+                    const small = document.createElement('span');
+                    small.className = 'block text-xs text-gray-500';
+                    small.textContent = details;
+                    option.appendChild(small);
+                }
+                option.addEventListener('mousedown', function(event) {
+                    event.preventDefault();
+                    hidden.value = item.id;
+                    input.value = item.text;
+                    close();
+                });
+                results.appendChild(option);
+            });
+            results.classList.remove('hidden');
+        }
+
+        function search() {
+            const term = input.value.trim();
+            if (!term) {
+                close();
+                return;
+            }
+            if (controller) controller.abort();
+            controller = new AbortController();
+            fetch(url + '?' + new URLSearchParams({ q: term }), { signal: controller.signal })
+                .then(function(response) { return response.json(); })
+                .then(function(data) { render(data.results); })
+                .catch(function() {});
+        }
+
+        input.addEventListener('input', function() {
+            // O ID só vale para o texto escolhido na lista
+            hidden.value = '';
+            clearTimeout(timer);
+            timer = setTimeout(search, 250);
+        });
+        input.addEventListener('blur', close);
+    });
+});
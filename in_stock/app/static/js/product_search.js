@@ -0,0 +1,40 @@
+// Sugestões do campo de busca da listagem de produtos: consulta o endpoint
+// de typeahead (data-search-url) conforme o usuário digita e preenche o
+// <datalist> associado ao campo.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-search-url]').forEach(function(input) {
+        const url = input.dataset.searchUrl;
+        const datalist = document.getElementById(input.getAttribute('list'));
+        let timer = null;
+        let controller = null;
+
+        function render(items) {
+            datalist.innerHTML = '';
+            items.forEach(function(item) {
+                const option = document.createElement('option');
+                option.value = item.text;
+                if (item.batch) option.label = item.text + ' · Lote ' + item.batch;
+                datalist.appendChild(option);
+            });
+        }
+
+        function search() {
+            const term = input.value.trim();
+            if (!term) {
+                render([]);
+                return;
+            }
+            if (controller) controller.abort();
+            controller = new AbortController();
+            fetch(url + '?' + new URLSearchParams({ q: term }), { signal: controller.signal })
+                .then(function(response) { return response.json(); })
+                .then(function(data) { render(data.results); })
+                .catch(function() {});
+        }
+
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(search, 200);
+        });
+    });
+});
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.25 on 2026-10-17 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suppliers", "0002_supplier_company"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="supplier",
+            index=models.Index(
+                fields=["company", "name"], name="supplier_company_name_idx"
+            ),
+        ),
+    ]
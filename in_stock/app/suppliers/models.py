@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 
 class Supplier(models.Model):
@@ -20,6 +20,14 @@ class Supplier(models.Model):
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["company", "name"], name="supplier_company_name_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Grava o fornecedor e os contadores de CompanyStats na mesma transação"""
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -1,3 +1,7 @@
+from django.db.models import Q
+
+from in_stock.app.products.autocomplete import AUTOCOMPLETE_LIMIT
+
 from .models import Supplier
 
 
@@ -7,6 +11,25 @@ class SupplierService:
     def get_all():
         return Supplier.objects.all()
 
+    @staticmethod
+    def autocomplete(queryset, term, limit=AUTOCOMPLETE_LIMIT):
+        """
+        Busca fornecedores pelo início do nome ou do CNPJ, para os campos de
+        autocomplete.
+
+        Returns:
+            list: [{"id", "text", "cnpj"}, ...]
+        """
+        term = term.strip()
+        condition = Q(name__istartswith=term)
+        if term and term[0].isdigit():
+            condition |= Q(cnpj__startswith=term)
+        suppliers = queryset.filter(condition).order_by("name", "id")
+        return [
+            {"id": pk, "text": name, "cnpj": cnpj}
+            for pk, name, cnpj in suppliers.values_list("id", "name", "cnpj")[:limit]
+        ]
+
     @staticmethod
     def create_supplier(request):
         name = request.POST.get("name")
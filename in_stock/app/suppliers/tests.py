@@ -1,6 +1,13 @@
-from django.test import TestCase
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
 
 from in_stock.app.suppliers.models import Supplier
+from in_stock.app.suppliers.views import SupplierAutocompleteView
+from in_stock.app.users.models import Company
+
+User = get_user_model()
 
 
 class SupplierModelTests(TestCase):
@@ -53,3 +60,38 @@ class SupplierModelTests(TestCase):
         """Testa se os timestamps são registrados"""
         self.assertIsNotNone(self.supplier.created_at)
         self.assertIsNotNone(self.supplier.updated_at)
+
+
+class SupplierAutocompleteTests(TestCase):
+    """Testa o autocomplete de fornecedores"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        other_company = Company.objects.create(
+            name="Outra Empresa", cnpj="99888777000166"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        Supplier.objects.create(
+            name="Tech Supplier", cnpj="12345678000190", company=self.company
+        )
+        Supplier.objects.create(
+            name="Food Supplier", cnpj="55444333000122", company=self.company
+        )
+        Supplier.objects.create(
+            name="Tech Outro", cnpj="12345000000100", company=other_company
+        )
+
+    def _search(self, term):
+        request = RequestFactory().get("/suppliers/autocomplete/", {"q": term})
+        request.user = self.user
+        data = json.loads(SupplierAutocompleteView.as_view()(request).content)
+        return [item["text"] for item in data["results"]]
+
+    def test_searches_name_and_cnpj_in_company(self):
+        """Testa a busca pelo início do nome ou do CNPJ, apenas na empresa"""
+        self.assertEqual(self._search("tech"), ["Tech Supplier"])
+        self.assertEqual(self._search("5544"), ["Food Supplier"])
+        self.assertEqual(self._search(""), ["Food Supplier", "Tech Supplier"])
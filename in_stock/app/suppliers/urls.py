@@ -5,6 +5,12 @@ from . import views
 urlpatterns = [
     # Lista todos os fornecedores (GET)
     path("", views.SupplierListCreateView.as_view(), name="supplier-list-create"),
+    # Busca de fornecedores para autocomplete (GET, JSON)
+    path(
+        "autocomplete/",
+        views.SupplierAutocompleteView.as_view(),
+        name="supplier-autocomplete",
+    ),
     # Formulário de criação (GET) e criar fornecedor (POST)
     path("create/", views.SupplierCreateView.as_view(), name="supplier-create"),
     # Editar fornecedor (GET/POST)
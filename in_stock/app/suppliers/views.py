@@ -1,9 +1,11 @@
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
 from django.views import View
 
+from in_stock.app.products.autocomplete import for_user, get_limit
+
 from .forms import SupplierForm
 from .models import Supplier
 from .service import SupplierService
@@ -25,6 +27,23 @@ class SupplierListCreateView(LoginRequiredMixin, View):
         return render(request, "suppliers/list.html", {"suppliers": suppliers})
 
 
+class SupplierAutocompleteView(LoginRequiredMixin, View):
+    """
+    Busca fornecedores da empresa pelo início do nome ou do CNPJ (parâmetros
+    q e limit), para os campos de autocomplete
+    """
+
+    def get(self, request):
+        suppliers = for_user(SupplierService.get_all(), request.user)
+        return JsonResponse(
+            {
+                "results": SupplierService.autocomplete(
+                    suppliers, request.GET.get("q", ""), get_limit(request.GET)
+                )
+            }
+        )
+
+
 class SupplierCreateView(LoginRequiredMixin, View):
 
     def get(self, request):
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "in_stock.app.users"
+
+    def ready(self):
+        # Registra os sinais que mantêm os contadores de CompanyStats
+        from . import signals  # noqa: F401
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from in_stock.app.users.models import Company, CompanyStats
+from in_stock.app.users.stats_service import STATS_FIELDS, CompanyStatsService
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói os contadores de CompanyStats a partir das tabelas de "
+        "produtos, fornecedores e movimentações e verifica se estão corretos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--company",
+            action="append",
+            dest="companies",
+            help="ID da empresa (pode ser repetido). Padrão: todas as empresas",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Apenas verifica os contadores, sem gravar alterações",
+        )
+
+    def handle(self, *args, **options):
+        company_ids = options["companies"]
+        companies = Company.objects.all()
+        if company_ids:
+            companies = companies.filter(pk__in=company_ids)
+        company_ids = list(companies.values_list("pk", flat=True))
+
+        if not options["check"]:
+            totals = CompanyStatsService.compute(company_ids)
+            with transaction.atomic():
+                existing = set(
+                    CompanyStats.objects.filter(company_id__in=company_ids).values_list(
+                        "company_id", flat=True
+                    )
+                )
+                to_create = []
+                to_update = []
+                for company_id in company_ids:
+                    values = totals.get(company_id, {})
+                    stats = CompanyStats(company_id=company_id, **values)
+                    if company_id in existing:
+                        to_update.append(stats)
+                    else:
+                        to_create.append(stats)
+                CompanyStats.objects.bulk_create(to_create, batch_size=500)
+                CompanyStats.objects.bulk_update(
+                    to_update, list(STATS_FIELDS), batch_size=500
+                )
+            self.stdout.write(
+                f"{len(to_create)} estatística(s) criada(s), "
+                f"{len(to_update)} reconstruída(s)."
+            )
+
+        mismatches = CompanyStatsService.verify(company_ids)
+        for company_id, diff in mismatches.items():
+            for field, (current, expected) in diff.items():
+                self.stderr.write(
+                    f"{company_id}: {field} = {current} (esperado {expected})"
+                )
+
+        if mismatches:
+            raise CommandError(
+                f"{len(mismatches)} empresa(s) com contadores divergentes."
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Contadores verificados para {len(company_ids)} empresa(s)."
+            )
+        )
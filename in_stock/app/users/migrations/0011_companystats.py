@@ -0,0 +1,63 @@
+# Generated by Django 4.2.25 on 2026-10-17 20:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_simplify_role_hierarchy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompanyStats",
+            fields=[
+                (
+                    "company",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="users.company",
+                        verbose_name="Empresa",
+                    ),
+                ),
+                (
+                    "total_products",
+                    models.IntegerField(default=0, verbose_name="Produtos"),
+                ),
+                (
+                    "total_suppliers",
+                    models.IntegerField(default=0, verbose_name="Fornecedores"),
+                ),
+                (
+                    "total_stock",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Unidades em estoque"
+                    ),
+                ),
+                (
+                    "stock_value",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=18,
+                        verbose_name="Valor do estoque",
+                    ),
+                ),
+                (
+                    "total_entries",
+                    models.IntegerField(default=0, verbose_name="Entradas"),
+                ),
+                ("total_exits", models.IntegerField(default=0, verbose_name="Saídas")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Estatística da Empresa",
+                "verbose_name_plural": "Estatísticas das Empresas",
+            },
+        ),
+    ]
@@ -50,6 +50,46 @@ class Company(models.Model):
         return self.products.count()
 
 
+# ============================================
+# CONTADORES POR EMPRESA
+# ============================================
+class CompanyStats(models.Model):
+    """
+    Totais da empresa mantidos de forma incremental.
+
+    Atualizado com expressões F() sempre que produtos, fornecedores ou
+    movimentações são criados, alterados ou excluídos (ver stats_service.py),
+    para que o dashboard e as estatísticas leiam os totais em O(1).
+    """
+
+    company = models.OneToOneField(
+        Company,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Empresa",
+    )
+    total_products = models.IntegerField(default=0, verbose_name="Produtos")
+    total_suppliers = models.IntegerField(default=0, verbose_name="Fornecedores")
+    total_stock = models.BigIntegerField(default=0, verbose_name="Unidades em estoque")
+    stock_value = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=0,
+        verbose_name="Valor do estoque",
+    )
+    total_entries = models.IntegerField(default=0, verbose_name="Entradas")
+    total_exits = models.IntegerField(default=0, verbose_name="Saídas")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Estatística da Empresa"
+        verbose_name_plural = "Estatísticas das Empresas"
+
+    def __str__(self):
+        return f"Estatísticas - {self.company.name}"
+
+
 # ============================================
 # MODELO DE PAPEL/PERMISSÃO
 # ============================================
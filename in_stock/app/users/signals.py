@@ -0,0 +1,93 @@
+"""
+Sinais que mantêm os contadores de CompanyStats atualizados
+
+As variações são aplicadas na mesma transação da alteração de origem:
+Product, Sale e Supplier gravam dentro de transaction.atomic() (ver save()
+de cada modelo) e o Django já exclui os objetos e envia o post_delete em uma
+única transação. Se a gravação for desfeita, os contadores também são.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from in_stock.app.products.models import Product
+from in_stock.app.sales.models import Sale
+from in_stock.app.suppliers.models import Supplier
+from in_stock.app.users.stats_service import CompanyStatsService
+
+# Campos de cada modelo que afetam os contadores
+TRACKED_FIELDS = {
+    Product: ("company_id", "quantity", "price"),
+    Sale: ("company_id", "type"),
+    Supplier: ("company_id",),
+}
+
+
+def _deltas(model, values, sign):
+    """Retorna (empresa, variações) para somar/subtrair o objeto dos totais"""
+    if model is Product:
+        quantity = values["quantity"] or 0
+        return values["company_id"], {
+            "total_products": sign,
+            "total_stock": sign * quantity,
+            "stock_value": sign
+            * CompanyStatsService.stock_value(quantity, values["price"]),
+        }
+    if model is Sale:
+        field = "total_entries" if values["type"] == "entry" else "total_exits"
+        return values["company_id"], {field: sign}
+    return values["company_id"], {"total_suppliers": sign}
+
+
+def _current(instance):
+    fields = TRACKED_FIELDS[instance.__class__]
+    return {field: getattr(instance, field) for field in fields}
+
+
+@receiver(pre_save, sender=Product, dispatch_uid="stats_pre_save_product")
+@receiver(pre_save, sender=Sale, dispatch_uid="stats_pre_save_sale")
+@receiver(pre_save, sender=Supplier, dispatch_uid="stats_pre_save_supplier")
+def remember_stored_values(sender, instance, raw=False, **kwargs):
+    """Lê do banco os valores atuais, antes de serem sobrescritos"""
+    instance._stats_stored = None
+    if raw or instance.pk is None:
+        return
+    instance._stats_stored = (
+        sender.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS[sender]).first()
+    )
+
+
+@receiver(post_save, sender=Product, dispatch_uid="stats_save_product")
+@receiver(post_save, sender=Sale, dispatch_uid="stats_save_sale")
+@receiver(post_save, sender=Supplier, dispatch_uid="stats_save_supplier")
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """Aplica a diferença entre os valores gravados e os novos"""
+    if raw:
+        return
+
+    current = _current(instance)
+    stored = getattr(instance, "_stats_stored", None)
+
+    if created or stored is None:
+        company_id, deltas = _deltas(sender, current, +1)
+        CompanyStatsService.apply_delta(company_id, **deltas)
+    elif stored != current:
+        old_company, removed = _deltas(sender, stored, -1)
+        new_company, added = _deltas(sender, current, +1)
+        if old_company == new_company:
+            for field, value in removed.items():
+                added[field] = added.get(field, 0) + value
+            CompanyStatsService.apply_delta(new_company, **added)
+        else:
+            CompanyStatsService.apply_delta(old_company, **removed)
+            CompanyStatsService.apply_delta(new_company, **added)
+
+
+@receiver(post_delete, sender=Product, dispatch_uid="stats_delete_product")
+@receiver(post_delete, sender=Sale, dispatch_uid="stats_delete_sale")
+@receiver(post_delete, sender=Supplier, dispatch_uid="stats_delete_supplier")
+def update_stats_on_delete(sender, instance, **kwargs):
+    """Remove o objeto excluído dos totais da empresa"""
+    company_id, deltas = _deltas(sender, _current(instance), -1)
+    # A empresa pode estar sendo excluída em cascata: não recria a linha
+    CompanyStatsService.apply_delta(company_id, create_missing=False, **deltas)
@@ -0,0 +1,196 @@
+"""
+Serviço de Estatísticas - Mantém os contadores de CompanyStats
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from in_stock.app.products.models import Product
+from in_stock.app.sales.models import Sale
+from in_stock.app.suppliers.models import Supplier
+from in_stock.app.users.models import Company, CompanyStats
+
+# Campos de CompanyStats que são contadores incrementais
+STATS_FIELDS = (
+    "total_products",
+    "total_suppliers",
+    "total_stock",
+    "stock_value",
+    "total_entries",
+    "total_exits",
+)
+
+
+class CompanyStatsService:
+    """Serviço para ler, atualizar e reconstruir as estatísticas por empresa"""
+
+    @staticmethod
+    def stock_value(quantity, price):
+        """Calcula o valor em estoque (quantidade * preço) como Decimal"""
+        return Decimal(str(price or 0)) * (quantity or 0)
+
+    @staticmethod
+    def apply_delta(company_id, create_missing=True, **deltas):
+        """
+        Aplica variações nos contadores da empresa com expressões F().
+
+        Se a empresa ainda não tiver linha em CompanyStats, os totais são
+        reconstruídos a partir das tabelas de origem (que já incluem a
+        alteração atual). Use create_missing=False em exclusões, quando a
+        própria empresa pode estar sendo excluída em cascata.
+
+        Uso:
+            CompanyStatsService.apply_delta(company.pk, total_stock=-5)
+        """
+        if company_id is None:
+            return
+
+        changes = {field: F(field) + value for field, value in deltas.items() if value}
+        if not changes:
+            return
+
+        with transaction.atomic():
+            updated = CompanyStats.objects.filter(company_id=company_id).update(
+                **changes
+            )
+            if not updated and create_missing:
+                CompanyStatsService.rebuild(company_id)
+
+    @staticmethod
+    def compute(company_ids=None):
+        """
+        Calcula os totais a partir das tabelas de origem.
+
+        Usa uma query agrupada por tabela (produtos, fornecedores e
+        movimentações), independente da quantidade de empresas.
+
+        Returns:
+            dict: {company_id: {campo: valor, ...}, ...}
+        """
+
+        def scoped(queryset):
+            queryset = queryset.filter(company__isnull=False)
+            if company_ids is not None:
+                queryset = queryset.filter(company_id__in=company_ids)
+            return queryset.values("company_id").order_by()
+
+        totals = {}
+
+        def row(company_id):
+            return totals.setdefault(
+                company_id,
+                {
+                    "total_products": 0,
+                    "total_suppliers": 0,
+                    "total_stock": 0,
+                    "stock_value": Decimal("0.00"),
+                    "total_entries": 0,
+                    "total_exits": 0,
+                },
+            )
+
+        for item in scoped(Product.objects.all()).annotate(
+            products=Count("id"),
+            stock=Coalesce(Sum("quantity"), 0),
+            value=Sum(F("quantity") * F("price"), output_field=DecimalField()),
+        ):
+            stats = row(item["company_id"])
+            stats["total_products"] = item["products"]
+            stats["total_stock"] = item["stock"]
+            stats["stock_value"] = item["value"] or Decimal("0.00")
+
+        for item in scoped(Supplier.objects.all()).annotate(suppliers=Count("id")):
+            row(item["company_id"])["total_suppliers"] = item["suppliers"]
+
+        for item in scoped(Sale.objects.all()).annotate(
+            entries=Count("id", filter=Q(type="entry")),
+            exits=Count("id", filter=Q(type="exits")),
+        ):
+            stats = row(item["company_id"])
+            stats["total_entries"] = item["entries"]
+            stats["total_exits"] = item["exits"]
+
+        return totals
+
+    @staticmethod
+    def rebuild(company_id):
+        """Reconstrói as estatísticas de uma empresa a partir das tabelas"""
+        totals = CompanyStatsService.compute([company_id]).get(company_id, {})
+        stats, _ = CompanyStats.objects.update_or_create(
+            company_id=company_id, defaults=totals
+        )
+        return stats
+
+    @staticmethod
+    def get_stats(company=None):
+        """
+        Retorna os totais da empresa.
+
+        Para uma empresa, lê a linha de CompanyStats (criando-a se necessário).
+        Sem empresa (visão do Admin InStock), calcula os totais de todas as
+        empresas a partir das tabelas de origem.
+
+        Returns:
+            dict: total_products, total_suppliers, total_stock, stock_value,
+                total_entries e total_exits
+        """
+        if company is None:
+            stats = Product.objects.aggregate(
+                total_products=Count("id"),
+                total_stock=Coalesce(Sum("quantity"), 0),
+                stock_value=Sum(
+                    F("quantity") * F("price"), output_field=DecimalField()
+                ),
+            )
+            stats["stock_value"] = stats["stock_value"] or Decimal("0.00")
+            stats["total_suppliers"] = Supplier.objects.count()
+            stats.update(
+                Sale.objects.aggregate(
+                    total_entries=Count("id", filter=Q(type="entry")),
+                    total_exits=Count("id", filter=Q(type="exits")),
+                )
+            )
+            return stats
+
+        stats = CompanyStats.objects.filter(company=company).first()
+        if stats is None:
+            stats = CompanyStatsService.rebuild(company.pk)
+        return {field: getattr(stats, field) for field in STATS_FIELDS}
+
+    @staticmethod
+    def verify(company_ids=None):
+        """
+        Compara os contadores gravados com os totais das tabelas de origem.
+
+        Returns:
+            dict: {company_id: {campo: (gravado, esperado), ...}} apenas para
+                as empresas com divergência
+        """
+        companies = Company.objects.all()
+        if company_ids is not None:
+            companies = companies.filter(pk__in=company_ids)
+
+        expected = CompanyStatsService.compute(company_ids)
+        stored = {
+            stats.company_id: stats
+            for stats in CompanyStats.objects.filter(
+                company_id__in=companies.values("pk")
+            )
+        }
+
+        mismatches = {}
+        for company_id in companies.values_list("pk", flat=True):
+            totals = expected.get(company_id, {})
+            stats = stored.get(company_id)
+            diff = {}
+            for field in STATS_FIELDS:
+                current = getattr(stats, field) if stats else None
+                wanted = totals.get(field, 0)
+                if current != wanted:
+                    diff[field] = (current, wanted)
+            if diff:
+                mismatches[company_id] = diff
+        return mismatches
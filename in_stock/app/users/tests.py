@@ -1,5 +1,19 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, TransactionTestCase
+
+from in_stock.app.products.models import Category, Product
+from in_stock.app.sales.models import Sale
+from in_stock.app.suppliers.models import Supplier
+from in_stock.app.users.models import Company, CompanyStats
+from in_stock.app.users.stats_service import CompanyStatsService
 
 User = get_user_model()
 
@@ -85,3 +99,141 @@ class CustomUserModelTests(TestCase):
     def test_date_joined_is_set(self):
         """Testa se a data de criação é registrada"""
         self.assertIsNotNone(self.user.date_joined)
+
+
+class CompanyStatsTests(TestCase):
+    """Testa os contadores incrementais por empresa"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+
+    def _create_product(self, name, quantity=10, price="2.50"):
+        return Product.objects.create(
+            name=name,
+            category=self.category,
+            quantity=quantity,
+            price=Decimal(price),
+            expiration_date=date.today() + timedelta(days=90),
+            company=self.company,
+        )
+
+    def _stats(self):
+        return CompanyStats.objects.get(company=self.company)
+
+    def test_counters_follow_product_changes(self):
+        """Testa se criar, alterar e excluir produtos atualiza os contadores"""
+        arroz = self._create_product("Arroz", quantity=10)
+        self._create_product("Feijão", quantity=4, price="8.00")
+
+        stats = self._stats()
+        self.assertEqual(stats.total_products, 2)
+        self.assertEqual(stats.total_stock, 14)
+        self.assertEqual(stats.stock_value, Decimal("57.00"))
+
+        arroz.quantity = 6
+        arroz.save()
+        self.assertEqual(self._stats().total_stock, 10)
+
+        arroz.delete()
+        stats = self._stats()
+        self.assertEqual(stats.total_products, 1)
+        self.assertEqual(stats.stock_value, Decimal("32.00"))
+
+    def test_counters_follow_movements_and_suppliers(self):
+        """Testa se movimentações e fornecedores atualizam os contadores"""
+        product = self._create_product("Arroz")
+        Supplier.objects.create(
+            name="Fornecedor", cnpj="12345678000190", company=self.company
+        )
+        entry = Sale.objects.create(
+            product=product, user=self.user, company=self.company, type="entry"
+        )
+        Sale.objects.create(
+            product=product, user=self.user, company=self.company, type="exits"
+        )
+
+        stats = self._stats()
+        self.assertEqual(stats.total_suppliers, 1)
+        self.assertEqual(stats.total_entries, 1)
+        self.assertEqual(stats.total_exits, 1)
+
+        entry.type = "exits"
+        entry.save()
+        stats = self._stats()
+        self.assertEqual(stats.total_entries, 0)
+        self.assertEqual(stats.total_exits, 2)
+
+    def test_get_stats_reads_single_row(self):
+        """Testa se a leitura dos totais é uma única query"""
+        self._create_product("Arroz")
+        with self.assertNumQueries(1):
+            stats = CompanyStatsService.get_stats(self.company)
+        self.assertEqual(stats["total_products"], 1)
+
+    def test_rebuild_command_fixes_drift(self):
+        """Testa se o comando reconstrói contadores divergentes"""
+        self._create_product("Arroz")
+        CompanyStats.objects.filter(company=self.company).update(total_products=99)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_company_stats", "--check", stderr=StringIO())
+
+        call_command("rebuild_company_stats", stdout=StringIO())
+        self.assertEqual(self._stats().total_products, 1)
+        self.assertEqual(CompanyStatsService.verify(), {})
+
+    def test_deleting_company_removes_stats(self):
+        """Testa se excluir a empresa não recria estatísticas órfãs"""
+        self._create_product("Arroz")
+        self.company.delete()
+        self.assertFalse(CompanyStats.objects.exists())
+
+
+class CompanyStatsTransactionTests(TransactionTestCase):
+    """Testa se os contadores são atualizados na transação da alteração"""
+
+    def setUp(self):
+        """Prepara dados para cada teste"""
+        self.company = Company.objects.create(name="Empresa", cnpj="11222333000181")
+        self.user = User.objects.create_user(
+            email="user@example.com", password="testpass123", company_obj=self.company
+        )
+        self.category = Category.objects.create(name="Alimentos", company=self.company)
+        self.in_atomic = []
+
+    def _record(self, sender, **kwargs):
+        self.in_atomic.append((sender.__name__, connection.in_atomic_block))
+
+    def test_signals_run_inside_source_transaction(self):
+        """Testa se post_save e post_delete rodam dentro de uma transação"""
+        for signal in (post_save, post_delete):
+            for model in (Product, Sale, Supplier):
+                signal.connect(self._record, sender=model)
+                self.addCleanup(signal.disconnect, self._record, sender=model)
+
+        self.assertFalse(connection.in_atomic_block)
+        product = Product.objects.create(
+            name="Arroz",
+            category=self.category,
+            quantity=10,
+            price=Decimal("2.50"),
+            expiration_date=date.today() + timedelta(days=90),
+            company=self.company,
+        )
+        supplier = Supplier.objects.create(
+            name="Fornecedor", cnpj="12345678000190", company=self.company
+        )
+        Sale.objects.create(
+            product=product, user=self.user, company=self.company, type="entry"
+        )
+        supplier.delete()
+        product.delete()
+
+        self.assertTrue(self.in_atomic)
+        self.assertTrue(all(atomic for _, atomic in self.in_atomic), self.in_atomic)
+        self.assertEqual(CompanyStatsService.verify(), {})
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     "in_stock.app.sales",
     "in_stock.app.suppliers",
     "in_stock.app.users",
+    "in_stock.app.pages",
     "in_stock.app.static",
 ]
 
@@ -123,6 +124,26 @@ else:
         }
     }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Em produção, aponte CACHE_BACKEND/CACHE_LOCATION para um cache compartilhado
+# (Redis ou Memcached) para que todos os workers vejam as mesmas invalidações.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "instock"),
+    }
+}
+
+# Tempo máximo (em segundos) que um snapshot do dashboard pode ficar desatualizado
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv("DASHBOARD_CACHE_TIMEOUT", "60"))
+
+# Tempo (em segundos) em que uma chave de idempotência de movimentação é lembrada
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+
 # MIGRATION_MODULES = {
 # 'users': None,  # isso diz ao Django para não procurar migrações para o app 'users'
 # }